@@ -0,0 +1,345 @@
+"""Rule-based baseline opponents
+
+Each policy picks the action of one ship in every env of a VectorSpaceWar at
+once, from its batched state arrays, so evaluating an opponent costs a few
+array operations per step however many envs there are.
+
+    - baseline_d: Defensive and phaser heavy. Shoots down incoming torpedoes,
+      dodges the ones it can not, and fires its phaser at the enemy once it
+      is in range.
+    - baseline_o: Offensive and torpedo heavy. Closes in on the enemy, leads
+      it with torpedoes, and only dodges torpedoes about to hit it.
+
+Distances and bearings take the shortest path around the screen, since the
+screen wraps.
+"""
+
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+import numpy as np
+
+from space_war.sim.conf import (
+    PHASER_FIRE_CD_TICKS,
+    PHASER_LENGTH,
+    ROTATION_STEP,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    SHIP_SIZE,
+    TORPEDO_FIRE_CD_TICKS,
+    TORPEDO_MOVES_PER_TICK,
+    TORPEDO_SIZE,
+    TORPEDO_SPAWN_DIST,
+    TORPEDO_SPEED,
+    ShipAction,
+)
+
+if TYPE_CHECKING:
+    from space_war.sim.vector import VectorSpaceWar
+
+# Takes the env and the index of the ship to control, and returns the
+# ShipAction value of that ship in every env
+Policy = Callable[["VectorSpaceWar", int], np.ndarray]
+
+BOUNDS = np.array([SCREEN_WIDTH, SCREEN_HEIGHT], dtype=np.float64)
+_BOUNDS_T = BOUNDS.reshape(2, 1, 1)
+# The closest a torpedo can pass the ship's center without hitting it, with
+# some margin since the rects grow when rotated
+HIT_RADIUS = (max(SHIP_SIZE) + max(TORPEDO_SIZE)) / 2 + 4
+# The number of ticks ahead torpedoes are considered a threat
+DODGE_HORIZON_TICKS = 40
+# The degrees from right angles to a torpedo's path within which a ship
+# thrusts to dodge it, instead of turning first
+DODGE_THRUST_ANGLE = 2 * ROTATION_STEP
+# baseline_o only dodges torpedoes closer than this many ticks
+LATE_DODGE_TICKS = 40
+# The speed each baseline accelerates up to along its heading
+DEFENSIVE_SPEED = 2.0
+OFFENSIVE_SPEED = 4.0
+# baseline_d closes in on the enemy while it is further than this
+DEFENSIVE_RANGE = 0.8 * PHASER_LENGTH
+# baseline_o only fires torpedoes at enemies closer than this
+TORPEDO_RANGE = 350
+
+
+class _Situation(NamedTuple):
+    """What a ship sees in every env, computed once per step"""
+
+    # whether the ship is alive
+    alive: np.ndarray
+    # the position of the ship
+    pos: np.ndarray
+    # the ship's heading as a unit vector
+    heading: np.ndarray
+    # the velocity of the ship
+    vel: np.ndarray
+    # the shortest offset to the nearest enemy, its velocity and distance,
+    # and whether any enemy is alive
+    enemy_delta: np.ndarray
+    enemy_vel: np.ndarray
+    enemy_dist: np.ndarray
+    has_enemy: np.ndarray
+    # the shortest offset to the most urgent torpedo threat, the tick it
+    # passes closest, its velocity relative to the ship, and whether any
+    # torpedo threatens the ship
+    threat_delta: np.ndarray
+    threat_time: np.ndarray
+    threat_vel: np.ndarray
+    has_threat: np.ndarray
+    # whether each weapon is off cooldown
+    phaser_ready: np.ndarray
+    torpedo_ready: np.ndarray
+
+
+def wrap_delta(delta: np.ndarray) -> np.ndarray:
+    """Returns the shortest offsets around the screen, for offsets with a
+    trailing x,y axis
+    """
+    return delta - BOUNDS * np.rint(delta / BOUNDS)
+
+
+def _angle_error(direction: np.ndarray, ang: np.ndarray) -> np.ndarray:
+    """Returns the degrees from the heading to the direction, in [-180,
+    180)
+    """
+    target = np.degrees(np.arctan2(direction[..., 1], direction[..., 0]))
+    return (target - ang + 180) % 360 - 180
+
+
+def _turn_towards(error: np.ndarray) -> np.ndarray:
+    """Returns the rotation that reduces the angle error, or NOOP if the ship
+    is already facing within half a rotation step
+    """
+    return np.select(
+        [error > ROTATION_STEP / 2, error < -ROTATION_STEP / 2],
+        [ShipAction.ROTATE_CW.value, ShipAction.ROTATE_CCW.value],
+        ShipAction.NOOP.value,
+    )
+
+
+def _observe(env: "VectorSpaceWar", ship: int) -> _Situation:
+    """Finds the nearest enemy and the most urgent torpedo threat"""
+    num_envs = env.num_envs
+    pos = env.ship_pos[:, ship]
+    vel = env.ship_vel[:, ship]
+    rad = np.radians(env.ship_ang[:, ship])
+    heading = np.stack((np.cos(rad), np.sin(rad)), axis=-1)
+    envs = np.arange(num_envs)
+
+    # nearest enemy that is alive
+    deltas = wrap_delta(env.ship_pos - pos[:, None])
+    dists = np.hypot(deltas[..., 0], deltas[..., 1])
+    enemies = env.ship_alive.copy()
+    enemies[:, ship] = False
+    dists[~enemies] = np.inf
+    enemy = dists.argmin(axis=1)
+
+    # torpedoes of every ship, including its own, since they hit anything.
+    # Offsets and velocities are relative to the ship, per tick. They are
+    # laid out as (x/y, torpedo, env), so reducing over the few torpedoes
+    # works on whole rows of envs at a time.
+    torpedo_pos, torpedo_vel = (
+        np.ascontiguousarray(array.reshape(num_envs, -1, 2).transpose(2, 1, 0))
+        for array in (env.torpedo_pos, env.torpedo_vel)
+    )
+    delta = torpedo_pos - pos.T[:, None]
+    delta -= _BOUNDS_T * np.rint(delta / _BOUNDS_T)
+    rel_vel = torpedo_vel
+    rel_vel *= TORPEDO_MOVES_PER_TICK
+    rel_vel -= vel.T[:, None]
+    closing = -np.add(*(delta * rel_vel))
+    closest_time = closing / np.maximum(np.add(*(rel_vel * rel_vel)), 1e-9)
+    np.clip(closest_time, 0, DODGE_HORIZON_TICKS, out=closest_time)
+    miss = rel_vel * closest_time
+    miss += delta
+    threatening = (
+        env.torpedo_alive.reshape(num_envs, -1).T
+        & (closing > 0)
+        & (closest_time < DODGE_HORIZON_TICKS)
+        & (np.add(*(miss * miss)) < HIT_RADIUS**2)
+    )
+    threat_times = np.where(threatening, closest_time, np.inf)
+    threat = threat_times.argmin(axis=0)
+
+    ticks = env.ticks
+    return _Situation(
+        alive=env.ship_alive[:, ship],
+        pos=pos,
+        heading=heading,
+        vel=vel,
+        enemy_delta=deltas[envs, enemy],
+        enemy_vel=env.ship_vel[envs, enemy],
+        enemy_dist=dists[envs, enemy],
+        has_enemy=enemies.any(axis=1),
+        threat_delta=delta[:, threat, envs].T,
+        threat_time=closest_time[threat, envs],
+        threat_vel=rel_vel[:, threat, envs].T,
+        has_threat=np.isfinite(threat_times[threat, envs]),
+        phaser_ready=(
+            ticks - env.phaser_last_fired[:, ship] >= PHASER_FIRE_CD_TICKS
+        ),
+        torpedo_ready=(
+            ticks - env.torpedo_last_fired[:, ship] >= TORPEDO_FIRE_CD_TICKS
+        ),
+    )
+
+
+def _dodge(situation: _Situation, ang: np.ndarray) -> np.ndarray:
+    """Returns the action that moves the ship out of the threat's path,
+    thrusting at right angles to it once the ship faces that way
+    """
+    # of the two directions at right angles to the torpedo's path, move to
+    # the side the ship is already on
+    vel = situation.threat_vel
+    side = np.stack((-vel[..., 1], vel[..., 0]), axis=-1)
+    away = np.einsum("nc,nc->n", side, -situation.threat_delta)
+    side *= np.where(away < 0, -1, 1)[:, None]
+    error = _angle_error(side, ang)
+    return np.where(
+        np.abs(error) <= DODGE_THRUST_ANGLE,
+        ShipAction.THRUST.value,
+        _turn_towards(error),
+    )
+
+
+def _thrust_up_to(
+    situation: _Situation, max_speed: float, want_thrust: np.ndarray
+) -> np.ndarray:
+    """Returns where the ship should thrust, only while its speed along its
+    heading is below max_speed since nothing slows it down
+    """
+    speed = np.einsum("nc,nc->n", situation.vel, situation.heading)
+    return want_thrust & (speed < max_speed)
+
+
+def _select(
+    situation: _Situation,
+    choices: list[tuple[np.ndarray, np.ndarray]],
+) -> np.ndarray:
+    """Returns the action of the first condition that holds in each env, or
+    NOOP. Dead ships always take NOOP.
+    """
+    conditions, actions = zip(*choices)
+    action = np.select(
+        [condition & situation.alive for condition in conditions],
+        actions,
+        ShipAction.NOOP.value,
+    )
+    return action.astype(np.int64)
+
+
+def baseline_d(env: "VectorSpaceWar", ship: int) -> np.ndarray:
+    """Defensive, phaser heavy policy.
+
+    In order of priority, it fires its phaser at an incoming torpedo in
+    front of it, dodges torpedoes, fires its phaser at an enemy in range and
+    in front of it, turns towards the enemy, and closes in until the enemy
+    is in range.
+    """
+    situation = _observe(env, ship)
+    ang = env.ship_ang[:, ship]
+
+    # the phaser is instant, so it aims straight at its target
+    threat_error = _angle_error(situation.threat_delta, ang)
+    threat_dist = np.hypot(*situation.threat_delta.T)
+    enemy_error = _angle_error(situation.enemy_delta, ang)
+    turn_to_enemy = _turn_towards(enemy_error)
+
+    def in_sights(error: np.ndarray, dist: np.ndarray) -> np.ndarray:
+        """Whether the phaser would pass within reach of the target's center"""
+        miss = dist * np.abs(np.sin(np.radians(error)))
+        return (
+            (np.abs(error) < 90)
+            & (dist < PHASER_LENGTH)
+            & (miss < HIT_RADIUS / 2)
+        )
+
+    shoot_threat = (
+        situation.has_threat
+        & situation.phaser_ready
+        & in_sights(threat_error, threat_dist)
+    )
+    shoot_enemy = (
+        situation.has_enemy
+        & situation.phaser_ready
+        & in_sights(enemy_error, situation.enemy_dist)
+    )
+    approach = _thrust_up_to(
+        situation,
+        DEFENSIVE_SPEED,
+        situation.has_enemy
+        & (situation.enemy_dist > DEFENSIVE_RANGE)
+        & (turn_to_enemy == ShipAction.NOOP.value),
+    )
+    return _select(
+        situation,
+        [
+            (shoot_threat, ShipAction.FIRE_PHASER.value),
+            (situation.has_threat, _dodge(situation, ang)),
+            (shoot_enemy, ShipAction.FIRE_PHASER.value),
+            (approach, ShipAction.THRUST.value),
+            (situation.has_enemy, turn_to_enemy),
+        ],
+    )
+
+
+def baseline_o(env: "VectorSpaceWar", ship: int) -> np.ndarray:
+    """Offensive, torpedo heavy policy.
+
+    In order of priority, it dodges torpedoes about to hit it, fires a
+    torpedo when it is aimed at where the enemy will be, turns to lead the
+    enemy, and closes in on it.
+    """
+    situation = _observe(env, ship)
+    ang = env.ship_ang[:, ship]
+
+    # lead the enemy by the time a torpedo takes to reach it. Torpedoes
+    # inherit the ship's velocity, and move TORPEDO_MOVES_PER_TICK times per
+    # tick.
+    flight_time = situation.enemy_dist / (
+        TORPEDO_MOVES_PER_TICK * TORPEDO_SPEED
+    )
+    lead = wrap_delta(
+        situation.enemy_delta
+        + (situation.enemy_vel - TORPEDO_MOVES_PER_TICK * situation.vel)
+        * flight_time[:, None]
+    )
+    lead_error = _angle_error(lead, ang)
+    turn_to_lead = _turn_towards(lead_error)
+
+    late_threat = situation.has_threat & (
+        situation.threat_time < LATE_DODGE_TICKS
+    )
+    # a torpedo launched past the edge of the screen is wrapped back onto
+    # the edge, where the ship can fly into it
+    spawn = situation.pos + TORPEDO_SPAWN_DIST * situation.heading
+    fire = (
+        situation.has_enemy
+        & situation.torpedo_ready
+        & ((spawn > 0) & (spawn < BOUNDS)).all(axis=1)
+        & (situation.enemy_dist > TORPEDO_SPAWN_DIST + HIT_RADIUS)
+        & (situation.enemy_dist < TORPEDO_RANGE)
+        & (np.abs(lead_error) <= ROTATION_STEP)
+    )
+    approach = _thrust_up_to(
+        situation,
+        OFFENSIVE_SPEED,
+        situation.has_enemy
+        & (np.abs(_angle_error(situation.enemy_delta, ang)) <= ROTATION_STEP)
+        & (situation.enemy_dist > TORPEDO_RANGE / 2),
+    )
+    return _select(
+        situation,
+        [
+            (late_threat, _dodge(situation, ang)),
+            (fire, ShipAction.FIRE_TORPEDO.value),
+            (approach, ShipAction.THRUST.value),
+            (situation.has_enemy, turn_to_lead),
+        ],
+    )
+
+
+# The baseline policies by name
+BASELINES: dict[str, Policy] = {
+    "baseline_d": baseline_d,
+    "baseline_o": baseline_o,
+}
@@ -0,0 +1,283 @@
+"""Experience replay for DQN agents
+
+Transitions are kept in a circular buffer of np.memmap files, so the buffer
+can be much larger than RAM. Each observation is stored once: the next
+observation of a transition is the observation of the one after it, and
+stacked pixel observations are rebuilt from the single newest frame stored
+per step.
+"""
+
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+
+from space_war.sim.conf import FRAME_STACK
+
+
+class Batch(NamedTuple):
+    """A batch of sampled transitions"""
+
+    obs: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+    next_obs: np.ndarray
+    dones: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+
+
+class SumTree:
+    """Binary tree where each node is the sum of its children, used to
+    sample leaves in proportion to their priority.
+
+    Updates and sampling work on whole batches of leaves, one tree level at
+    a time.
+
+    Attributes
+    ----------
+    capacity: The number of leaves
+    tree: The nodes of the tree, the root is at 1 and the children of node i
+        are at 2i and 2i + 1. The leaves start at index capacity.
+
+    """
+
+    capacity: int
+    tree: np.ndarray
+
+    def __init__(self, capacity: int) -> None:
+        # round up to a power of 2, so every leaf is at the same depth
+        self.capacity = 1 << max(0, (capacity - 1).bit_length())
+        self.tree = np.zeros(2 * self.capacity)
+
+    @property
+    def total(self) -> float:
+        """The sum of every priority"""
+        return self.tree[1]
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray):
+        """Sets the priority of the leaves and updates their ancestors"""
+        nodes = np.asarray(indices) + self.capacity
+        self.tree[nodes] = priorities
+        # every node is at the same depth, duplicates just get the same sum
+        for _ in range(self.capacity.bit_length() - 1):
+            nodes = nodes // 2
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """Returns the leaf whose range of the cumulative priorities contains
+        each value
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.intp)
+        while nodes[0] < self.capacity:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values >= left_sum
+            values -= left_sum * go_right
+            nodes = left + go_right
+        return nodes - self.capacity
+
+    def get(self, indices: np.ndarray) -> np.ndarray:
+        """Returns the priority of the leaves"""
+        return self.tree[np.asarray(indices) + self.capacity]
+
+
+class ReplayBuffer:
+    """Circular buffer of transitions from a single stream of episodes.
+
+    add is called once per step with the newest frame of the observation the
+    action was taken from. With frame_stack > 1, sampled observations are
+    the frame_stack most recent frames, oldest first, padded with the first
+    frame of the episode at its start.
+
+    With prioritized sampling, transitions are sampled in proportion to
+    their priority to the power of alpha, and new transitions get the
+    largest priority seen so far.
+
+    Attributes
+    ----------
+    capacity: The max number of transitions stored
+    frame_stack: The number of frames in each observation
+    prioritized: Whether transitions are sampled by priority
+    alpha: How strongly priorities skew sampling, 0 is uniform
+    size: The number of transitions stored
+    cursor: The index the next transition is written to
+    frames: The newest frame of each observation
+    actions: The action taken from each observation
+    rewards: The reward received for each action
+    dones: Whether each action ended the episode
+    priorities: The sum tree of priorities, if prioritized
+
+    """
+
+    capacity: int
+    frame_stack: int
+    prioritized: bool
+    alpha: float
+    size: int
+    cursor: int
+    frames: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+    dones: np.ndarray
+    priorities: Optional[SumTree]
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        capacity: int,
+        frame_shape: tuple[int, ...],
+        frame_dtype: np.dtype = np.float32,
+        frame_stack: int = FRAME_STACK,
+        prioritized: bool = False,
+        alpha: float = 0.6,
+    ) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity
+        self.frame_stack = frame_stack
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.size = 0
+        self.cursor = 0
+
+        def open_memmap(name, shape, dtype):
+            return np.lib.format.open_memmap(
+                directory / f"{name}.npy", mode="w+", shape=shape, dtype=dtype
+            )
+
+        self.frames = open_memmap(
+            "frames", (capacity, *frame_shape), frame_dtype
+        )
+        self.actions = open_memmap("actions", (capacity,), np.int64)
+        self.rewards = open_memmap("rewards", (capacity,), np.float32)
+        self.dones = open_memmap("dones", (capacity,), np.bool_)
+        self.priorities = SumTree(capacity) if prioritized else None
+        self._max_priority = 1.0
+        # offsets of each frame in a stack from its newest frame
+        self._stack_offsets = np.arange(1 - frame_stack, 1)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, frame: np.ndarray, action: int, reward: float, done: bool):
+        """Stores a transition, overwriting the oldest when full"""
+        idx = self.cursor
+        self.frames[idx] = frame
+        self.actions[idx] = action
+        self.rewards[idx] = reward
+        self.dones[idx] = done
+        self.cursor = (idx + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+        if self.priorities:
+            # the previous transition now has its next observation. The
+            # newest does not yet, and when full, the stacks right after the
+            # oldest frame are incomplete.
+            num_invalid = self.frame_stack if self.size == self.capacity else 1
+            indices = (idx + np.arange(-1, num_invalid)) % self.capacity
+            priorities = np.zeros(len(indices))
+            if self.size > 1:
+                priorities[0] = self._max_priority**self.alpha
+            self.priorities.update(indices, priorities)
+
+    def _oldest(self) -> int:
+        """Returns the index of the oldest stored transition"""
+        return self.cursor if self.size == self.capacity else 0
+
+    def _stack_indices(self, indices: np.ndarray) -> np.ndarray:
+        """Returns the indices of the frames in each observation's stack,
+        repeating the first frame of the episode where the stack crosses
+        the start of the episode or of the stored data
+        """
+        # age of each frame relative to the oldest stored frame
+        ages = (indices - self._oldest()) % self.capacity
+        ages = ages[:, None] + self._stack_offsets
+        stack = (self._oldest() + ages) % self.capacity
+
+        # frames at or before the end of an earlier episode are invalid
+        ended = self.dones[stack[:, :-1]] | (ages[:, :-1] < 0)
+        invalid = np.flip(
+            np.logical_or.accumulate(np.flip(ended, axis=1), axis=1), axis=1
+        )
+        num_invalid = invalid.sum(axis=1)
+        first_valid = stack[np.arange(len(stack)), num_invalid]
+        return np.where(
+            np.pad(invalid, ((0, 0), (0, 1))), first_valid[:, None], stack
+        )
+
+    def _get_obs(self, indices: np.ndarray) -> np.ndarray:
+        """Returns the observations at the indices"""
+        if self.frame_stack == 1:
+            return self.frames[indices]
+        return self.frames[self._stack_indices(indices)]
+
+    def sample(
+        self,
+        batch_size: int,
+        rng: np.random.Generator,
+        beta: float = 0.4,
+    ) -> Batch:
+        """Samples a batch of transitions.
+
+        With prioritized sampling, the weights correct for the sampling
+        bias, annealed by beta and normalized by the largest weight in the
+        batch. Otherwise, the weights are all one.
+
+        Raises a ValueError if no transition can be sampled yet.
+        """
+        if self.priorities is not None:
+            if self.priorities.total <= 0:
+                raise ValueError("No transitions with a priority to sample")
+            # stratified, one sample from each equal slice of the total
+            bounds = np.linspace(0, self.priorities.total, batch_size + 1)
+            indices = self.priorities.find(rng.uniform(bounds[:-1], bounds[1:]))
+            probs = self.priorities.get(indices) / self.priorities.total
+            weights = (self.size * probs) ** -beta
+            weights /= weights.max()
+        else:
+            # skip the newest, which has no next observation, and when full,
+            # the incomplete stacks right after the oldest frame
+            start = self.frame_stack - 1 if self.size == self.capacity else 0
+            if self.size - 1 <= start:
+                raise ValueError(
+                    f"Sampling needs at least {start + 2} transitions, the "
+                    f"buffer has {self.size}"
+                )
+            ages = rng.integers(start, self.size - 1, size=batch_size)
+            indices = (self._oldest() + ages) % self.capacity
+            weights = np.ones(batch_size)
+
+        next_indices = (indices + 1) % self.capacity
+        return Batch(
+            obs=self._get_obs(indices),
+            actions=self.actions[indices],
+            rewards=self.rewards[indices],
+            next_obs=self._get_obs(next_indices),
+            dones=self.dones[indices],
+            indices=indices,
+            weights=weights.astype(np.float32),
+        )
+
+    def update_priorities(self, indices: np.ndarray, priorities: np.ndarray):
+        """Sets the priorities of sampled transitions, e.g. to their TD
+        errors plus a small constant so none are starved.
+
+        Transitions that can no longer be sampled since they were sampled,
+        because they were overwritten or lost their frames, are skipped.
+        Raises a ValueError if the buffer is not prioritized.
+        """
+        if self.priorities is None:
+            raise ValueError("The buffer was created with prioritized=False")
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self._max_priority = max(self._max_priority, float(priorities.max()))
+        valid = self.priorities.get(indices) > 0
+        self.priorities.update(
+            np.asarray(indices)[valid], priorities[valid] ** self.alpha
+        )
+
+    def flush(self):
+        """Writes the buffer to disk"""
+        for array in (self.frames, self.actions, self.rewards, self.dones):
+            array.flush()
@@ -0,0 +1,377 @@
+"""Simulation throughput benchmarks
+
+Steps standard scenarios for a fixed number of ticks and measures the steps
+per second and the latency of each tick. Results are written to a JSON file
+with the commit they were measured at, and can be compared with the results
+of an earlier run to catch regressions:
+
+    python -m space_war.benchmark --output after.json --compare before.json
+
+Matches that end during a scenario are reset outside of the timed ticks.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+import pygame
+
+from space_war.sim.conf import (
+    MAX_TORPEDOES_PER_SHIP,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    ShipAction,
+)
+from space_war.sim.render import PixelRenderer
+from space_war.sim.ship import BaseShip
+from space_war.sim.sim import SpaceWarSim
+from space_war.sim.vector import VectorSpaceWar
+
+# The version of the results file format
+RESULTS_VERSION = 1
+# The latency percentiles reported for each scenario
+PERCENTILES = (50, 90, 99)
+# The slowdown in steps per second reported as a regression
+REGRESSION_THRESHOLD = 0.1
+# The number of envs in the VectorSpaceWar scenario
+NUM_VECTOR_ENVS = 1024
+# The number of ships in the melee scenarios
+NUM_MELEE_SHIPS = 8
+
+
+class Scenario(NamedTuple):
+    """A benchmark scenario.
+
+    setup returns a function that runs a single tick and returns whether the
+    match is over, and a function that resets the match.
+    """
+
+    name: str
+    description: str
+    setup: Callable[
+        [np.random.Generator], tuple[Callable[[], bool], Callable[[], None]]
+    ]
+    # the number of matches stepped each tick
+    num_envs: int = 1
+
+
+def _sim_scenario(
+    num_ships: int = 2,
+    start_pos: Optional[list[tuple[float, float]]] = None,
+    start_ang: Optional[list[float]] = None,
+    action: Optional[ShipAction] = None,
+    phaser_every_tick: bool = False,
+    draw: bool = False,
+    pixels: bool = False,
+):
+    """Returns the setup of a SpaceWarSim scenario.
+
+    Every ship takes the action each tick, or a random action if it is None.
+    With phaser_every_tick, the phaser cooldowns are cleared before each tick
+    so a phaser is cast every tick. With draw, the sprites are drawn to an
+    off-screen surface each tick, and with pixels, the pixel renderer renders
+    a frame each tick.
+    """
+
+    def setup(rng: np.random.Generator):
+        sim = SpaceWarSim(
+            ship_classes=[BaseShip] * num_ships,
+            start_pos=start_pos or _grid_positions(num_ships),
+            start_ang=start_ang or [0] * num_ships,
+            max_ticks=np.iinfo(np.int64).max,
+            renderer=PixelRenderer() if pixels else None,
+        )
+        surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        actions = list(ShipAction)
+
+        def tick() -> bool:
+            if phaser_every_tick:
+                for player in sim.player_sprites:
+                    player.phaser_last_fired = None
+            if action is None:
+                tick_actions = [
+                    actions[idx] for idx in rng.integers(0, 6, num_ships)
+                ]
+            else:
+                tick_actions = [action] * num_ships
+            _, _, done = sim.step(tick_actions)
+            if draw:
+                surface.fill("black")
+                sim.draw(surface)
+            return done
+
+        return tick, sim.reset
+
+    return setup
+
+
+def _grid_positions(num_ships: int) -> list[tuple[float, float]]:
+    """Returns start positions spread out in a grid across the screen"""
+    cols = int(np.ceil(np.sqrt(num_ships)))
+    rows = int(np.ceil(num_ships / cols))
+    return [
+        (
+            SCREEN_WIDTH * (idx % cols + 0.5) / cols,
+            SCREEN_HEIGHT * (idx // cols + 0.5) / rows,
+        )
+        for idx in range(num_ships)
+    ]
+
+
+def _vector_setup(rng: np.random.Generator):
+    """Steps NUM_VECTOR_ENVS matches at once with random actions"""
+    env = VectorSpaceWar(NUM_VECTOR_ENVS)
+
+    def tick() -> bool:
+        env.step(rng.integers(0, 6, (env.num_envs, env.num_ships)))
+        # finished envs are reset by step
+        return False
+
+    return tick, env.reset
+
+
+# Headings whose torpedo paths wrap around the screen without hitting either
+# ship while the torpedoes are in flight, so the salvo never ends the match
+_SALVO_POS = [
+    (SCREEN_WIDTH / 4, SCREEN_HEIGHT / 4),
+    (SCREEN_WIDTH * 0.75, SCREEN_HEIGHT * 0.75),
+]
+_SALVO_ANG = [22.5, 202.5]
+# Both ships sit near an edge facing across it, so every phaser wraps
+_WRAP_POS = [(SCREEN_WIDTH - 20, SCREEN_HEIGHT / 4), (20, SCREEN_HEIGHT * 0.75)]
+_WRAP_ANG = [0, 180]
+
+SCENARIOS = [
+    Scenario(
+        "idle",
+        "two ships drifting without acting",
+        _sim_scenario(action=ShipAction.NOOP),
+    ),
+    Scenario(
+        "torpedo_salvo",
+        f"two ships firing until all {MAX_TORPEDOES_PER_SHIP} torpedoes "
+        "each are in flight",
+        _sim_scenario(
+            start_pos=_SALVO_POS,
+            start_ang=_SALVO_ANG,
+            action=ShipAction.FIRE_TORPEDO,
+        ),
+    ),
+    Scenario(
+        "phaser_wrap",
+        "two ships casting a phaser across the screen wrap every tick",
+        _sim_scenario(
+            start_pos=_WRAP_POS,
+            start_ang=_WRAP_ANG,
+            action=ShipAction.FIRE_PHASER,
+            phaser_every_tick=True,
+        ),
+    ),
+    Scenario(
+        "melee",
+        f"{NUM_MELEE_SHIPS} ships taking random actions",
+        _sim_scenario(num_ships=NUM_MELEE_SHIPS),
+    ),
+    Scenario(
+        "melee_draw",
+        f"{NUM_MELEE_SHIPS} ships taking random actions, drawn each tick",
+        _sim_scenario(num_ships=NUM_MELEE_SHIPS, draw=True),
+    ),
+    Scenario(
+        "melee_pixels",
+        f"{NUM_MELEE_SHIPS} ships taking random actions, rendered to pixel "
+        "observations each tick",
+        _sim_scenario(num_ships=NUM_MELEE_SHIPS, pixels=True),
+    ),
+    Scenario(
+        "vector",
+        f"{NUM_VECTOR_ENVS} VectorSpaceWar matches taking random actions",
+        _vector_setup,
+        num_envs=NUM_VECTOR_ENVS,
+    ),
+]
+
+
+def run_scenario(
+    scenario: Scenario, num_ticks: int, warmup_ticks: int, seed: int
+) -> dict:
+    """Runs the scenario and returns its results"""
+    rng = np.random.default_rng(seed)
+    tick, reset = scenario.setup(rng)
+    for _ in range(warmup_ticks):
+        if tick():
+            reset()
+
+    latencies = np.zeros(num_ticks, dtype=np.int64)
+    num_resets = 0
+    for idx in range(num_ticks):
+        start = time.perf_counter_ns()
+        done = tick()
+        latencies[idx] = time.perf_counter_ns() - start
+        if done:
+            reset()
+            num_resets += 1
+
+    latencies_us = latencies / 1000
+    total_s = latencies.sum() / 1e9
+    return {
+        "description": scenario.description,
+        "ticks": num_ticks,
+        "num_envs": scenario.num_envs,
+        "resets": num_resets,
+        "steps_per_sec": num_ticks * scenario.num_envs / total_s,
+        "latency_us": {
+            "mean": float(latencies_us.mean()),
+            **{
+                f"p{percentile}": float(np.percentile(latencies_us, percentile))
+                for percentile in PERCENTILES
+            },
+            "max": float(latencies_us.max()),
+        },
+    }
+
+
+def _git_commit() -> Optional[str]:
+    """Returns the commit of the working tree, if it is a git repo"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    names: Optional[list[str]] = None,
+    num_ticks: int = 2000,
+    warmup_ticks: int = 200,
+    seed: int = 0,
+) -> dict:
+    """Runs the scenarios with the names, or every scenario, and returns the
+    results with the environment they were measured in
+    """
+    results = {
+        "version": RESULTS_VERSION,
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "machine": platform.platform(),
+        "scenarios": {},
+    }
+    for scenario in SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+        results["scenarios"][scenario.name] = run_scenario(
+            scenario, num_ticks, warmup_ticks, seed
+        )
+    return results
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD
+) -> tuple[str, list[str]]:
+    """Returns a report comparing the steps per second of the scenarios in
+    both results, and the names of the scenarios that slowed down by more
+    than the threshold
+    """
+    lines = [f"{'scenario':<14} {'before':>12} {'after':>12} {'change':>8}"]
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        change = scenario["steps_per_sec"] / before["steps_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        lines.append(
+            f"{name:<14} {before['steps_per_sec']:>12.0f}"
+            f" {scenario['steps_per_sec']:>12.0f} {change:>+8.1%}{flag}"
+        )
+    return "\n".join(lines), regressions
+
+
+def format_results(results: dict) -> str:
+    """Returns a table of the results"""
+    lines = [
+        f"{'scenario':<14} {'steps/s':>12} {'mean us':>9}"
+        + "".join(f" {f'p{percentile} us':>9}" for percentile in PERCENTILES)
+        + f" {'max us':>9}"
+    ]
+    for name, scenario in results["scenarios"].items():
+        latency = scenario["latency_us"]
+        lines.append(
+            f"{name:<14} {scenario['steps_per_sec']:>12.0f}"
+            f" {latency['mean']:>9.1f}"
+            + "".join(
+                f" {latency[f'p{percentile}']:>9.1f}"
+                for percentile in PERCENTILES
+            )
+            + f" {latency['max']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Benchmarks the simulation and writes the results to a JSON file"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help="the scenarios to run, every scenario by default: "
+        + ", ".join(scenario.name for scenario in SCENARIOS),
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark.json"),
+        help="the file the results are written to",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        help="earlier results to compare against, exits with status 1 if a "
+        "scenario regressed",
+    )
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="the slowdown reported as a regression, e.g. 0.1 for 10%%",
+    )
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - {scenario.name for scenario in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(args.scenarios, args.ticks, args.warmup, args.seed)
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(format_results(results))
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        report, regressions = compare(results, baseline, args.threshold)
+        print()
+        print(report)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,127 +1,105 @@
-"""Contains the main entrypoint logic"""
+"""Contains the main entrypoint logic
+
+Set SPACE_WAR_PROFILE to a file path to profile the game loop and append a
+summary of the timings to the file periodically. F3 shows the timings on
+screen.
+
+The simulation runs at SIM_TICK_RATE ticks per second and the window is
+rendered at RENDER_FPS, independently of each other. With
+DIRTY_RECT_RENDERING, only the parts of the window drawn to in this or
+the last frame are cleared and updated.
+"""
 import asyncio
-from pathlib import Path
+import os
 
 import pygame
 
-from space_war.sim.conf import (
-    MAX_FPS,
-    SCREEN_HEIGHT,
-    SCREEN_WIDTH,
-    ShipSpriteConfig,
-)
+from space_war.sim.clock import FrameScheduler
+from space_war.sim.conf import DIRTY_RECT_RENDERING, SCREEN_HEIGHT, SCREEN_WIDTH
+from space_war.sim.dirty import DirtyRects
+from space_war.sim.profiling import PROFILER, ProfilerOverlay
 from space_war.sim.ship import BaseShip, HumanShip
-
-# pygame setup
-pygame.init()
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-clock = pygame.time.Clock()
-
-# TODO: Use dummy display for training headless
-# import os
-# os.environ["SDL_VIDEODRIVER"] = "dummy"
-
-
-def render_sprites(sprite_cfg, player_target_group, surface):
-    """Draws and updates sprites and groups to screen"""
-    for player in sprite_cfg:
-        player["sprite"].draw_groups(surface)
-        player["group"].draw(surface)
-        player["group"].update(target_group=player_target_group)
-        player["sprite"].update_groups(target_group=player_target_group)
-
-
-def get_player_sprites(
-    pos_iter: list[tuple[int, int]],
-    ang_iter: list[int],
-    instance_iter: list[BaseShip],
-) -> tuple[list[BaseShip], list[ShipSpriteConfig]]:
-    """Initialize player sprites and returns a list of sprites and
-    configuration
-    """
-    sprites = []
-    sprite_cfg = []
-    for player_id, instance in enumerate(instance_iter):
-        player_sprite = instance(
-            player_id=player_id,
-            image_path=Path(
-                "space_war", "sim", "assets", f"player_{player_id}.png"
-            ),
-            start_pos=pos_iter[player_id],
-            start_ang=ang_iter[player_id],
-        )
-        player_group = pygame.sprite.GroupSingle()
-        player_group.add(player_sprite)
-        sprites.append(player_sprite)
-        sprite_cfg.append(
-            {"id": player_id, "sprite": player_sprite, "group": player_group}
-        )
-    return sprites, sprite_cfg
+from space_war.sim.sim import SpaceWarSim
 
 
 def init():
-    """Initialize sprites, groups, and configuration"""
+    """Initialize the simulation with a human player and a dummy ship"""
     # TODO: hydra will make this cleaner
-    player_sprites, cfg = get_player_sprites(
-        instance_iter=[HumanShip, BaseShip],
-        pos_iter=[
+    return SpaceWarSim(
+        ship_classes=[HumanShip, BaseShip],
+        start_pos=[
+            (SCREEN_WIDTH / 4, SCREEN_HEIGHT / 4),
             (
-                screen.get_width() / 4,
-                screen.get_height() / 4,
-            ),
-            (
-                screen.get_width() - screen.get_width() / 4,
-                screen.get_height() - screen.get_height() / 4,
+                SCREEN_WIDTH - SCREEN_WIDTH / 4,
+                SCREEN_HEIGHT - SCREEN_HEIGHT / 4,
             ),
         ],
-        ang_iter=[0, 180],
+        start_ang=[0, 180],
     )
 
-    torpedo_group = pygame.sprite.Group()
-    player_target_group = pygame.sprite.Group()
-    player_target_group.add(player_sprites)
-
-    return player_sprites, cfg, torpedo_group, player_target_group
-
 
 async def main():
     """Entrypoint for starting up the pygame"""
-    player_sprites, cfg, torpedo_group, player_target_group = init()
+    # pygame setup, only once the game is started so importing this module
+    # does not open a window
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    sim = init()
+    overlay = ProfilerOverlay()
+    dirty = DirtyRects()
+    scheduler = FrameScheduler()
+    if os.environ.get("SPACE_WAR_PROFILE"):
+        PROFILER.enable(dump_path=os.environ["SPACE_WAR_PROFILE"])
 
     running = True
 
     while running:
         # event loop
-        for event in pygame.event.get():
-            for player in player_sprites:
-                if isinstance(player, HumanShip):
-                    player.handle_events(event)
-            if (
-                event.type == pygame.KEYDOWN
-                and event.key == pygame.constants.K_r
-            ):
-                torpedo_group.empty()
-                player_target_group.empty()
-                for sprite_cfg in cfg:
-                    sprite_cfg["group"].empty()
-                player_sprites, cfg, torpedo_group, player_target_group = init()
-            # pygame.QUIT event means the user clicked X to close your window
-            if event.type == pygame.QUIT:
-                running = False
-
-        # fill the screen with a color to wipe away anything from last frame
-        screen.fill("black")
-
-        # Update torpedo group membership
-        torpedo_group.add([player.torpedo_group for player in player_sprites])
-        player_target_group.add(torpedo_group)
-
-        # draw sprites to screen and update
-        render_sprites(cfg, player_target_group, screen)
-
-        pygame.display.update()
-        await asyncio.sleep(0)
-        clock.tick(MAX_FPS)
+        with PROFILER.section("events"):
+            for event in pygame.event.get():
+                for player in sim.player_sprites:
+                    if isinstance(player, HumanShip):
+                        player.handle_events(event)
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.constants.K_r:
+                        sim.reset()
+                    elif event.key == pygame.constants.K_F3:
+                        overlay.toggle()
+                # the window contents may be lost while it is covered
+                if event.type == pygame.WINDOWEXPOSED:
+                    dirty.invalidate()
+                # pygame.QUIT event means the user clicked X to close your
+                # window
+                if event.type == pygame.QUIT:
+                    running = False
+
+        # run the ticks due since the last frame, taking the actions of the
+        # keys held down each tick. The simulation ends the profiler's frame
+        # after each tick.
+        for _ in range(scheduler.ticks_due()):
+            for player in sim.player_sprites:
+                if isinstance(player, HumanShip) and player.alive():
+                    for action in player.get_actions():
+                        player.apply_action(action)
+            sim.step()
+
+        if scheduler.render_due():
+            # wipe away anything from last frame
+            if DIRTY_RECT_RENDERING:
+                dirty.clear(screen)
+            else:
+                screen.fill("black")
+
+            # draw sprites to screen and update
+            rects = sim.draw(screen)
+            rects += overlay.draw(screen)
+
+            with PROFILER.section("display_update"):
+                if DIRTY_RECT_RENDERING:
+                    pygame.display.update(dirty.update(rects))
+                else:
+                    pygame.display.update()
+        await asyncio.sleep(scheduler.wait_time())
 
     pygame.quit()
 
@@ -0,0 +1,136 @@
+"""Parity checks between SpaceWarSim and VectorSpaceWar
+
+Plays seeded matches in both envs with the same random actions and reports
+the matches where they disagree. A match agrees when, after every step, the
+position, velocity, angle, and alive flag of each ship and the positions of
+the torpedoes in flight are the same, and it ends on the same step with the
+same rewards:
+
+    python -m space_war.parity --matches 40 --ships 2
+
+Matches start from seeded random positions and angles, the same way as
+tournament matches. Exits with status 1 if any match disagrees. The tests
+in tests/test_parity.py play several seed ranges and numbers of ships.
+"""
+
+import argparse
+import sys
+from typing import Optional
+
+import numpy as np
+
+from space_war.sim.conf import MAX_SIM_TICKS, ShipAction
+from space_war.sim.ship import BaseShip
+from space_war.sim.sim import SpaceWarSim
+from space_war.sim.vector import VectorSpaceWar
+from space_war.tournament import random_starts
+
+# The absolute difference allowed between the states of the two envs
+TOLERANCE = 1e-6
+
+
+def _torpedo_positions(positions: np.ndarray) -> np.ndarray:
+    """Returns the torpedo positions sorted by x, then y, since the envs
+    keep their torpedoes in different orders
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    return positions[np.lexsort((positions[:, 1], positions[:, 0]))]
+
+
+def compare_states(sim: SpaceWarSim, env: VectorSpaceWar) -> Optional[str]:
+    """Returns what differs between the sim and the first match of the env,
+    or None if their states are the same
+    """
+    for ship_idx, state in enumerate(sim.get_ship_states()):
+        for name, value, vector_value in (
+            ("pos", state["pos"], env.ship_pos[0, ship_idx]),
+            ("vel", state["vel"], env.ship_vel[0, ship_idx]),
+            ("ang", state["ang"], env.ship_ang[0, ship_idx]),
+        ):
+            if not np.allclose(value, vector_value, rtol=0, atol=TOLERANCE):
+                return f"ship {ship_idx} {name} {value} != {vector_value}"
+        if state["alive"] != env.ship_alive[0, ship_idx]:
+            return f"ship {ship_idx} alive {state['alive']}"
+
+        torpedoes = _torpedo_positions(
+            [pos for pos, _vel in state["torpedoes"]]
+        )
+        vector_torpedoes = _torpedo_positions(
+            env.torpedo_pos[0, ship_idx][env.torpedo_alive[0, ship_idx]]
+        )
+        if torpedoes.shape != vector_torpedoes.shape or not np.allclose(
+            torpedoes, vector_torpedoes, rtol=0, atol=TOLERANCE
+        ):
+            return (
+                f"ship {ship_idx} has {len(torpedoes)} torpedoes, "
+                f"{len(vector_torpedoes)} in the vector env"
+            )
+    return None
+
+
+def play_match(
+    seed: int, num_ships: int = 2, max_ticks: int = MAX_SIM_TICKS
+) -> Optional[str]:
+    """Plays a seeded match in both envs, returning the step and what
+    differed at the first disagreement, or None if they agree
+    """
+    rng = np.random.default_rng(seed)
+    start_pos, start_ang = random_starts(rng, 1, num_ships)
+    start_pos = [tuple(pos) for pos in start_pos[0].tolist()]
+    start_ang = start_ang[0].tolist()
+    sim = SpaceWarSim(
+        ship_classes=[BaseShip] * num_ships,
+        start_pos=start_pos,
+        start_ang=start_ang,
+        max_ticks=max_ticks,
+    )
+    env = VectorSpaceWar(
+        1, start_pos=start_pos, start_ang=start_ang, max_ticks=max_ticks
+    )
+
+    actions = list(ShipAction)
+    step = 0
+    done = False
+    while not done:
+        step += 1
+        action_idx = rng.integers(0, len(actions), num_ships)
+        _, rewards, done = sim.step([actions[idx] for idx in action_idx])
+        _, vector_rewards, vector_done = env.step(action_idx[None])
+
+        if done != vector_done[0]:
+            return f"step {step}: done {done} != {vector_done[0]}"
+        if rewards != vector_rewards[0].tolist():
+            return f"step {step}: rewards {rewards} != {vector_rewards[0]}"
+        # the vector env resets finished matches, so only the outcome of
+        # the last step can be compared
+        if not done:
+            difference = compare_states(sim, env)
+            if difference:
+                return f"step {step}: {difference}"
+    return None
+
+
+def main():
+    """Plays seeded matches in SpaceWarSim and VectorSpaceWar and reports the
+    matches where they disagree
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--matches", type=int, default=40)
+    parser.add_argument("--ships", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ticks", type=int, default=MAX_SIM_TICKS)
+    args = parser.parse_args()
+
+    disagreements = 0
+    for seed in range(args.seed, args.seed + args.matches):
+        difference = play_match(seed, args.ships, args.max_ticks)
+        if difference:
+            disagreements += 1
+            print(f"seed {seed}: {difference}")
+    print(f"{disagreements} of {args.matches} matches disagree")
+    if disagreements:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Shared sprite assets
+
+Each image is decoded, converted, and rotated to every heading once per
+process, and every sprite of every match shares the result, so creating the
+ships on reset never touches the disk:
+
+    asset = ASSETS.ship(player_id)
+    image, rect = asset.images[heading], asset.rects[heading]
+
+HEADLESS_ASSETS keeps only the collision geometry of each asset, the rects
+and masks, and drops the surfaces once the geometry is built. Sprites made
+from headless assets have no image, so they can be simulated but not drawn.
+
+The overlap table of two assets answers whether their masks overlap for
+every pair of headings and rect offsets, so batched simulations can test
+masks without any sprites. The tables are precomputed by the overlaps
+module:
+
+    table = overlap_table(HEADLESS_ASSETS.torpedo(), HEADLESS_ASSETS.ship(0))
+"""
+
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pygame
+
+from space_war.sim.conf import ASSETS_DIR, ROTATION_STEP, TORPEDO_SIZE
+from space_war.sim.overlaps import ship_key
+from space_war.sim.util import create_surface, load_image
+
+
+class Asset:
+    """An image and its collision geometry at every heading.
+
+    The rotated variants are indexed by the angle quantized to ROTATION_STEP.
+    None of them may be modified, since they are shared.
+
+    Attributes
+    ----------
+    name: The name the asset is registered under
+    size: The width and height of the unrotated image
+    image: The unrotated image, or None if headless
+    images: The image rotated to each heading, or None at every heading if
+        headless
+    rects: The rect of each rotated image, centered at the origin
+    masks: The collision mask of the image's silhouette at each heading
+
+    """
+
+    name: str
+    size: tuple[int, int]
+    image: Optional[pygame.Surface]
+    images: list[Optional[pygame.Surface]]
+    rects: list[pygame.Rect]
+    masks: list[pygame.mask.Mask]
+
+    def __init__(
+        self, name: str, image: pygame.Surface, headless: bool = False
+    ) -> None:
+        self.name = name
+        self.size = image.get_size()
+        self.images = []
+        self.rects = []
+        self.masks = []
+        shape = silhouette(image)
+        for heading in range(round(360 / ROTATION_STEP)):
+            rotated = pygame.transform.rotate(image, -heading * ROTATION_STEP)
+            self.images.append(None if headless else rotated)
+            self.rects.append(rotated.get_rect(center=(0, 0)))
+            self.masks.append(
+                pygame.mask.from_surface(
+                    pygame.transform.rotate(shape, -heading * ROTATION_STEP)
+                )
+            )
+        self.image = None if headless else image
+
+    @property
+    def num_headings(self) -> int:
+        """The number of quantized angles"""
+        return len(self.rects)
+
+    def heading(self, ang: float) -> int:
+        """Returns the index of the angle's rotated variants"""
+        return round(ang / ROTATION_STEP) % len(self.rects)
+
+
+def silhouette(image: pygame.Surface) -> pygame.Surface:
+    """Returns a surface that is opaque inside the outline of the image and
+    transparent outside of it, so sprites drawn as outlines are solid when
+    colliding. Images without transparent pixels, like the ship images, are
+    drawn on a background the color of their top left pixel, so that color
+    is treated as transparent.
+    """
+    # thresholds need 32-bit pixels, which the loaded image may not have
+    rgba = pygame.Surface(image.get_size(), pygame.SRCALPHA)
+    rgba.blit(image, (0, 0))
+    visible = pygame.mask.from_surface(rgba)
+    width, height = visible.get_size()
+    if visible.count() == width * height:
+        visible = pygame.mask.from_threshold(
+            rgba, rgba.get_at((0, 0)), (1, 1, 1, 255)
+        )
+        visible.invert()
+
+    # flood fill the outside from the edges. Mask.connected_component would
+    # leak inside through diagonal gaps in the outline.
+    shape = pygame.mask.Mask((width, height), fill=True)
+    stack = [(x, y) for x in range(width) for y in (0, height - 1)]
+    stack += [(x, y) for y in range(height) for x in (0, width - 1)]
+    while stack:
+        x, y = stack.pop()
+        if (
+            0 <= x < width
+            and 0 <= y < height
+            and shape.get_at((x, y))
+            and not visible.get_at((x, y))
+        ):
+            shape.set_at((x, y), 0)
+            stack.extend(((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)))
+    return shape.to_surface(unsetcolor=(0, 0, 0, 0))
+
+
+def overlap_table(asset: Asset, other: Asset) -> np.ndarray:
+    """Returns whether the masks of the assets overlap, indexed by the
+    heading of each and the x and y offset of other's rect from asset's
+    rect, as in util.collide_masks. The offsets are shifted by half the
+    table's size, so the offset (0, 0) is at its center.
+    """
+    widths = [rect.width for rect in asset.rects + other.rects]
+    heights = [rect.height for rect in asset.rects + other.rects]
+    x_center, y_center = max(widths) - 1, max(heights) - 1
+    table = np.zeros(
+        (
+            asset.num_headings,
+            other.num_headings,
+            2 * x_center + 1,
+            2 * y_center + 1,
+        ),
+        dtype=bool,
+    )
+    for heading, mask in enumerate(asset.masks):
+        for other_heading, other_mask in enumerate(other.masks):
+            # bit (x, y) is set when other's bottom right pixel at (x, y)
+            # overlaps the mask
+            width, height = other_mask.get_size()
+            overlaps = pygame.surfarray.array_red(
+                mask.convolve(other_mask).to_surface()
+            )
+            left = x_center - (width - 1)
+            top = y_center - (height - 1)
+            table[
+                heading,
+                other_heading,
+                left : left + overlaps.shape[0],
+                top : top + overlaps.shape[1],
+            ] = (
+                overlaps > 0
+            )
+    return table
+
+
+def render_torpedo_image() -> pygame.Surface:
+    """Draws what the torpedo looks like, facing an angle of 0 degrees"""
+    surf = create_surface(TORPEDO_SIZE)
+    pygame.draw.polygon(surf, "white", [[5, 0], [3, 5], [7, 5]], 1)
+    pygame.draw.polygon(surf, "white", [[0, 10], [3, 9], [3, 5]], 1)
+    pygame.draw.polygon(surf, "white", [[7, 5], [7, 9], [11, 10]], 1)
+    pygame.draw.line(surf, "white", (3, 9), (7, 9))
+    pygame.draw.line(surf, "white", (5, 5), (5, 11))
+    # Drawn like a christmas tree, so need to rotate it by 90 degrees.
+    return pygame.transform.rotate(surf, -90)
+
+
+class AssetRegistry:
+    """Loads each asset the first time it is requested and shares it after.
+
+    Images loaded after a display mode has been set are converted to the
+    display's pixel format, so an image first loaded without a display is
+    loaded again once there is one.
+
+    Attributes
+    ----------
+    headless: Whether assets only keep their collision geometry
+    assets: The loaded assets by name and whether they were converted
+
+    """
+
+    headless: bool
+    assets: dict[tuple[str, bool], Asset]
+
+    def __init__(self, headless: bool = False) -> None:
+        self.headless = headless
+        self.assets = {}
+
+    def get(self, name: str, load: Callable[[], pygame.Surface]) -> Asset:
+        """Returns the asset with the name, calling load to create its image
+        if it has not been loaded yet
+        """
+        key = (
+            name,
+            not self.headless and pygame.display.get_surface() is not None,
+        )
+        asset = self.assets.get(key)
+        if asset is None:
+            asset = self.assets[key] = Asset(name, load(), self.headless)
+        return asset
+
+    def image(self, path: Path) -> Asset:
+        """Returns the asset of the image file"""
+        return self.get(str(path), lambda: load_image(path))
+
+    def ship(self, player_id: int) -> Asset:
+        """Returns the asset of the player's ship"""
+        return self.image(ship_image_path(player_id))
+
+    def torpedo(self) -> Asset:
+        """Returns the asset shared by every torpedo"""
+        return self.get("torpedo", render_torpedo_image)
+
+
+def ship_image_path(player_id: int) -> Path:
+    """Returns the path of the player's ship image, reusing the images in
+    turn when there are more ships than images
+    """
+    return ASSETS_DIR / f"{ship_key(player_id)}.png"
+
+
+# The assets of sprites that are drawn
+ASSETS = AssetRegistry()
+# The assets of sprites that are only simulated
+HEADLESS_ASSETS = AssetRegistry(headless=True)
@@ -1,9 +1,13 @@
 """Collection of Base Sprite Classes
      - SpaceEntity
 """
+from typing import Optional
+
 import pygame
 
+from space_war.sim.assets import Asset
 from space_war.sim.conf import SCREEN_HEIGHT, SCREEN_WIDTH, SpaceEntityType
+from space_war.sim.world import EntityState
 
 
 class SpaceEntity(pygame.sprite.Sprite):
@@ -12,10 +16,19 @@ class SpaceEntity(pygame.sprite.Sprite):
     Features screen wrap-around, frictionless/zero gravity physics, and
     rotation. Subclasses should implement collision handling.
 
+    The pos, vel, and ang are stored in a WorldState when the entity is
+    created with its state views. The world then integrates the entity, the
+    sim syncs its rect, and update only syncs the rect again if pos was set
+    since, e.g. by a collision pushing it. Otherwise, the entity allocates
+    its own state and integrates itself.
+
     Attributes
     ----------
     entity_type: The type of space entity
-    surf: The reference to the original Surface, used for rotation
+    asset: The shared image and geometry of the entity at every heading
+    mask: The collision mask of the image at the current heading
+    state: Views into the arrays holding the entity's state
+    world_integrated: Whether the world integrates the entity
     pos: The x,y of the rect's center position on the screen
     vel: The velocity of the space entity
     ang: The angle in degrees representing the direction the ship is facing
@@ -23,34 +36,101 @@ class SpaceEntity(pygame.sprite.Sprite):
     """
 
     entity_type: SpaceEntityType
-    surf: pygame.surface.Surface
-    pos: tuple[int, int]
-    vel: tuple[float, float]
-    ang: float
+    asset: Asset
+    state: EntityState
+    world_integrated: bool
 
     def __init__(
         self,
         entity_type,
-        surf,
+        asset: Asset,
         start_pos,
         start_ang=0,
         start_vel=(0, 0),
+        state: Optional[EntityState] = None,
     ) -> None:
         pygame.sprite.Sprite.__init__(self)
         self.entity_type = entity_type
-        self.surf = surf
-        self.image = surf
+        self.asset = asset
+        self.image = asset.image
+        self.mask = asset.masks[0]
+        self.world_integrated = state is not None
+        self.state = state if state is not None else EntityState.standalone()
+        self.state.alive[0] = True
         self.pos = start_pos
-        self.rect = surf.get_rect(center=start_pos)
+        self.rect = pygame.Rect((0, 0), asset.size)
+        self.rect.center = start_pos
         self.vel = start_vel
         self.ang = start_ang
 
-    def update(self, *_args, **_kwargs):
+    @property
+    def pos(self) -> tuple[float, float]:
+        """The x,y of the rect's center position on the screen"""
+        return tuple(self.state.pos.tolist())
+
+    @pos.setter
+    def pos(self, value: tuple[float, float]):
+        self.state.pos[:] = value
+        self._rect_stale = True
+
+    @property
+    def vel(self) -> tuple[float, float]:
+        """The velocity of the space entity"""
+        return tuple(self.state.vel.tolist())
+
+    @vel.setter
+    def vel(self, value: tuple[float, float]):
+        self.state.vel[:] = value
+
+    @property
+    def ang(self) -> float:
+        """The angle in degrees representing the direction it is facing"""
+        return self.state.ang.item()
+
+    @ang.setter
+    def ang(self, value: float):
+        self.state.ang[0] = value
+
+    def kill(self):
+        """Removes the entity from all groups and frees its state"""
+        if self.alive():
+            self.state.alive[0] = False
+        super().kill()
+
+    def update(self, *_args, **kwargs):
         """Entrypoint for updating the player state each frame
 
-        screen_wrap, pos, and rotation updates can be disabled if set to False
+        Moves the entity within the broadphase grid, if passed in kwargs and
+        the rect had to be synced again.
+        """
+        if not self.world_integrated:
+            self._integrate()
+        if not self._rect_stale:
+            return
+        self.sync_rect()
+
+        if kwargs.get("broadphase"):
+            kwargs["broadphase"].update(self)
+
+    def sync_rect(self):
+        """Updates the image and rect to the current angle and position"""
+        # update rotation to surface
+        self.ang %= 360
+        self.place(self.asset.heading(self.ang), self.pos)
 
+    def place(self, heading: int, center: tuple[float, float]):
+        """Sets the image and rect to the rotated variant at the heading,
+        centered on center. Callers that already hold the entity's heading
+        and position use this instead of sync_rect.
         """
+        self.image = self.asset.images[heading]
+        self.mask = self.asset.masks[heading]
+        self.rect.size = self.asset.rects[heading].size
+        self.rect.center = center
+        self._rect_stale = False
+
+    def _integrate(self):
+        """Wraps the entity around the screen and applies its velocity"""
         x_pos, y_pos = self.pos
         x_vel, y_vel = self.vel
 
@@ -68,9 +148,3 @@ class SpaceEntity(pygame.sprite.Sprite):
         x_pos += x_vel
         y_pos += y_vel
         self.pos = (x_pos, y_pos)
-        self.rect.center = self.pos
-
-        # update rotation to surface
-        self.ang %= 360
-        self.image = pygame.transform.rotate(self.surf, -self.ang)
-        self.rect = self.image.get_rect(center=self.pos)
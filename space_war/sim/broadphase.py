@@ -0,0 +1,122 @@
+"""Broad-phase collision detection"""
+
+import math
+from typing import Iterable
+
+import pygame
+
+from space_war.sim.conf import BROADPHASE_CELL_SIZE, SCREEN_HEIGHT, SCREEN_WIDTH
+
+
+class SpatialHash:
+    """Uniform grid of cells that finds the sprites near a rect.
+
+    Sprites are inserted into every cell their rect overlaps. Cells past the
+    screen edges wrap around to the opposite side, so sprites that are
+    wrapping are still found. The grid only narrows down the candidates, the
+    caller still runs the exact rect test on them.
+
+    The grid should be rebuilt once per tick after group membership changes.
+    Sprites that move afterwards call update to move between cells.
+
+    Attributes
+    ----------
+    cell_size: The width and height of a cell
+    cols: The number of cells across the screen
+    rows: The number of cells down the screen
+    cells: The sprites in each cell, indexed by row * cols + col
+    sprite_cells: The cells each sprite is in
+    order: The position of each sprite in the group it was built from, used to
+        return candidates in the same order as the group
+
+    """
+
+    cell_size: int
+    cols: int
+    rows: int
+    cells: list[set[pygame.sprite.Sprite]]
+    sprite_cells: dict[pygame.sprite.Sprite, tuple[int, ...]]
+    order: dict[pygame.sprite.Sprite, int]
+
+    def __init__(
+        self,
+        cell_size: int = BROADPHASE_CELL_SIZE,
+        bounds: tuple[int, int] = (SCREEN_WIDTH, SCREEN_HEIGHT),
+    ) -> None:
+        self.cell_size = cell_size
+        self.cols = math.ceil(bounds[0] / cell_size)
+        self.rows = math.ceil(bounds[1] / cell_size)
+        self.cells = [set() for _ in range(self.cols * self.rows)]
+        self.sprite_cells = {}
+        self.order = {}
+
+    def _get_cells(self, rect: pygame.Rect) -> tuple[int, ...]:
+        """Returns the cells the rect overlaps, wrapping around the screen"""
+        left = rect.left // self.cell_size
+        right = max(left, (rect.right - 1) // self.cell_size)
+        top = rect.top // self.cell_size
+        bottom = max(top, (rect.bottom - 1) // self.cell_size)
+
+        # most sprites are smaller than a cell
+        if left == right and top == bottom:
+            return ((top % self.rows) * self.cols + (left % self.cols),)
+
+        return tuple(
+            (row % self.rows) * self.cols + (col % self.cols)
+            for row in range(top, bottom + 1)
+            for col in range(left, right + 1)
+        )
+
+    def rebuild(self, group: pygame.sprite.Group):
+        """Clears the grid and inserts every sprite in the group"""
+        for cells in self.sprite_cells.values():
+            for cell in cells:
+                self.cells[cell].clear()
+        self.sprite_cells.clear()
+        self.order.clear()
+
+        for idx, sprite in enumerate(group.sprites()):
+            self.order[sprite] = idx
+            cells = self._get_cells(sprite.rect)
+            self.sprite_cells[sprite] = cells
+            for cell in cells:
+                self.cells[cell].add(sprite)
+
+    def update(self, sprite: pygame.sprite.Sprite):
+        """Moves the sprite to the cells its rect currently overlaps.
+        Sprites that were not in the grid when it was built are ignored.
+        """
+        old_cells = self.sprite_cells.get(sprite)
+        if old_cells is None:
+            return
+        cells = self._get_cells(sprite.rect)
+        if cells == old_cells:
+            return
+
+        for cell in old_cells:
+            self.cells[cell].discard(sprite)
+        for cell in cells:
+            self.cells[cell].add(sprite)
+        self.sprite_cells[sprite] = cells
+
+    def query(
+        self, rect: pygame.Rect, group: pygame.sprite.Group
+    ) -> list[pygame.sprite.Sprite]:
+        """Returns the sprites in the group that are near the rect"""
+        return self.query_many((rect,), group)
+
+    def query_many(
+        self, rects: Iterable[pygame.Rect], group: pygame.sprite.Group
+    ) -> list[pygame.sprite.Sprite]:
+        """Returns the sprites in the group that are near any of the rects,
+        ordered the same way as the group
+        """
+        candidates = set()
+        for rect in rects:
+            for cell in self._get_cells(rect):
+                candidates.update(self.cells[cell])
+
+        return sorted(
+            (sprite for sprite in candidates if sprite in group),
+            key=self.order.__getitem__,
+        )
@@ -0,0 +1,120 @@
+"""Deterministic simulation clock and the pacing of the game loop"""
+
+import time
+from typing import Callable, Optional
+
+from space_war.sim.conf import MAX_TICKS_PER_FRAME, RENDER_FPS, SIM_TICK_RATE
+
+
+class SimClock:
+    """Counts simulation ticks instead of wall-clock milliseconds.
+
+    The simulation, its ships, and their weapons share a single clock, so weapon
+    lifetimes and cooldowns span the same number of frames no matter how fast
+    the simulation runs. Durations in ms are converted with
+    conf.ms_to_ticks.
+
+    Attributes
+    ----------
+    ticks: The number of ticks since the clock was created
+
+    """
+
+    ticks: int
+
+    def __init__(self, ticks: int = 0) -> None:
+        self.ticks = ticks
+
+    def tick(self):
+        """Advances the clock by one tick"""
+        self.ticks += 1
+
+    def get_ticks(self) -> int:
+        """Returns the number of ticks, like pygame.time.get_ticks()"""
+        return self.ticks
+
+
+class FrameScheduler:
+    """Paces a loop that runs the simulation at a fixed tick rate and
+    renders at its own rate, so rendering never slows the simulation down.
+
+    Each loop iteration runs ticks_due() ticks, renders if render_due(), and
+    waits wait_time() seconds. When the loop falls behind by more than
+    max_ticks_per_frame ticks, the missed ticks are dropped instead of being
+    caught up on, which would slow every later frame down too.
+
+    Attributes
+    ----------
+    tick_rate: The simulation ticks per second, or None to run
+        max_ticks_per_frame ticks every frame as fast as possible
+    render_fps: The frames rendered per second, or None to render once every
+        render_every ticks
+    render_every: The ticks between frames when render_fps is None
+    max_ticks_per_frame: The max ticks run in a single loop iteration
+    timer: Returns the current time in seconds
+
+    """
+
+    tick_rate: Optional[float]
+    render_fps: Optional[float]
+    render_every: int
+    max_ticks_per_frame: int
+    timer: Callable[[], float]
+
+    def __init__(
+        self,
+        tick_rate: Optional[float] = SIM_TICK_RATE,
+        render_fps: Optional[float] = RENDER_FPS,
+        render_every: int = 1,
+        max_ticks_per_frame: int = MAX_TICKS_PER_FRAME,
+        timer: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.tick_rate = tick_rate
+        self.render_fps = render_fps
+        self.render_every = render_every
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.timer = timer
+        self._next_tick = self._next_render = timer()
+        self._ticks_since_render = 0
+
+    def ticks_due(self) -> int:
+        """Returns the number of ticks to run now"""
+        if self.tick_rate is None:
+            num_ticks = self.max_ticks_per_frame
+        else:
+            now = self.timer()
+            if now < self._next_tick:
+                return 0
+            num_ticks = int((now - self._next_tick) * self.tick_rate) + 1
+            if num_ticks > self.max_ticks_per_frame:
+                num_ticks = self.max_ticks_per_frame
+                self._next_tick = now + 1 / self.tick_rate
+            else:
+                self._next_tick += num_ticks / self.tick_rate
+        self._ticks_since_render += num_ticks
+        return num_ticks
+
+    def render_due(self) -> bool:
+        """Returns whether to render a frame now"""
+        if self.render_fps is None:
+            due = self._ticks_since_render >= self.render_every
+        else:
+            now = self.timer()
+            due = now >= self._next_render
+            if due:
+                # skip the frames that were missed
+                self._next_render = max(
+                    self._next_render + 1 / self.render_fps, now
+                )
+        if due:
+            self._ticks_since_render = 0
+        return due
+
+    def wait_time(self) -> float:
+        """Returns the seconds until the next tick or frame is due"""
+        if self.tick_rate is None:
+            return 0
+        deadline = self._next_tick
+        if self.render_fps is not None:
+            deadline = min(deadline, self._next_render)
+        return max(0, deadline - self.timer())
@@ -1,9 +1,12 @@
 """Constants / Configuration for game"""
 
+import math
 from enum import Enum
-from typing import TypedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, TypedDict
 
-import pygame
+if TYPE_CHECKING:
+    import pygame
 
 # TODO: Replace this config with hydra yml configuration
 
@@ -14,6 +17,12 @@ class SpaceEntityType(Enum):
     SHIP, TORPEDO, PHASER = range(3)
 
 
+class ShipAction(Enum):
+    """The discrete actions a ship can take each simulation tick"""
+
+    NOOP, ROTATE_CCW, ROTATE_CW, THRUST, FIRE_TORPEDO, FIRE_PHASER = range(6)
+
+
 # Configuration for the ship
 #   - id: used to uniquely identify the ship and handle unique events
 #   - sprite: reference to the sprite object
@@ -22,28 +31,123 @@ ShipSpriteConfig = TypedDict(
     "ShipSpriteConfig",
     {
         "id": str,
-        "sprite": pygame.sprite.Sprite,
-        "group": pygame.sprite.GroupSingle,
+        "sprite": "pygame.sprite.Sprite",
+        "group": "pygame.sprite.GroupSingle",
+    },
+)
+
+# Snapshot of a single ship returned by the simulation each tick
+#   - pos: The center position of the ship
+#   - vel: The velocity of the ship
+#   - ang: The angle in degrees the ship is facing
+#   - alive: Whether the ship has been destroyed or not
+#   - torpedoes: The (pos, vel) of each of the ship's active torpedoes
+ShipState = TypedDict(
+    "ShipState",
+    {
+        "pos": tuple[float, float],
+        "vel": tuple[float, float],
+        "ang": float,
+        "alive": bool,
+        "torpedoes": list[tuple[tuple[float, float], tuple[float, float]]],
     },
 )
 
+# Directory containing the sprite images
+ASSETS_DIR = Path(__file__).parent / "assets"
+# The mask overlap tables of the assets, generated by space_war.sim.overlaps
+OVERLAPS_PATH = ASSETS_DIR / "overlaps.npz"
 # limits FPS to 60
 MAX_FPS = 60
+# The simulation ticks per second of the game window. Durations in ms are
+# still converted to ticks at MAX_FPS, so other rates speed up or slow down
+# the game.
+SIM_TICK_RATE = MAX_FPS
+# The frames per second the game window renders, independent of the ticks
+RENDER_FPS = MAX_FPS
+# The max number of simulation ticks run between two rendered frames before
+# the game loop drops ticks to catch up
+MAX_TICKS_PER_FRAME = 10
+# Whether the game window only redraws and updates the parts of the screen
+# that changed each frame, instead of the whole screen
+DIRTY_RECT_RENDERING = True
 # screen dimensions for pygame window
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 MAX_VEL = 10
+# The number of player_*.png ship sprites, reused in turn when there are
+# more ships than sprites
+NUM_SHIP_IMAGES = 2
+# The width and height of the player_*.png ship sprites
+SHIP_SIZE = (16, 24)
+# The degrees a ship rotates per step, giving 16 possible headings
+ROTATION_STEP = 22.5
+
+
+def ms_to_ticks(millis: float) -> int:
+    """Converts a duration in ms to the number of ticks it spans at MAX_FPS"""
+    return math.ceil(millis * MAX_FPS / 1000)
+
+
+# The width and height of a cell in the collision broad-phase grid
+BROADPHASE_CELL_SIZE = 50
+# The number of sprites that can be hit before the broad-phase grid is used.
+# Below it, scanning the whole group is faster than keeping the grid.
+BROADPHASE_MIN_SPRITES = 32
 # The delay in ms to check user movement (e.g. acceleration and rotation)
 MOVEMENT_TIME_DELAY_MS = 80
+MOVEMENT_REPEAT_TICKS = ms_to_ticks(MOVEMENT_TIME_DELAY_MS)
+# The action taken by a human player's ship while the key is held down, by
+# the name of the key's pygame.K_* constant
+HUMAN_KEY_BINDINGS = {
+    "a": ShipAction.ROTATE_CCW,
+    "d": ShipAction.ROTATE_CW,
+    "w": ShipAction.THRUST,
+    "e": ShipAction.FIRE_TORPEDO,
+    "q": ShipAction.FIRE_PHASER,
+}
 # The cooldown period before firing phasers again
 PHASER_FIRE_CD = 300
+PHASER_FIRE_CD_TICKS = ms_to_ticks(PHASER_FIRE_CD)
 PHASER_MAX_FLIGHT_MS = 100
+PHASER_MAX_FLIGHT_TICKS = ms_to_ticks(PHASER_MAX_FLIGHT_MS)
 PHASER_LENGTH = 150
 PHASER_WIDTH = 2
+# The max number of line segments a phaser is split into by wrapping around
+# the screen, one more than the number of edges it can cross
+PHASER_MAX_SEGMENTS = (
+    math.ceil(PHASER_LENGTH / SCREEN_WIDTH)
+    + math.ceil(PHASER_LENGTH / SCREEN_HEIGHT)
+    + 1
+)
 # The cooldown period before firing torpedoes again
 TORPEDO_FIRE_CD = 100
+TORPEDO_FIRE_CD_TICKS = ms_to_ticks(TORPEDO_FIRE_CD)
 # The max time in ms a torpedo is allowed to fly for
 TORPEDO_MAX_FLIGHT_MS = 10000
+TORPEDO_MAX_FLIGHT_TICKS = ms_to_ticks(TORPEDO_MAX_FLIGHT_MS)
 TORPEDO_SPEED = 2.5
+# The width and height of the torpedo sprite
+TORPEDO_SIZE = (12, 12)
+# The distance in front of the ship's center where torpedoes are fired from
+TORPEDO_SPAWN_DIST = 36
+# Torpedoes move twice per tick. The rule is kept from when the torpedo
+# sprite integrated itself a second time through BaseWeapon.update, and
+# WorldState.integrate and VectorSpaceWar apply it explicitly.
+TORPEDO_MOVES_PER_TICK = 2
 # The max number of concurrent torpedoes a ship can fire
 MAX_TORPEDOES_PER_SHIP = 7
+# The max number of ticks before a headless simulation is truncated
+MAX_SIM_TICKS = 60 * MAX_FPS
+# The width and height of the grayscale frames rendered for pixel agents
+PIXEL_OBS_SIZE = (84, 84)
+# The number of frames stacked together for pixel agents
+FRAME_STACK = 4
+# The number of steps between keyframes in match recordings
+REPLAY_KEYFRAME_INTERVAL = 300
+# The max number of steps a replay is fast-forwarded by between two frames
+REPLAY_MAX_STEPS_PER_FRAME = 100
+# The number of frames the profiler keeps timings for
+PROFILE_WINDOW_FRAMES = 600
+# The number of frames between profiler dumps
+PROFILE_DUMP_FRAMES = 600
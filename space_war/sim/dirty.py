@@ -0,0 +1,68 @@
+"""Dirty-rect rendering
+
+Redraws and updates only the parts of the screen that changed, instead of
+clearing and flipping the whole window every frame. Each frame, the rects
+drawn to in the last frame are cleared, everything is drawn again, and only
+the old and new rects are passed to pygame.display.update:
+
+    dirty = DirtyRects()
+    dirty.clear(screen)
+    rects = sim.draw(screen)
+    pygame.display.update(dirty.update(rects))
+
+Everything is drawn again each frame, so sprites that overlap a cleared rect
+are never left partly erased.
+"""
+
+from typing import Iterable, Union
+
+import pygame
+
+
+class DirtyRects:
+    """Tracks the rects drawn to in the last frame
+
+    Attributes
+    ----------
+    background: The color the drawn rects are cleared to
+    previous: The rects drawn to in the last frame
+    full_redraw: Whether the next frame clears and updates the whole screen,
+        e.g. for the first frame or after the window was covered
+
+    """
+
+    background: Union[str, pygame.Color]
+    previous: list[pygame.Rect]
+    full_redraw: bool
+
+    def __init__(self, background: Union[str, pygame.Color] = "black"):
+        self.background = background
+        self.previous = []
+        self.full_redraw = True
+        self._screen_rect = pygame.Rect(0, 0, 0, 0)
+
+    def invalidate(self):
+        """Clears and updates the whole screen in the next frame"""
+        self.full_redraw = True
+
+    def clear(self, surface: pygame.Surface):
+        """Clears the rects drawn to in the last frame"""
+        if self.full_redraw:
+            self._screen_rect = surface.get_rect()
+            surface.fill(self.background)
+            return
+        for rect in self.previous:
+            surface.fill(self.background, rect)
+
+    def update(self, rects: Iterable[pygame.Rect]) -> list[pygame.Rect]:
+        """Returns the rects that changed this frame, to pass to
+        pygame.display.update, given the rects drawn to this frame
+        """
+        rects = [rect for rect in rects if rect]
+        if self.full_redraw:
+            self.full_redraw = False
+            changed = [self._screen_rect]
+        else:
+            changed = self.previous + rects
+        self.previous = rects
+        return changed
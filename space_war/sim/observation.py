@@ -0,0 +1,229 @@
+"""Fixed-shape observations for agents
+
+Encodes the ships and torpedoes of a SpaceWarSim into a float32 buffer
+supplied by the caller. Every scratch array is allocated once by the encoder,
+so encoding does not allocate arrays each step.
+"""
+
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from space_war.sim.conf import (
+    MAX_TORPEDOES_PER_SHIP,
+    MAX_VEL,
+    PHASER_FIRE_CD_TICKS,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    TORPEDO_FIRE_CD_TICKS,
+    TORPEDO_MAX_FLIGHT_TICKS,
+)
+
+if TYPE_CHECKING:
+    from space_war.sim.sim import SpaceWarSim
+
+# The number of values per entity in the observation
+#   - x, y: The position, or the offset from the ego ship if ego-centric
+#   - x_vel, y_vel: The velocity
+#   - cos, sin: The heading, relative to the ego ship if ego-centric
+#   - alive: Whether the ship is alive or the torpedo is in flight
+#   - timer_0, timer_1: The fraction of the phaser and torpedo cooldowns left
+#     for ships, or the fraction of the flight time left for torpedoes
+#   - dist: The distance from the ego ship, wrapping around the screen
+#   - bearing_cos, bearing_sin: The direction of the shortest path from the
+#     ego ship, relative to its heading if ego-centric
+ENTITY_OBS_SIZE = 12
+# The number of values gathered per entity before encoding
+_GATHERED_SIZE = 8
+
+
+def _cooldown_left(last_fired: Optional[int], cooldown: int, ticks: int):
+    """Returns the fraction of the cooldown left"""
+    if last_fired is None:
+        return 0.0
+    return max(0, cooldown - (ticks - last_fired)) / cooldown
+
+
+class ObservationEncoder:
+    """Encodes the match from the point of view of each ship.
+
+    The observation has one row per ego ship. Each row holds the ships, ego
+    ship first and then the others in player order, followed by every
+    torpedo slot of those ships in the same order. Torpedo slots are padded
+    to max_torpedoes and, like destroyed ships, are all zeros when not in
+    flight.
+
+    When ego-centric, positions and velocities are rotated into the ego
+    ship's frame and scaled to roughly [-1, 1]. Otherwise they are in screen
+    coordinates.
+
+    Attributes
+    ----------
+    num_ships: The number of ships in the match
+    max_torpedoes: The number of torpedo slots per ship
+    ego_centric: Whether to encode relative to the ego ship and normalize
+    bounds: The width and height of the screen
+    num_entities: The number of ships and torpedo slots in each row
+    obs_shape: The shape of the buffer passed to encode
+
+    """
+
+    num_ships: int
+    max_torpedoes: int
+    ego_centric: bool
+    bounds: np.ndarray
+    num_entities: int
+    obs_shape: tuple[int, int]
+
+    def __init__(
+        self,
+        num_ships: int,
+        max_torpedoes: int = MAX_TORPEDOES_PER_SHIP,
+        ego_centric: bool = True,
+        bounds: tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT),
+    ) -> None:
+        self.num_ships = num_ships
+        self.max_torpedoes = max_torpedoes
+        self.ego_centric = ego_centric
+        self.bounds = np.array(bounds, dtype=np.float64)
+        self.num_entities = num_ships * (1 + max_torpedoes)
+        self.obs_shape = (num_ships, self.num_entities * ENTITY_OBS_SIZE)
+
+        # index of each entity in a row, for every ego ship
+        torpedo_slots = np.arange(max_torpedoes)
+        self._order = np.empty((num_ships, self.num_entities), dtype=np.intp)
+        for ego in range(num_ships):
+            owners = (ego + np.arange(num_ships)) % num_ships
+            self._order[ego, :num_ships] = owners
+            self._order[ego, num_ships:] = (
+                num_ships + owners[:, None] * max_torpedoes + torpedo_slots
+            ).ravel()
+
+        # scales positions by half the screen's diagonal, the longest offset
+        # when wrapping, and velocities by the max ship velocity
+        pos_scale = 2 / np.hypot(*bounds)
+        self._scale = np.array(
+            [pos_scale, pos_scale, 1 / MAX_VEL, 1 / MAX_VEL]
+        ).reshape(4, 1, 1)
+        self._pos_scale = pos_scale
+        self._bounds = self.bounds.reshape(2, 1, 1)
+
+        # scratch arrays are laid out value first, so each value is a
+        # contiguous (ego, entity) array
+        rows = (num_ships, self.num_entities)
+        self._entities = np.zeros((_GATHERED_SIZE, self.num_entities))
+        self._gathered = np.zeros((_GATHERED_SIZE, *rows))
+        self._features = np.zeros((ENTITY_OBS_SIZE, *rows))
+        # the offsets from the ego ship and the velocities
+        self._vectors = np.zeros((2, 2, *rows))
+        self._wrap = np.zeros((2, *rows))
+        self._nonzero = np.zeros(rows, dtype=bool)
+        self._ego_rad = np.zeros((num_ships, 1))
+        self._ego_cos = np.zeros((num_ships, 1))
+        self._ego_sin = np.zeros((num_ships, 1))
+        self._out_view = (num_ships, self.num_entities, ENTITY_OBS_SIZE)
+
+    def new_buffer(self) -> np.ndarray:
+        """Allocates a buffer that can be passed to encode"""
+        return np.zeros(self.obs_shape, dtype=np.float32)
+
+    def _gather(self, sim: "SpaceWarSim"):
+        """Copies the state of every entity, then orders it for each ego"""
+        world = sim.world
+        num_ships = self.num_ships
+        entities = self._entities
+
+        ships = entities[:, :num_ships]
+        ships[0:2] = world.ship_pos.T
+        ships[2:4] = world.ship_vel.T
+        ships[4] = world.ship_ang
+        ships[5] = world.ship_alive
+        for idx, ship in enumerate(sim.player_sprites):
+            ships[6, idx] = _cooldown_left(
+                ship.phaser_last_fired, PHASER_FIRE_CD_TICKS, sim.ticks
+            )
+            ships[7, idx] = _cooldown_left(
+                ship.torpedo_last_fired, TORPEDO_FIRE_CD_TICKS, sim.ticks
+            )
+
+        torpedoes = entities[:, num_ships:]
+        torpedoes[0:2] = world.torpedo_pos.reshape(-1, 2).T
+        torpedoes[2:4] = world.torpedo_vel.reshape(-1, 2).T
+        torpedoes[4] = world.torpedo_ang.ravel()
+        torpedoes[5] = world.torpedo_alive.ravel()
+        # fraction of flight time left
+        lifetime = torpedoes[6]
+        np.subtract(sim.ticks, world.torpedo_fired_at.ravel(), out=lifetime)
+        lifetime *= -1 / TORPEDO_MAX_FLIGHT_TICKS
+        lifetime += 1
+
+        np.take(entities, self._order, axis=1, out=self._gathered, mode="clip")
+
+    def encode(self, sim: "SpaceWarSim", out: np.ndarray) -> np.ndarray:
+        """Writes the observation of every ship into out and returns it.
+
+        out must be a C-contiguous float32 array of obs_shape, e.g. one made
+        by new_buffer or a slice of a larger batch buffer.
+        """
+        if (
+            out.shape != self.obs_shape
+            or out.dtype != np.float32
+            or not out.flags.c_contiguous
+        ):
+            raise ValueError(
+                f"out must be a C-contiguous float32 array of {self.obs_shape}"
+            )
+
+        self._gather(sim)
+        gathered = self._gathered
+        features = self._features
+
+        # shortest offset from the ego ship, wrapping around the screen
+        vectors, wrap = self._vectors, self._wrap
+        delta = vectors[0]
+        np.subtract(gathered[0:2], gathered[0:2, :, :1], out=delta)
+        np.divide(delta, self._bounds, out=wrap)
+        np.rint(wrap, out=wrap)
+        wrap *= self._bounds
+        delta -= wrap
+        dist = features[9]
+        np.hypot(delta[0], delta[1], out=dist)
+
+        rad = features[4]
+        np.radians(gathered[4], out=rad)
+        if self.ego_centric:
+            # rotate the offsets and velocities into the ego ship's frame
+            np.copyto(self._ego_rad, rad[:, :1])
+            np.cos(self._ego_rad, out=self._ego_cos)
+            np.sin(self._ego_rad, out=self._ego_sin)
+            rad -= self._ego_rad
+            vectors[1] = gathered[2:4]
+            np.multiply(vectors[:, 0], self._ego_cos, out=features[0:4:2])
+            np.multiply(vectors[:, 1], self._ego_sin, out=wrap)
+            features[0:4:2] += wrap
+            np.multiply(vectors[:, 1], self._ego_cos, out=features[1:4:2])
+            np.multiply(vectors[:, 0], self._ego_sin, out=wrap)
+            features[1:4:2] -= wrap
+            features[0:4] *= self._scale
+            dist *= self._pos_scale
+            offset = features[0:2]
+        else:
+            features[0:4] = gathered[0:4]
+            offset = delta
+        np.sin(rad, out=features[5])
+        np.cos(rad, out=features[4])
+        features[6:9] = gathered[5:8]
+
+        # the bearing of the ego ship itself is left as zero
+        bearing = features[10:12]
+        bearing[:] = 0
+        np.greater(dist, 0, out=self._nonzero)
+        np.divide(offset, dist, out=bearing, where=self._nonzero)
+
+        # zero destroyed ships and torpedo slots that are not in flight
+        np.multiply(
+            features.transpose(1, 2, 0),
+            gathered[5, ..., None],
+            out=out.reshape(self._out_view),
+        )
+        return out
@@ -0,0 +1,89 @@
+"""Precomputed mask overlap tables
+
+Batched simulations test pixel masks by looking up whether the masks of two
+assets overlap in their overlap table, so they need no sprites or masks.
+Building the tables needs pygame, so they are generated once from the assets
+and stored in OVERLAPS_PATH, which is loaded without importing pygame:
+
+    python -m space_war.sim.overlaps
+
+The file has to be generated again whenever the ship images or the torpedo
+drawing change. If it is missing, the tables are built from the assets
+instead, which imports pygame.
+"""
+
+import time
+
+import numpy as np
+
+from space_war.sim.conf import NUM_SHIP_IMAGES, OVERLAPS_PATH
+
+# The key of the torpedo asset
+TORPEDO_KEY = "torpedo"
+
+# The overlap tables loaded by the process, by the keys of their asset pair
+_TABLES: dict[str, np.ndarray] = {}
+
+
+def ship_key(player_id: int) -> str:
+    """Returns the key of the player's ship asset, named after its image"""
+    return f"player_{player_id % NUM_SHIP_IMAGES}"
+
+
+def pair_key(key: str, other: str) -> str:
+    """Returns the key of the overlap table of two assets"""
+    return f"{key}-{other}"
+
+
+def build_overlap_tables() -> dict[str, np.ndarray]:
+    """Builds the overlap table of each pair of ships, and of a torpedo with
+    each ship and with another torpedo
+    """
+    # assets imports pygame, so it is only imported to build the tables
+    # pylint: disable-next=import-outside-toplevel
+    from space_war.sim.assets import HEADLESS_ASSETS, overlap_table
+
+    assets = {
+        ship_key(player_id): HEADLESS_ASSETS.ship(player_id)
+        for player_id in range(NUM_SHIP_IMAGES)
+    }
+    tables = {
+        pair_key(key, other): overlap_table(asset, other_asset)
+        for key, asset in assets.items()
+        for other, other_asset in assets.items()
+    }
+    torpedo = assets[TORPEDO_KEY] = HEADLESS_ASSETS.torpedo()
+    for other, other_asset in assets.items():
+        tables[pair_key(TORPEDO_KEY, other)] = overlap_table(
+            torpedo, other_asset
+        )
+    return tables
+
+
+def overlaps(key: str, other: str) -> np.ndarray:
+    """Returns the overlap table of the assets with the keys, as returned by
+    assets.overlap_table. The tables are loaded the first time one is
+    requested and are shared by the whole process.
+    """
+    if not _TABLES:
+        if OVERLAPS_PATH.exists():
+            with np.load(OVERLAPS_PATH) as data:
+                _TABLES.update((name, data[name]) for name in data.files)
+        else:
+            _TABLES.update(build_overlap_tables())
+    return _TABLES[pair_key(key, other)]
+
+
+def main():
+    """Builds the overlap tables and saves them to OVERLAPS_PATH"""
+    start = time.perf_counter()
+    tables = build_overlap_tables()
+    np.savez_compressed(OVERLAPS_PATH, **tables)
+    print(
+        f"Saved {len(tables)} overlap tables to {OVERLAPS_PATH} in "
+        f"{time.perf_counter() - start:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Hot-path timers
+
+While profiling is enabled, the methods in HOT_PATH are replaced with
+wrappers that time every call to them. Disabling restores the original
+methods, so the simulation runs the same code as without a profiler and the
+timers cost nothing. Code outside the simulation, like the game loop, can
+time its own phases with PROFILER.section.
+
+    PROFILER.enable()
+    sim.step()
+    PROFILER.summary()["integrate"]["p99_us"]
+
+Each call to SpaceWarSim._tick ends a frame. The time spent in each section
+is summed over a frame, and the totals of the last window frames are kept
+for the summaries. Sections that did not run in a frame count as zero, so
+every summary covers the same frames. Sections can run inside each other,
+e.g. rotation also runs as part of ship_collisions when a pushed ship's rect
+is synced again. The rest of the frame is spent dispatching the sprite
+groups' updates and outside the simulation, in the caller.
+"""
+
+import functools
+import importlib
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import numpy as np
+import pygame
+
+from space_war.sim.conf import PROFILE_DUMP_FRAMES, PROFILE_WINDOW_FRAMES
+
+# The edges in microseconds of the histogram bins, doubling each bin
+HISTOGRAM_EDGES_US = 2.0 ** np.arange(0, 18)
+# The name of the time between the ends of frames
+FRAME = "frame"
+# The section timing each method, as "module:Class.method"
+HOT_PATH = {
+    "space_war.sim.ship:BaseShip.apply_action": "actions",
+    "space_war.sim.sim:SpaceWarSim._update_group_membership": "groups",
+    "space_war.sim.world:WorldState.integrate": "integrate",
+    "space_war.sim.world:WorldState.kill_expired": "integrate",
+    "space_war.sim.sim:SpaceWarSim._sync_rects": "rotation",
+    "space_war.sim.base:SpaceEntity.sync_rect": "rotation",
+    "space_war.sim.broadphase:SpatialHash.rebuild": "broadphase",
+    "space_war.sim.ship:BaseShip.update": "ship_collisions",
+    "space_war.sim.weapon:PhotonTorpedo.update": "torpedo_collisions",
+    "space_war.sim.weapon:Phaser._detect_hit": "phaser_raycast",
+    "space_war.sim.weapon:Phaser.draw": "phaser_draw",
+    "space_war.sim.sim:SpaceWarSim.get_ship_states": "states",
+    "space_war.sim.sim:SpaceWarSim.draw": "draw",
+}
+# The method that ends a frame each time it returns
+FRAME_END = "space_war.sim.sim:SpaceWarSim._tick"
+
+
+def _resolve(path: str) -> tuple[type, str]:
+    """Returns the class and method name of a "module:Class.method" path"""
+    module, _, qualname = path.partition(":")
+    class_name, _, method = qualname.rpartition(".")
+    owner = importlib.import_module(module)
+    for name in class_name.split("."):
+        owner = getattr(owner, name)
+    return owner, method
+
+
+class _NullSection:
+    """Context manager that does nothing, used while profiling is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        return False
+
+
+class _Section:
+    """Times a section and adds it to the frame's total. Reused every time
+    the section runs, so sections with the same name can not be nested.
+    """
+
+    __slots__ = ("totals", "name", "start")
+
+    def __init__(self, totals: dict[str, int], name: str) -> None:
+        self.totals = totals
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_args):
+        self.totals[self.name] += time.perf_counter_ns() - self.start
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class Profiler:
+    """Rolling timings of named sections of the hot path.
+
+    Attributes
+    ----------
+    enabled: Whether sections are timed
+    window: The number of frames kept for the summaries
+    dump_path: The file a summary is appended to as a JSON line every
+        dump_every frames, if any
+    dump_every: The number of frames between dumps
+    num_frames: The number of frames ended since profiling was enabled
+    samples: The total ns spent in each section in each of the last window
+        frames
+
+    """
+
+    enabled: bool
+    window: int
+    dump_path: Optional[Path]
+    dump_every: int
+    num_frames: int
+    samples: dict[str, deque]
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.window = PROFILE_WINDOW_FRAMES
+        self.dump_path = None
+        self.dump_every = PROFILE_DUMP_FRAMES
+        self.num_frames = 0
+        self.samples = {}
+        self._sections = {}
+        self._totals = {}
+        self._frame_start = 0
+        # the original methods replaced while enabled
+        self._patched: list[tuple[type, str, Callable]] = []
+
+    def enable(
+        self,
+        window: int = PROFILE_WINDOW_FRAMES,
+        dump_path: Optional[Union[str, Path]] = None,
+        dump_every: int = PROFILE_DUMP_FRAMES,
+    ):
+        """Starts timing sections, clearing any earlier samples"""
+        self.disable()
+        self.enabled = True
+        self.window = window
+        self.dump_path = Path(dump_path) if dump_path else None
+        self.dump_every = dump_every
+        self.num_frames = 0
+        self.samples = {FRAME: deque(maxlen=window)}
+        self._sections = {}
+        self._totals = {}
+        self._frame_start = time.perf_counter_ns()
+
+        for path, name in HOT_PATH.items():
+            self._add_section(name)
+            self._patch(path, self._timed(name))
+        self._patch(FRAME_END, self._ends_frame)
+
+    def disable(self):
+        """Stops timing sections and restores the original methods. The
+        samples are kept.
+        """
+        self.enabled = False
+        for owner, method, func in reversed(self._patched):
+            setattr(owner, method, func)
+        self._patched.clear()
+
+    def _add_section(self, name: str):
+        """Starts keeping samples for the section"""
+        if name in self._totals:
+            return
+        self._totals[name] = 0
+        # earlier frames did not run the section
+        self.samples[name] = deque(
+            [0] * len(self.samples[FRAME]), maxlen=self.window
+        )
+
+    def _patch(self, path: str, wrap: Callable[[Callable], Callable]):
+        """Replaces the method with the wrapped method"""
+        owner, method = _resolve(path)
+        # only the class's own attribute is restored, not an inherited one
+        func = owner.__dict__[method]
+        self._patched.append((owner, method, func))
+        setattr(owner, method, functools.wraps(func)(wrap(func)))
+
+    def _timed(self, name: str) -> Callable[[Callable], Callable]:
+        """Returns a wrapper adding the time of each call to the section"""
+        totals = self._totals
+        clock = time.perf_counter_ns
+
+        def wrap(func):
+            def timed(*args, **kwargs):
+                start = clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    totals[name] += clock() - start
+
+            return timed
+
+        return wrap
+
+    def _ends_frame(self, func: Callable) -> Callable:
+        """Wraps the method to end the frame after each call"""
+
+        def ends_frame(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.end_frame()
+
+        return ends_frame
+
+    def section(self, name: str) -> Union[_Section, _NullSection]:
+        """Returns a context manager timing the section"""
+        if not self.enabled:
+            return _NULL_SECTION
+        section = self._sections.get(name)
+        if section is None:
+            self._add_section(name)
+            section = self._sections[name] = _Section(self._totals, name)
+        return section
+
+    def end_frame(self):
+        """Records the time spent in each section since the last call"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self.samples[FRAME].append(now - self._frame_start)
+        self._frame_start = now
+        for name, total in self._totals.items():
+            self.samples[name].append(total)
+            self._totals[name] = 0
+
+        self.num_frames += 1
+        if self.dump_path and self.num_frames % self.dump_every == 0:
+            self.dump()
+
+    def summary(self) -> dict[str, dict]:
+        """Returns the mean, percentiles, max, and histogram of the time in
+        microseconds spent in each section per frame
+        """
+        summary = {}
+        for name, samples in self.samples.items():
+            if not samples:
+                continue
+            times_us = np.fromiter(samples, dtype=np.float64) / 1000
+            counts, _ = np.histogram(
+                np.clip(times_us, 0, HISTOGRAM_EDGES_US[-1]),
+                bins=np.concatenate(([0], HISTOGRAM_EDGES_US)),
+            )
+            p50, p90, p99 = np.percentile(times_us, (50, 90, 99))
+            summary[name] = {
+                "frames": len(times_us),
+                "mean_us": float(times_us.mean()),
+                "p50_us": float(p50),
+                "p90_us": float(p90),
+                "p99_us": float(p99),
+                "max_us": float(times_us.max()),
+                # counts[i] is the number of frames up to edges_us[i]
+                "histogram": {
+                    "edges_us": HISTOGRAM_EDGES_US.tolist(),
+                    "counts": counts.tolist(),
+                },
+            }
+        return summary
+
+    def dump(self):
+        """Appends the summary to dump_path as a JSON line"""
+        with open(self.dump_path, "a", encoding="utf-8") as dump_file:
+            dump_file.write(
+                json.dumps(
+                    {
+                        "time": time.time(),
+                        "frame": self.num_frames,
+                        "sections": self.summary(),
+                    }
+                )
+                + "\n"
+            )
+
+
+# The profiler used by the simulation and game loop
+PROFILER = Profiler()
+
+
+class ProfilerOverlay:
+    """Draws the mean and p99 time of each section, slowest first, in the
+    corner of the screen
+
+    Attributes
+    ----------
+    profiler: The profiler whose summary is drawn
+    visible: Whether draw draws anything
+    refresh_frames: The number of frames between summaries, since building
+        one every frame would show up in the timings
+
+    """
+
+    profiler: Profiler
+    visible: bool
+    refresh_frames: int
+
+    def __init__(self, profiler: Profiler = PROFILER, refresh_frames=30):
+        self.profiler = profiler
+        self.visible = False
+        self.refresh_frames = refresh_frames
+        self._font = None
+        self._lines = []
+        self._frame = -1
+
+    def toggle(self):
+        """Shows or hides the overlay, enabling the profiler when shown"""
+        self.visible = not self.visible
+        if self.visible and not self.profiler.enabled:
+            self.profiler.enable()
+
+    def draw(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        """Draws the overlay onto the surface and returns the rects drawn to"""
+        if not self.visible:
+            return []
+        if self._font is None:
+            self._font = pygame.font.Font(None, 18)
+
+        num_frames = self.profiler.num_frames
+        if num_frames // self.refresh_frames != self._frame:
+            self._frame = num_frames // self.refresh_frames
+            summary = self.profiler.summary()
+            self._lines = [
+                self._font.render(
+                    f"{name:<20} {stats['mean_us'] / 1000:6.2f} ms"
+                    f" p99 {stats['p99_us'] / 1000:6.2f} ms",
+                    True,
+                    "yellow",
+                )
+                for name, stats in sorted(
+                    summary.items(), key=lambda item: -item[1]["mean_us"]
+                )
+            ]
+
+        rects = []
+        y_pos = 4
+        for line in self._lines:
+            rects.append(surface.blit(line, (4, y_pos)))
+            y_pos += line.get_height()
+        return rects
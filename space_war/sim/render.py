@@ -0,0 +1,247 @@
+"""Off-screen pixel renderer
+
+Draws the simulation straight into small grayscale NumPy frames for pixel
+based agents, without rendering the full screen first. Only pygame's image,
+transform, and surfarray modules are used, so no display or video driver is
+needed.
+"""
+
+import math
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Sequence
+
+import numpy as np
+import pygame
+
+from space_war.sim.assets import ASSETS, ship_image_path
+from space_war.sim.conf import (
+    FRAME_STACK,
+    PIXEL_OBS_SIZE,
+    ROTATION_STEP,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+)
+
+if TYPE_CHECKING:
+    from space_war.sim.sim import SpaceWarSim
+
+# The weights used to convert RGB to grayscale
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])
+
+
+def render_stamps(
+    surf: pygame.Surface, scale: tuple[float, float]
+) -> list[np.ndarray]:
+    """Returns the surface rotated to every heading, scaled, and converted
+    to grayscale weighted by alpha. Indexed by the angle divided by
+    ROTATION_STEP.
+    """
+    # smoothscale needs 32-bit pixels, which the loaded image may not have
+    base = pygame.Surface(surf.get_size(), pygame.SRCALPHA)
+    base.blit(surf, (0, 0))
+
+    stamps = []
+    for heading in range(round(360 / ROTATION_STEP)):
+        rotated = pygame.transform.rotate(base, -heading * ROTATION_STEP)
+        width, height = rotated.get_size()
+        scaled = pygame.transform.smoothscale(
+            rotated,
+            (
+                max(1, math.ceil(width * scale[0])),
+                max(1, math.ceil(height * scale[1])),
+            ),
+        )
+        luma = pygame.surfarray.array3d(scaled) @ LUMA_WEIGHTS
+        luma *= pygame.surfarray.array_alpha(scaled) / 255
+        # surfarray is indexed by x then y
+        stamps.append(np.ascontiguousarray(luma.T.round().astype(np.uint8)))
+    return stamps
+
+
+class PixelRenderer:
+    """Renders the ships, torpedoes, and phasers into a grayscale frame.
+
+    The ship and torpedo images are rotated to every heading and scaled down
+    once. The torpedo is prepared when the renderer is created, and each ship
+    image the first time a player using it is rendered, so any number of
+    players can be rendered. Sprites are clipped at the frame's edges, the
+    same as when drawing to the screen.
+
+    Attributes
+    ----------
+    shape: The height and width of the rendered frames
+    scale: The x and y scale from screen to frame coordinates
+    image_paths: The ship image of each player, or None to use the same
+        images as SpaceWarSim
+    ship_stamps: The grayscale ship image at each heading, by image path
+    torpedo_stamps: The grayscale torpedo image at each heading
+
+    """
+
+    shape: tuple[int, int]
+    scale: tuple[float, float]
+    image_paths: Optional[Sequence[Path]]
+    ship_stamps: dict[Path, list[np.ndarray]]
+    torpedo_stamps: list[np.ndarray]
+
+    def __init__(
+        self,
+        size: tuple[int, int] = PIXEL_OBS_SIZE,
+        image_paths: Optional[Sequence[Path]] = None,
+    ) -> None:
+        self.shape = (size[1], size[0])
+        self.scale = (size[0] / SCREEN_WIDTH, size[1] / SCREEN_HEIGHT)
+        self.image_paths = image_paths
+        self.ship_stamps = {}
+        self.torpedo_stamps = render_stamps(ASSETS.torpedo().image, self.scale)
+
+    def _player_stamps(self, player_id: int) -> list[np.ndarray]:
+        """Returns the stamps of the player's ship image"""
+        image_path = (
+            self.image_paths[player_id]
+            if self.image_paths
+            else ship_image_path(player_id)
+        )
+        stamps = self.ship_stamps.get(image_path)
+        if stamps is None:
+            stamps = self.ship_stamps[image_path] = render_stamps(
+                ASSETS.image(image_path).image, self.scale
+            )
+        return stamps
+
+    def new_frame(self) -> np.ndarray:
+        """Allocates a frame that can be passed to render"""
+        return np.zeros(self.shape, dtype=np.uint8)
+
+    def _stamp(
+        self,
+        frame: np.ndarray,
+        stamps: list[np.ndarray],
+        pos: tuple[float, float],
+        ang: float,
+    ):
+        """Draws the stamp for the angle centered on the screen position"""
+        stamp = stamps[round(ang / ROTATION_STEP) % len(stamps)]
+        height, width = stamp.shape
+        top = round(pos[1] * self.scale[1] - height / 2)
+        left = round(pos[0] * self.scale[0] - width / 2)
+
+        # clip to the frame
+        frame_top, frame_left = max(top, 0), max(left, 0)
+        frame_bottom = min(top + height, self.shape[0])
+        frame_right = min(left + width, self.shape[1])
+        if frame_top >= frame_bottom or frame_left >= frame_right:
+            return
+
+        region = frame[frame_top:frame_bottom, frame_left:frame_right]
+        np.maximum(
+            region,
+            stamp[
+                frame_top - top : frame_bottom - top,
+                frame_left - left : frame_right - left,
+            ],
+            out=region,
+        )
+
+    def _line(
+        self,
+        frame: np.ndarray,
+        start: tuple[float, float],
+        end: tuple[float, float],
+    ):
+        """Draws a one pixel wide line between the screen positions"""
+        x_start, y_start = start[0] * self.scale[0], start[1] * self.scale[1]
+        x_end, y_end = end[0] * self.scale[0], end[1] * self.scale[1]
+        num_points = int(max(abs(x_end - x_start), abs(y_end - y_start))) + 2
+        cols = np.linspace(x_start, x_end, num_points).astype(np.intp)
+        rows = np.linspace(y_start, y_end, num_points).astype(np.intp)
+        inside = (
+            (cols >= 0)
+            & (cols < self.shape[1])
+            & (rows >= 0)
+            & (rows < self.shape[0])
+        )
+        frame[rows[inside], cols[inside]] = 255
+
+    def render(
+        self, sim: "SpaceWarSim", out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Renders the current state of the simulation into out, or a new
+        frame, and returns it
+        """
+        frame = self.new_frame() if out is None else out
+        frame[:] = 0
+
+        for player in sim.player_sprites:
+            phaser = player.phaser_group.sprite
+            if phaser and phaser.coords:
+                # follow the ship, the same as Phaser.draw
+                x_delta = player.pos[0] - phaser.ship_pos[0]
+                y_delta = player.pos[1] - phaser.ship_pos[1]
+                for start, end in phaser.coords:
+                    self._line(
+                        frame,
+                        (start[0] + x_delta, start[1] + y_delta),
+                        (end[0] + x_delta, end[1] + y_delta),
+                    )
+            for torpedo in player.torpedo_group:
+                self._stamp(
+                    frame, self.torpedo_stamps, torpedo.pos, torpedo.ang
+                )
+            if player.alive():
+                self._stamp(
+                    frame,
+                    self._player_stamps(player.player_id),
+                    player.pos,
+                    player.ang,
+                )
+        return frame
+
+
+class FrameStack:
+    """Ring buffer holding the most recent frames.
+
+    Pushing a frame overwrites the oldest one, so no frames are copied when
+    the stack moves forward. get returns the frames ordered oldest first.
+
+    Attributes
+    ----------
+    frames: The buffer of frames, in ring order
+    next_idx: The index of the slot the next frame is written to
+
+    """
+
+    frames: np.ndarray
+    next_idx: int
+
+    def __init__(
+        self,
+        frame_shape: tuple[int, int] = (PIXEL_OBS_SIZE[1], PIXEL_OBS_SIZE[0]),
+        num_frames: int = FRAME_STACK,
+    ) -> None:
+        self.frames = np.zeros((num_frames, *frame_shape), dtype=np.uint8)
+        self.next_idx = 0
+
+    def next_frame(self) -> np.ndarray:
+        """Returns the slot of the next frame, to render into directly.
+        push must be called afterwards.
+        """
+        return self.frames[self.next_idx]
+
+    def push(self, frame: Optional[np.ndarray] = None):
+        """Adds the frame, or the frame rendered into next_frame, to the
+        stack
+        """
+        if frame is not None:
+            self.frames[self.next_idx] = frame
+        self.next_idx = (self.next_idx + 1) % len(self.frames)
+
+    def reset(self, frame: np.ndarray):
+        """Fills the stack with the frame, used at the start of a match"""
+        self.frames[:] = frame
+        self.next_idx = 0
+
+    def get(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns the frames ordered oldest first"""
+        order = np.arange(self.next_idx, self.next_idx + len(self.frames))
+        return np.take(self.frames, order, axis=0, out=out, mode="wrap")
@@ -0,0 +1,325 @@
+"""Match recording and replay
+
+A recording stores the actions of every step plus a keyframe snapshot of the
+match every keyframe_interval steps, in fixed-width binary records:
+
+    header | block 0 | block 1 | ...
+
+Each block is a keyframe from SpaceWarSim.get_state followed by the actions
+of the next keyframe_interval steps, one uint8 ShipAction per ship. The
+first keyframe is the state the recording started at. Every block but the
+last has the same size, so any step can be found by seeking to its block and
+re-simulating from the keyframe. Recordings whose path ends in .gz are gzip
+compressed.
+
+Run as a module to play a recording in a window, here fast-forwarded at 8x
+the recorded speed while still rendering 60 frames per second:
+
+    python -m space_war.sim.replay match.rec --start 600 --speed 8
+"""
+
+import argparse
+import gzip
+import struct
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Sequence, Union
+
+import numpy as np
+import pygame
+
+from space_war.sim.clock import FrameScheduler
+from space_war.sim.conf import (
+    MAX_FPS,
+    REPLAY_KEYFRAME_INTERVAL,
+    REPLAY_MAX_STEPS_PER_FRAME,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    ShipAction,
+    ShipState,
+)
+from space_war.sim.dirty import DirtyRects
+from space_war.sim.ship import BaseShip
+from space_war.sim.sim import SpaceWarSim, state_dtype
+
+# magic, version, num_ships, max_torpedoes, frame_skip, keyframe_interval,
+# and the size of a keyframe
+HEADER = struct.Struct("<4sHHHHII")
+MAGIC = b"SWRP"
+# bumped whenever the rules change, since replays are re-simulated
+VERSION = 2
+
+
+def _open(path: Path, mode: str) -> BinaryIO:
+    """Opens the recording, compressed if the path ends in .gz"""
+    if path.suffix == ".gz":
+        return gzip.open(path, mode)
+    return open(path, mode)  # pylint: disable=consider-using-with
+
+
+class MatchRecorder:
+    """Records a match while stepping it.
+
+    Call step instead of SpaceWarSim.step. Only actions passed to step are
+    recorded, so actions applied to the ships directly (e.g. by HumanShip)
+    are not.
+
+    Attributes
+    ----------
+    sim: The simulation being recorded
+    path: The path of the recording
+    keyframe_interval: The number of steps between keyframes
+    num_steps: The number of steps recorded so far
+
+    """
+
+    sim: SpaceWarSim
+    path: Path
+    keyframe_interval: int
+    num_steps: int
+
+    def __init__(
+        self,
+        sim: SpaceWarSim,
+        path: Union[str, Path],
+        keyframe_interval: int = REPLAY_KEYFRAME_INTERVAL,
+    ) -> None:
+        self.sim = sim
+        self.path = Path(path)
+        self.keyframe_interval = keyframe_interval
+        self.num_steps = 0
+        self._file = _open(self.path, "wb")
+        self._file.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                sim.world.num_ships,
+                sim.world.max_torpedoes,
+                sim.frame_skip,
+                keyframe_interval,
+                sim.state_dtype.itemsize,
+            )
+        )
+        self._actions = np.zeros(sim.world.num_ships, dtype=np.uint8)
+        self._file.write(sim.get_state().tobytes())
+
+    def step(
+        self, actions: Optional[Sequence[ShipAction]] = None
+    ) -> tuple[list[ShipState], list[float], bool]:
+        """Records the actions and steps the simulation, see
+        SpaceWarSim.step
+        """
+        if actions is None:
+            self._actions[:] = ShipAction.NOOP.value
+        else:
+            self._actions[:] = [action.value for action in actions]
+        self._file.write(self._actions.tobytes())
+        self.num_steps += 1
+        result = self.sim.step(actions)
+
+        # the keyframe of the next block
+        if self.num_steps % self.keyframe_interval == 0:
+            self._file.write(self.sim.get_state().tobytes())
+        return result
+
+    def close(self):
+        """Flushes and closes the recording"""
+        self._file.close()
+
+    def __enter__(self) -> "MatchRecorder":
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+
+class MatchReplay:
+    """Rebuilds the match at any step of a recording.
+
+    Seeking loads the keyframe at or before the step and re-simulates the
+    recorded actions from there, so it costs at most keyframe_interval steps.
+
+    Attributes
+    ----------
+    path: The path of the recording
+    num_ships: The number of ships in the match
+    keyframe_interval: The number of steps between keyframes
+    num_steps: The number of steps in the recording
+    sim: The simulation the match is rebuilt in
+    step_idx: The step the simulation is currently at
+
+    """
+
+    path: Path
+    num_ships: int
+    keyframe_interval: int
+    num_steps: int
+    sim: SpaceWarSim
+    step_idx: int
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._file = _open(self.path, "rb")
+        (
+            magic,
+            version,
+            self.num_ships,
+            max_torpedoes,
+            frame_skip,
+            self.keyframe_interval,
+            state_size,
+        ) = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} replay")
+
+        self._state_dtype = state_dtype(self.num_ships, max_torpedoes)
+        if self._state_dtype.itemsize != state_size:
+            raise ValueError(f"{self.path} has an unexpected keyframe size")
+        self._block_size = state_size + self.keyframe_interval * self.num_ships
+
+        self.sim = SpaceWarSim(
+            ship_classes=[BaseShip] * self.num_ships,
+            start_pos=[(0, 0)] * self.num_ships,
+            start_ang=[0] * self.num_ships,
+            max_ticks=np.iinfo(np.int64).max,
+            frame_skip=frame_skip,
+        )
+        if self.sim.state_dtype != self._state_dtype:
+            raise ValueError(
+                f"{self.path} was recorded with {max_torpedoes} torpedoes "
+                "per ship"
+            )
+
+        if isinstance(self._file, gzip.GzipFile):
+            # compressed files can not seek from the end, so read through
+            while self._file.read(1 << 20):
+                pass
+        else:
+            self._file.seek(0, 2)
+        data_size = self._file.tell() - HEADER.size
+        num_blocks, last_block = divmod(data_size, self._block_size)
+        self.num_steps = num_blocks * self.keyframe_interval
+        if last_block:
+            self.num_steps += (last_block - state_size) // self.num_ships
+
+        self.step_idx = -1
+        self.seek(0)
+
+    def _read_actions(self, num_steps: int) -> np.ndarray:
+        """Reads the actions of the next steps from the current block"""
+        return np.frombuffer(
+            self._file.read(num_steps * self.num_ships), dtype=np.uint8
+        ).reshape(num_steps, self.num_ships)
+
+    def _step(self, actions: np.ndarray):
+        """Steps the simulation with a recorded row of actions"""
+        self.sim.step([ShipAction(action) for action in actions.tolist()])
+
+    def seek(self, step_idx: int) -> SpaceWarSim:
+        """Rebuilds the match as it was before the step and returns the
+        simulation
+        """
+        if not 0 <= step_idx <= self.num_steps:
+            raise IndexError(f"step {step_idx} is out of range")
+
+        block, offset = divmod(step_idx, self.keyframe_interval)
+        self._file.seek(HEADER.size + block * self._block_size)
+        state = self._file.read(self._state_dtype.itemsize)
+        self.sim.set_state(state)
+        for actions in self._read_actions(offset):
+            self._step(actions)
+        self.step_idx = step_idx
+        return self.sim
+
+    def frames(self, start: int = 0) -> Iterator[SpaceWarSim]:
+        """Yields the simulation before each step from start to the end,
+        followed by the final state
+        """
+        self.seek(start)
+        yield self.sim
+        while self.step_idx < self.num_steps:
+            if self.step_idx % self.keyframe_interval == 0:
+                # skip the keyframe, the simulation is already at it
+                self._file.seek(
+                    HEADER.size
+                    + (self.step_idx // self.keyframe_interval)
+                    * self._block_size
+                    + self._state_dtype.itemsize
+                )
+            self._step(self._read_actions(1)[0])
+            self.step_idx += 1
+            yield self.sim
+
+    def render(self, surface: pygame.Surface, step_idx: int):
+        """Draws the match as it was before the step with the ship and
+        weapon sprites
+        """
+        if step_idx != self.step_idx:
+            self.seek(step_idx)
+        self.sim.draw(surface)
+
+    def close(self):
+        """Closes the recording"""
+        self._file.close()
+
+    def __enter__(self) -> "MatchReplay":
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+
+def main():
+    """Plays a recording in a window"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("path", type=Path, help="the recording to play")
+    parser.add_argument(
+        "--start", type=int, default=0, help="the step to start from"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1,
+        help="the playback speed, 0 plays as fast as possible",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=MAX_FPS,
+        help="the frames rendered per second, 0 renders every --render-every "
+        "steps",
+    )
+    parser.add_argument("--render-every", type=int, default=1)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    dirty = DirtyRects()
+    scheduler = FrameScheduler(
+        tick_rate=args.speed * MAX_FPS or None,
+        render_fps=args.fps or None,
+        render_every=args.render_every,
+        max_ticks_per_frame=REPLAY_MAX_STEPS_PER_FRAME,
+    )
+    with MatchReplay(args.path) as replay:
+        frames = replay.frames(args.start)
+        sim = next(frames)
+        while not pygame.event.peek(pygame.QUIT):
+            if pygame.event.get(pygame.WINDOWEXPOSED):
+                dirty.invalidate()
+            pygame.event.pump()
+            for _ in range(scheduler.ticks_due()):
+                sim = next(frames, None)
+                if sim is None:
+                    break
+            if sim is None:
+                break
+            if scheduler.render_due():
+                dirty.clear(screen)
+                pygame.display.update(dirty.update(sim.draw(screen)))
+            time.sleep(scheduler.wait_time())
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
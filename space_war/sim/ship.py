@@ -1,111 +1,59 @@
 """Collection of Ship Classes"""
 
 import math
-import platform
-import uuid
 from pathlib import Path
-from threading import Thread
-from typing import Union
+from typing import Optional
 
 import pygame
 
+from space_war.sim.assets import ASSETS, AssetRegistry
 from space_war.sim.base import SpaceEntity
+from space_war.sim.broadphase import SpatialHash
+from space_war.sim.clock import SimClock
 from space_war.sim.conf import (
-    MAX_TORPEDOES_PER_SHIP,
+    HUMAN_KEY_BINDINGS,
     MAX_VEL,
-    MOVEMENT_TIME_DELAY_MS,
-    PHASER_FIRE_CD,
-    TORPEDO_FIRE_CD,
+    MOVEMENT_REPEAT_TICKS,
+    PHASER_FIRE_CD_TICKS,
+    ROTATION_STEP,
+    TORPEDO_FIRE_CD_TICKS,
+    ShipAction,
     SpaceEntityType,
 )
-from space_war.sim.util import check_overlapping_sprites, sign
-from space_war.sim.weapon import Phaser, PhotonTorpedo
+from space_war.sim.util import check_overlapping_sprites, collide_masks, sign
+from space_war.sim.weapon import Phaser, TorpedoPool
+from space_war.sim.world import WorldState
 
-# TODO: refactor the interaction logic into "actions"
-# The human ship would call these action functions in handle_events
-
-
-def patch_timer():
-    """Custom monkey patch of pygame.time.set_timer function so it works in the
-    pygame-wasm environment.
-
-    """
-    # pylint: disable-next=import-outside-toplevel
-    import asyncio
-
-    # pylint: disable-next=import-error,import-outside-toplevel,unused-import
-    import aio.gthread
-
-    # Global var to keep track of timer threads
-    #   - key: event type
-    #   - value: thread uuid
-    timer_threads_dict = {}
-
-    def patch_set_timer(
-        event: Union[int, pygame.event.Event], millis: int, loops: int = 0
-    ):
-        """Patches the pygame.time.set_timer function to use gthreads"""
-
-        dlay = float(millis) / 1000
-        cevent = pygame.event.Event(event)
-        event_loop = asyncio.get_event_loop()
-
-        async def fire_event(thread_uuid):
-            """The thread's target function to handle the timer
-
-            Early exit conditions:
-              - event loop is closed
-              - event type is no longer in timer_threads_dict
-              - the thread's uuid is not the latest one
-              - Max loop iterations if loops param is not zero
-            """
-            loop_counter = 0
-            while True:
-                await asyncio.sleep(dlay)
-                if (
-                    event_loop.is_closed()
-                    or event not in timer_threads_dict
-                    or timer_threads_dict[event] != thread_uuid
-                    or (loops and loop_counter >= loops)
-                ):
-                    break
-
-                pygame.event.post(cevent)
-                loop_counter += 1 if loops else 0
-
-        if dlay > 0:
-            # uuid is used to track the latest thread,
-            # stale threads will be terminated
-            thread_uuid = uuid.uuid4()
-            Thread(target=fire_event, args=[thread_uuid]).start()
-            timer_threads_dict[event] = thread_uuid
-
-        else:
-            # This cancels the timer for the event
-            if event in timer_threads_dict:
-                del timer_threads_dict[event]
-
-    pygame.time.set_timer = patch_set_timer
-
-
-if platform.system().lower() == "emscripten":
-    patch_timer()
+# The action of each key code in HUMAN_KEY_BINDINGS
+KEY_ACTIONS = {
+    getattr(pygame, f"K_{name}"): action
+    for name, action in HUMAN_KEY_BINDINGS.items()
+}
 
 
 class BaseShip(SpaceEntity):
     """Defines common ship functionality.
 
+    The ship and torpedo images come from the asset registry, so every ship
+    using the same image shares it.
+
     Attributes
     ----------
     player_id: Used uniquely identify the ship
+    clock: The simulation clock shared with its weapons
+    world: The world state holding the ship and its torpedoes, if any
+    torpedo_pool: The torpedoes the ship recycles when firing
     torpedo_group: Group containing its fired torpedoes
     phaser_group: Group containing its fired phaser
-    phaser_last_fired: The number of ticks since firing a phaser
-    torpedo_last_fired: The number of ticks since firing a torpedo
+    phaser_last_fired: The clock tick when a phaser was last fired
+    torpedo_last_fired: The clock tick when a torpedo was last fired
 
     """
 
     player_id: int
+    clock: SimClock
+    world: Optional[WorldState]
+    torpedo_pool: TorpedoPool
     torpedo_group: pygame.sprite.Group
     phaser_group: pygame.sprite.GroupSingle
     phaser: pygame.sprite.Sprite
@@ -118,60 +66,160 @@ class BaseShip(SpaceEntity):
         image_path: Path,
         start_pos: tuple[int, int],
         start_ang: float,
+        clock: SimClock,
+        world: Optional[WorldState] = None,
+        assets: AssetRegistry = ASSETS,
     ) -> None:
         super().__init__(
             SpaceEntityType.SHIP,
-            pygame.image.load(image_path).convert_alpha(),
+            assets.image(image_path),
             start_pos,
             start_ang,
+            state=world.ship_state(player_id) if world else None,
         )
 
         self.player_id = player_id
+        self.clock = clock
+        self.world = world
+        self.torpedo_pool = TorpedoPool(
+            clock, world=world, ship_idx=player_id, asset=assets.torpedo()
+        )
         self.torpedo_group = pygame.sprite.Group()
         self.phaser_group = pygame.sprite.GroupSingle()
         self.phaser = None
         self.phaser_last_fired = None
         self.torpedo_last_fired = None
 
-    def draw_groups(self, surface: pygame.Surface):
-        """Draws the torpedo and phaser group to the surface"""
-
-        self.phaser_group.draw(surface)
-        self.torpedo_group.draw(surface)
+    def draw_groups(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        """Draws the torpedo and phaser group to the surface and returns the
+        rects drawn to
+        """
+        rects = []
+        if self.phaser_group.sprite:
+            rects.extend(self.phaser_group.sprite.draw(surface))
+        rects.extend(
+            surface.blits(
+                [
+                    (torpedo.image, torpedo.rect)
+                    for torpedo in self.torpedo_group
+                ]
+            )
+        )
+        return rects
 
-    def update_groups(self, target_group: pygame.sprite.Group):
+    def update_groups(
+        self,
+        target_group: pygame.sprite.Group,
+        broadphase: Optional[SpatialHash] = None,
+    ):
         """Calls update on the torpedo and phaser group"""
-        self.torpedo_group.update(target_group=target_group)
-        self.phaser_group.update(
-            target_group=target_group, ship_ang=self.ang, ship_pos=self.pos
+        self.torpedo_group.update(
+            target_group=target_group, broadphase=broadphase
         )
+        # skip reading the ship's state when there is no phaser to update
+        if self.phaser_group:
+            self.phaser_group.update(
+                target_group=target_group,
+                broadphase=broadphase,
+                ship_ang=self.ang,
+                ship_pos=self.pos,
+            )
 
     def _check_phaser_on_cooldown(self) -> bool:
         """Checks if the phaser is actively being fired"""
-        if not self.phaser_last_fired:
+        if self.phaser_last_fired is None:
             return False
-        flight_time = pygame.time.get_ticks() - self.phaser_last_fired
-        if flight_time >= PHASER_FIRE_CD:
+        flight_time = self.clock.ticks - self.phaser_last_fired
+        if flight_time >= PHASER_FIRE_CD_TICKS:
             return False
         return True
 
     def _check_torpedo_on_cooldown(self) -> bool:
-        """Checks if the phaser is actively being fired"""
-        if not self.torpedo_last_fired:
+        """Checks if the torpedo is still on cooldown"""
+        if self.torpedo_last_fired is None:
             return False
-        flight_time = pygame.time.get_ticks() - self.torpedo_last_fired
+        flight_time = self.clock.ticks - self.torpedo_last_fired
 
-        if flight_time >= TORPEDO_FIRE_CD:
+        if flight_time >= TORPEDO_FIRE_CD_TICKS:
             return False
         return True
 
-    def _handle_ship_collisions(self, target_group):
-        """Updates velocity based on ship on ship collisions"""
-        for sprite in target_group.sprites():
+    def _rotate(self, delta: float):
+        """Rotates the ship by delta degrees"""
+        self.ang += delta
+        self.ang %= 360
+
+    def _accelerate(self):
+        """Accelerates the ship in the direction it is facing, capped by
+        MAX_VEL on each axis
+        """
+        x_vel, y_vel = self.vel
+        new_x_vel = x_vel + math.cos(self.ang * math.pi / 180)
+        new_y_vel = y_vel + math.sin(self.ang * math.pi / 180)
+        x_vel = (
+            new_x_vel if abs(new_x_vel) < MAX_VEL else sign(new_x_vel) * MAX_VEL
+        )
+        y_vel = (
+            new_y_vel if abs(new_y_vel) < MAX_VEL else sign(new_y_vel) * MAX_VEL
+        )
+        self.vel = (x_vel, y_vel)
+
+    def _fire_phaser(self):
+        """Fires a new phaser, replacing the active one"""
+        self.phaser = Phaser(source_ship=self)
+        self.phaser_group.add(self.phaser)
+        self.phaser_last_fired = self.clock.ticks
+
+    def _fire_torpedo(self):
+        """Fires a photon torpedo from the pool if the max number of
+        torpedoes has not been reached
+        """
+        torpedo = self.torpedo_pool.launch(
+            start_pos=self.pos, start_ang=self.ang, start_vel=self.vel
+        )
+        if torpedo is None:
+            return
+        self.torpedo_group.add(torpedo)
+        self.torpedo_last_fired = self.clock.ticks
+
+    def apply_action(self, action: ShipAction):
+        """Applies a single action to the ship. Should be called at most once
+        per action each tick, weapons are limited by their cooldowns.
+        """
+        if action == ShipAction.ROTATE_CCW:
+            self._rotate(-ROTATION_STEP)
+        elif action == ShipAction.ROTATE_CW:
+            self._rotate(ROTATION_STEP)
+        elif action == ShipAction.THRUST:
+            self._accelerate()
+        elif action == ShipAction.FIRE_TORPEDO:
+            if not self._check_torpedo_on_cooldown():
+                self._fire_torpedo()
+        elif action == ShipAction.FIRE_PHASER:
+            if not self._check_phaser_on_cooldown():
+                self._fire_phaser()
+
+    def _handle_ship_collisions(
+        self,
+        target_group: pygame.sprite.Group,
+        broadphase: Optional[SpatialHash] = None,
+    ):
+        """Updates velocity based on ship on ship collisions.
+        Ships collide when their masks overlap, which is only tested once
+        their rects collide. Only nearby sprites are checked if the broadphase
+        grid is passed.
+        """
+        sprites = (
+            broadphase.query(self.rect, target_group)
+            if broadphase
+            else target_group.sprites()
+        )
+        for sprite in sprites:
             if (
                 sprite != self
-                and self.rect.colliderect(sprite.rect)
                 and sprite.entity_type == SpaceEntityType.SHIP
+                and self.rect.colliderect(sprite.rect)
+                and collide_masks(self, sprite)
             ):
                 self_vel_x, self_vel_y = self.vel
                 other_vel_x, other_vel_y = sprite.vel
@@ -199,28 +247,28 @@ class BaseShip(SpaceEntity):
 
     def update(self, *args, **kwargs):
         super().update(*args, **kwargs)
-        self._handle_ship_collisions(kwargs["target_group"])
+        self._handle_ship_collisions(
+            kwargs["target_group"], kwargs.get("broadphase")
+        )
 
 
 class HumanShip(BaseShip):
     """Represents the ship controlled by a human player.
-    User input is captured using the event loop in handle_events.
+
+    Keyboard events passed to handle_events are turned into actions. While a
+    key is held down, its movement action repeats every
+    MOVEMENT_REPEAT_TICKS and its weapon action is taken as soon as the
+    weapon is off cooldown. If both rotation keys are held, the last one
+    pressed wins.
 
     Attributes
     ----------
-    rotate_cc_repeat_event: The event where rotate cc key is held down
-    rotate_cw_repeat_event: The event where the rotate cw key is held down
-    acc_repeat_event: The event where the accelerate key is held down
-    fire_torpedoes_repeat_event: The event where the fire torpedoes key is held down
-    fire_phaser_repeat_event: The event where the fire phasers key is held down
+    held_actions: Maps the action of each held key to the tick it is next
+        taken at, ordered by when the key was pressed
 
     """
 
-    rotate_cc_repeat_event: pygame.USEREVENT
-    rotate_cw_repeat_event: pygame.USEREVENT
-    acc_repeat_event: pygame.USEREVENT
-    fire_torpedoes_repeat_event: pygame.USEREVENT
-    fire_phaser_repeat_event: pygame.USEREVENT
+    held_actions: dict[ShipAction, int]
 
     def __init__(
         self,
@@ -228,175 +276,55 @@ class HumanShip(BaseShip):
         image_path: Path,
         start_pos: tuple[int, int],
         start_ang: float,
+        clock: SimClock,
+        world: Optional[WorldState] = None,
+        assets: AssetRegistry = ASSETS,
     ) -> None:
-        super().__init__(player_id, image_path, start_pos, start_ang)
-        self.rotate_ccw_lock = False
-
-        # create custom event to check user input
-        # ships should have unique player ids to ensure events get handled
-        # correctly
-        self.rotate_cc_repeat_event = pygame.USEREVENT + player_id + 1
-        self.rotate_cw_repeat_event = pygame.USEREVENT + player_id + 2
-        self.acc_repeat_event = pygame.USEREVENT + player_id + 3
-        self.fire_torpedoes_repeat_event = pygame.USEREVENT + player_id + 4
-        self.fire_phaser_repeat_event = pygame.USEREVENT + player_id + 5
-
-    def _handle_movement_events(self, event: pygame.event.Event):
-        """Handle ship movement and rotation.
-
-        Keybindings are hard coded for now. It would be good to make this config
-        driven.
-        """
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.constants.K_a:
-                self.rotate_ccw_lock = True
-                self.ang -= 22.5
-                pygame.time.set_timer(
-                    self.rotate_cc_repeat_event, MOVEMENT_TIME_DELAY_MS
-                )
-
-            if event.key == pygame.constants.K_d:
-                self.rotate_ccw_lock = False
-                self.ang += 22.5
-                pygame.time.set_timer(
-                    self.rotate_cw_repeat_event, MOVEMENT_TIME_DELAY_MS
-                )
-            if event.key == pygame.constants.K_w:
-                x_vel, y_vel = self.vel
-                new_x_vel = x_vel + math.cos(self.ang * math.pi / 180)
-                new_y_vel = y_vel + math.sin(self.ang * math.pi / 180)
-                x_vel = (
-                    new_x_vel
-                    if abs(new_x_vel) < MAX_VEL
-                    else sign(new_x_vel) * MAX_VEL
-                )
-                y_vel = (
-                    new_y_vel
-                    if abs(new_y_vel) < MAX_VEL
-                    else sign(new_y_vel) * MAX_VEL
-                )
-                self.vel = (x_vel, y_vel)
-                pygame.time.set_timer(
-                    self.acc_repeat_event, MOVEMENT_TIME_DELAY_MS
-                )
-
-        if event.type == pygame.KEYUP:
-            if event.key == pygame.constants.K_a:
-                self.rotate_ccw_lock = False
-                pygame.time.set_timer(self.rotate_cc_repeat_event, 0)
-            if event.key == pygame.constants.K_d:
-                self.rotate_ccw_lock = True
-                pygame.time.set_timer(self.rotate_cw_repeat_event, 0)
-            if event.key == pygame.constants.K_w:
-                pygame.time.set_timer(self.acc_repeat_event, 0)
-
-        if event.type == self.rotate_cc_repeat_event:
-            # Update rotation
-            if self.rotate_ccw_lock:
-                self.ang -= 22.5
-            self.ang %= 360
-        if event.type == self.rotate_cw_repeat_event:
-            if not self.rotate_ccw_lock:
-                self.ang += 22.5
-            self.ang %= 360
-        if event.type == self.acc_repeat_event:
-            x_vel, y_vel = self.vel
-            new_x_vel = x_vel + math.cos(self.ang * math.pi / 180)
-            new_y_vel = y_vel + math.sin(self.ang * math.pi / 180)
-            x_vel = (
-                new_x_vel
-                if abs(new_x_vel) < MAX_VEL
-                else sign(new_x_vel) * MAX_VEL
-            )
-            y_vel = (
-                new_y_vel
-                if abs(new_y_vel) < MAX_VEL
-                else sign(new_y_vel) * MAX_VEL
-            )
-            self.vel = (x_vel, y_vel)
-
-    def _handle_firing_weapon_events(self, event: pygame.event.Event):
-        """Handles firing phasers and photon torpedoes.
-
-        Keybindings are hard coded for now. It would be good to make this config
-        driven.
-
-        """
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.constants.K_q:
-                pygame.time.set_timer(
-                    self.fire_phaser_repeat_event,
-                    PHASER_FIRE_CD,
-                )
-                if not self._check_phaser_on_cooldown():
-                    self.phaser = Phaser(source_ship=self)
-                    self.phaser_group.add(self.phaser)
-                    self.phaser_last_fired = pygame.time.get_ticks()
-            if event.key == pygame.constants.K_e:
-                pygame.time.set_timer(
-                    self.fire_torpedoes_repeat_event,
-                    TORPEDO_FIRE_CD,
-                )
-                if (
-                    len(self.torpedo_group) < MAX_TORPEDOES_PER_SHIP
-                    and not self._check_torpedo_on_cooldown()
-                ):
-                    self.torpedo_group.add(
-                        PhotonTorpedo(
-                            start_pos=self.pos,
-                            start_ang=self.ang,
-                            start_vel=self.vel,
-                        )
-                    )
-                    self.torpedo_last_fired = pygame.time.get_ticks()
-
-        if event.type == pygame.KEYUP:
-            if event.key == pygame.constants.K_q:
-                pygame.time.set_timer(self.fire_phaser_repeat_event, 0)
-            if event.key == pygame.constants.K_e:
-                pygame.time.set_timer(self.fire_torpedoes_repeat_event, 0)
-
-        if event.type == self.fire_phaser_repeat_event:
-            self.phaser = Phaser(source_ship=self)
-            self.phaser_last_fired = pygame.time.get_ticks()
-            self.phaser_group.add(self.phaser)
-        if event.type == self.fire_torpedoes_repeat_event:
-            if len(self.torpedo_group) < MAX_TORPEDOES_PER_SHIP:
-                self.torpedo_last_fired = pygame.time.get_ticks()
-                self.torpedo_group.add(
-                    PhotonTorpedo(
-                        start_pos=self.pos,
-                        start_ang=self.ang,
-                        start_vel=self.vel,
-                    )
-                )
+        super().__init__(
+            player_id, image_path, start_pos, start_ang, clock, world, assets
+        )
+        self.held_actions = {}
 
     def handle_events(self, event: pygame.event.Event):
-        """Handles keyboard input to update movement and fire weapons.
+        """Tracks the keys that are held down.
 
         This method should be called from the event loop to pass the
-        event object.
+        event object. Keybindings are set by HUMAN_KEY_BINDINGS.
 
         """
-
-        # cleanup timer events
         if not self.alive():
-            pygame.time.set_timer(self.rotate_cc_repeat_event, 0)
-            pygame.time.set_timer(self.rotate_cw_repeat_event, 0)
-            pygame.time.set_timer(self.acc_repeat_event, 0)
-            pygame.time.set_timer(self.fire_phaser_repeat_event, 0)
-            pygame.time.set_timer(self.fire_torpedoes_repeat_event, 0)
-
-            pygame.event.clear(
-                (
-                    self.rotate_cc_repeat_event,
-                    self.rotate_cw_repeat_event,
-                    self.acc_repeat_event,
-                    self.fire_torpedoes_repeat_event,
-                    self.fire_phaser_repeat_event,
-                )
-            )
+            self.held_actions.clear()
+            return
+
+        if event.type not in (pygame.KEYDOWN, pygame.KEYUP):
+            return
+        action = KEY_ACTIONS.get(event.key)
+        if action is None:
             return
 
-        self._handle_movement_events(event)
-        self._handle_firing_weapon_events(event)
+        self.held_actions.pop(action, None)
+        if event.type == pygame.KEYDOWN:
+            self.held_actions[action] = self.clock.ticks
+
+    def get_actions(self) -> list[ShipAction]:
+        """Returns the actions to take this tick for the held keys"""
+        rotation = None
+        for action in self.held_actions:
+            if action in (ShipAction.ROTATE_CCW, ShipAction.ROTATE_CW):
+                rotation = action
+
+        actions = []
+        for action, next_tick in self.held_actions.items():
+            if self.clock.ticks < next_tick:
+                continue
+            if action in (ShipAction.ROTATE_CCW, ShipAction.ROTATE_CW):
+                if action != rotation:
+                    continue
+            if action in (ShipAction.FIRE_TORPEDO, ShipAction.FIRE_PHASER):
+                self.held_actions[action] = self.clock.ticks + 1
+            else:
+                self.held_actions[action] = (
+                    self.clock.ticks + MOVEMENT_REPEAT_TICKS
+                )
+            actions.append(action)
+        return actions
@@ -0,0 +1,490 @@
+"""Headless simulation core
+
+The simulation advances the match one fixed tick per call to step. It does not
+need a window, an event queue, or a frame limiter, so it can run as fast as the
+CPU allows for training rollouts.
+"""
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pygame
+
+from space_war.sim.assets import (
+    ASSETS,
+    HEADLESS_ASSETS,
+    AssetRegistry,
+    ship_image_path,
+)
+from space_war.sim.broadphase import SpatialHash
+from space_war.sim.clock import SimClock
+from space_war.sim.conf import (
+    BROADPHASE_MIN_SPRITES,
+    MAX_SIM_TICKS,
+    PHASER_MAX_SEGMENTS,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    ShipAction,
+    ShipSpriteConfig,
+    ShipState,
+)
+from space_war.sim.render import PixelRenderer
+from space_war.sim.ship import BaseShip
+from space_war.sim.weapon import Phaser
+from space_war.sim.world import NEVER_FIRED, WorldState, headings
+
+
+def get_player_sprites(
+    pos_iter: Sequence[tuple[float, float]],
+    ang_iter: Sequence[float],
+    instance_iter: Sequence[type[BaseShip]],
+    clock: SimClock,
+    world: WorldState,
+    assets: AssetRegistry = ASSETS,
+) -> tuple[list[BaseShip], list[ShipSpriteConfig]]:
+    """Initialize player sprites and returns a list of sprites and
+    configuration
+    """
+    sprites = []
+    sprite_cfg = []
+    for player_id, instance in enumerate(instance_iter):
+        player_sprite = instance(
+            player_id=player_id,
+            image_path=ship_image_path(player_id),
+            start_pos=pos_iter[player_id],
+            start_ang=ang_iter[player_id],
+            clock=clock,
+            world=world,
+            assets=assets,
+        )
+        player_group = pygame.sprite.GroupSingle()
+        player_group.add(player_sprite)
+        sprites.append(player_sprite)
+        sprite_cfg.append(
+            {"id": player_id, "sprite": player_sprite, "group": player_group}
+        )
+    return sprites, sprite_cfg
+
+
+def state_dtype(num_ships: int, max_torpedoes: int) -> np.dtype:
+    """Returns the structured dtype of a match snapshot. Weapons that have
+    never been fired have a last fired tick of NEVER_FIRED.
+    """
+    ships = (num_ships,)
+    torpedoes = (num_ships, max_torpedoes)
+    return np.dtype(
+        [
+            ("ticks", np.int64),
+            ("ship_pos", np.float64, (*ships, 2)),
+            ("ship_vel", np.float64, (*ships, 2)),
+            ("ship_ang", np.float64, ships),
+            ("ship_alive", np.bool_, ships),
+            ("phaser_last_fired", np.int64, ships),
+            ("torpedo_last_fired", np.int64, ships),
+            ("phaser_alive", np.bool_, ships),
+            ("phaser_active", np.bool_, ships),
+            ("phaser_start_time", np.int64, ships),
+            ("phaser_ship_pos", np.float64, (*ships, 2)),
+            ("phaser_num_coords", np.int64, ships),
+            (
+                "phaser_coords",
+                np.float64,
+                (*ships, PHASER_MAX_SEGMENTS, 2, 2),
+            ),
+            ("torpedo_pos", np.float64, (*torpedoes, 2)),
+            ("torpedo_vel", np.float64, (*torpedoes, 2)),
+            ("torpedo_ang", np.float64, torpedoes),
+            ("torpedo_alive", np.bool_, torpedoes),
+            ("torpedo_fired_at", np.int64, torpedoes),
+        ]
+    )
+
+
+class SpaceWarSim:
+    """Steps a match between ships one fixed tick at a time.
+
+    The game rules are the same as the windowed game since the simulation
+    updates the same ship and weapon sprites. Drawing is optional and only
+    happens when draw is called. A headless simulation shares only the
+    collision geometry of the sprites' assets and can not be drawn.
+
+    Attributes
+    ----------
+    ship_classes: The ship class to instantiate for each player
+    start_pos: The starting position of each ship
+    start_ang: The starting angle of each ship
+    max_ticks: The number of ticks before the match is truncated
+    frame_skip: The number of ticks each call to step repeats the actions for
+    renderer: Renders a pixel frame at the end of each step, if any
+    max_pool: Whether the frame is the max of the last two ticks' frames
+    assets: The registry the sprites' assets are shared from
+    frame: The pixel frame rendered at the end of the last step or reset
+    clock: The clock shared by the ships and weapons, restarted on reset
+    world: The arrays holding the state of every ship and torpedo
+    player_sprites: The ships in the match, ordered by player id
+    cfg: The sprite configuration of each ship
+    torpedo_group: Group containing every ship's torpedoes
+    player_target_group: Group containing every sprite that can be hit
+    broadphase: Grid used to find nearby sprites for collisions, rebuilt
+        and used in the ticks with at least BROADPHASE_MIN_SPRITES sprites
+        that can be hit
+    state_dtype: The structured dtype of the snapshots from get_state
+
+    """
+
+    ship_classes: Sequence[type[BaseShip]]
+    start_pos: Sequence[tuple[float, float]]
+    start_ang: Sequence[float]
+    max_ticks: int
+    frame_skip: int
+    renderer: Optional[PixelRenderer]
+    max_pool: bool
+    assets: AssetRegistry
+    frame: Optional[np.ndarray]
+    clock: SimClock
+    world: WorldState
+    player_sprites: list[BaseShip]
+    cfg: list[ShipSpriteConfig]
+    torpedo_group: pygame.sprite.Group
+    player_target_group: pygame.sprite.Group
+    broadphase: SpatialHash
+    state_dtype: np.dtype
+
+    def __init__(
+        self,
+        ship_classes: Sequence[type[BaseShip]] = (BaseShip, BaseShip),
+        start_pos: Optional[Sequence[tuple[float, float]]] = None,
+        start_ang: Sequence[float] = (0, 180),
+        max_ticks: int = MAX_SIM_TICKS,
+        frame_skip: int = 1,
+        renderer: Optional[PixelRenderer] = None,
+        max_pool: bool = False,
+        headless: bool = False,
+    ) -> None:
+        self.ship_classes = ship_classes
+        self.start_pos = start_pos or [
+            (SCREEN_WIDTH / 4, SCREEN_HEIGHT / 4),
+            (
+                SCREEN_WIDTH - SCREEN_WIDTH / 4,
+                SCREEN_HEIGHT - SCREEN_HEIGHT / 4,
+            ),
+        ]
+        self.start_ang = start_ang
+        self.max_ticks = max_ticks
+        self.frame_skip = frame_skip
+        self.renderer = renderer
+        self.max_pool = max_pool
+        self.assets = HEADLESS_ASSETS if headless else ASSETS
+        self.frame = renderer.new_frame() if renderer else None
+        self._prev_frame = renderer.new_frame() if renderer else None
+        self.broadphase = SpatialHash()
+        self.reset()
+        self.state_dtype = state_dtype(
+            len(ship_classes), self.world.max_torpedoes
+        )
+
+    def reset(self) -> list[ShipState]:
+        """Starts a new match and returns the initial state"""
+        self.clock = SimClock()
+        self.world = WorldState(num_ships=len(self.ship_classes))
+        self.player_sprites, self.cfg = get_player_sprites(
+            instance_iter=self.ship_classes,
+            pos_iter=self.start_pos,
+            ang_iter=self.start_ang,
+            clock=self.clock,
+            world=self.world,
+            assets=self.assets,
+        )
+        self.torpedo_group = pygame.sprite.Group()
+        self.player_target_group = pygame.sprite.Group()
+        self.player_target_group.add(self.player_sprites)
+        if self.renderer:
+            self.renderer.render(self, out=self.frame)
+        return self.get_ship_states()
+
+    @property
+    def ticks(self) -> int:
+        """The number of ticks since the last reset"""
+        return self.clock.ticks
+
+    def get_ship_states(self) -> list[ShipState]:
+        """Returns the state of each ship, ordered by player id"""
+        world = self.world
+        return [
+            {
+                "pos": tuple(pos),
+                "vel": tuple(vel),
+                "ang": ang,
+                "alive": player.alive(),
+                "torpedoes": [
+                    (torpedo.pos, torpedo.vel)
+                    for torpedo in player.torpedo_group
+                ],
+            }
+            for player, pos, vel, ang in zip(
+                self.player_sprites,
+                world.ship_pos.tolist(),
+                world.ship_vel.tolist(),
+                world.ship_ang.tolist(),
+            )
+        ]
+
+    def get_state(self) -> np.ndarray:
+        """Returns a snapshot of the match that can be restored with
+        set_state.
+
+        The snapshot is a 0-d array of state_dtype, so it can be copied,
+        stacked with other snapshots, or saved with tobytes.
+        """
+        state = np.zeros((), dtype=self.state_dtype)
+        world = self.world
+        state["ticks"] = self.clock.ticks
+        state["ship_pos"] = world.ship_pos
+        state["ship_vel"] = world.ship_vel
+        state["ship_ang"] = world.ship_ang
+        state["ship_alive"] = world.ship_alive
+        state["torpedo_pos"] = world.torpedo_pos
+        state["torpedo_vel"] = world.torpedo_vel
+        state["torpedo_ang"] = world.torpedo_ang
+        state["torpedo_alive"] = world.torpedo_alive
+        state["torpedo_fired_at"] = world.torpedo_fired_at
+
+        for idx, player in enumerate(self.player_sprites):
+            for field, last_fired in (
+                ("phaser_last_fired", player.phaser_last_fired),
+                ("torpedo_last_fired", player.torpedo_last_fired),
+            ):
+                state[field][idx] = (
+                    NEVER_FIRED if last_fired is None else last_fired
+                )
+
+            phaser = player.phaser_group.sprite
+            if phaser:
+                state["phaser_alive"][idx] = True
+                state["phaser_active"][idx] = phaser.active
+                state["phaser_start_time"][idx] = phaser.start_time
+                state["phaser_ship_pos"][idx] = phaser.ship_pos
+                state["phaser_num_coords"][idx] = len(phaser.coords)
+                if phaser.coords:
+                    state["phaser_coords"][
+                        idx, : len(phaser.coords)
+                    ] = phaser.coords
+        return state
+
+    def set_state(self, state: Union[np.ndarray, bytes]):
+        """Restores a snapshot from get_state, or its bytes, in place.
+
+        The ships, torpedoes, and groups are reused, so restoring does not
+        load any images or create any sprites apart from active phasers.
+        """
+        if isinstance(state, bytes):
+            state = np.frombuffer(state, dtype=self.state_dtype)[0]
+
+        # empty the groups first, so killing sprites does not touch the
+        # restored world state
+        self.torpedo_group.empty()
+        self.player_target_group.empty()
+        for player in self.cfg:
+            player["group"].empty()
+            player["sprite"].torpedo_group.empty()
+            player["sprite"].phaser_group.empty()
+
+        world = self.world
+        self.clock.ticks = int(state["ticks"])
+        world.ship_pos[:] = state["ship_pos"]
+        world.ship_vel[:] = state["ship_vel"]
+        world.ship_ang[:] = state["ship_ang"]
+        world.ship_alive[:] = state["ship_alive"]
+        world.torpedo_pos[:] = state["torpedo_pos"]
+        world.torpedo_vel[:] = state["torpedo_vel"]
+        world.torpedo_ang[:] = state["torpedo_ang"]
+        world.torpedo_alive[:] = state["torpedo_alive"]
+        world.torpedo_fired_at[:] = state["torpedo_fired_at"]
+
+        for idx, player in enumerate(self.cfg):
+            ship = player["sprite"]
+            if world.ship_alive[idx]:
+                player["group"].add(ship)
+                self.player_target_group.add(ship)
+                ship.sync_rect()
+
+            last_fired = state["phaser_last_fired"][idx]
+            ship.phaser_last_fired = (
+                None if last_fired == NEVER_FIRED else int(last_fired)
+            )
+            last_fired = state["torpedo_last_fired"][idx]
+            ship.torpedo_last_fired = (
+                None if last_fired == NEVER_FIRED else int(last_fired)
+            )
+
+            ship.phaser = None
+            if state["phaser_alive"][idx]:
+                phaser = ship.phaser = Phaser(source_ship=ship)
+                phaser.active = bool(state["phaser_active"][idx])
+                phaser.start_time = int(state["phaser_start_time"][idx])
+                phaser.ship_pos = tuple(state["phaser_ship_pos"][idx].tolist())
+                phaser.coords = [
+                    (tuple(start), tuple(end))
+                    for start, end in state["phaser_coords"][
+                        idx, : state["phaser_num_coords"][idx]
+                    ].tolist()
+                ]
+                ship.phaser_group.add(phaser)
+
+        # torpedoes are added in the order they were fired, the same order
+        # the groups had when the snapshot was taken
+        ship_idxs, slots = np.nonzero(world.torpedo_alive)
+        fired_order = np.lexsort(
+            (ship_idxs, world.torpedo_fired_at[ship_idxs, slots])
+        )
+        for ship_idx, slot in zip(
+            ship_idxs[fired_order].tolist(), slots[fired_order].tolist()
+        ):
+            torpedo = world.torpedo_sprites[ship_idx][slot]
+            torpedo.start_time = int(world.torpedo_fired_at[ship_idx, slot])
+            torpedo.sync_rect()
+            self.player_sprites[ship_idx].torpedo_group.add(torpedo)
+            self.torpedo_group.add(torpedo)
+            self.player_target_group.add(torpedo)
+
+        if self.renderer:
+            self.renderer.render(self, out=self.frame)
+
+    def _update_group_membership(self):
+        """Adds the torpedoes fired since the last tick to the shared groups"""
+        self.torpedo_group.add(
+            [player.torpedo_group for player in self.player_sprites]
+        )
+        self.player_target_group.add(self.torpedo_group)
+
+    def _sync_rects(self):
+        """Syncs the rect of every live ship and torpedo, reading the angles
+        and positions straight from the world arrays
+        """
+        world = self.world
+        np.remainder(world.ship_ang, 360, out=world.ship_ang)
+        for ship, alive, heading, center in zip(
+            self.player_sprites,
+            world.ship_alive.tolist(),
+            headings(world.ship_ang).tolist(),
+            world.ship_pos.tolist(),
+        ):
+            if alive:
+                ship.place(heading, center)
+
+        if not world.torpedo_alive.any():
+            return
+        ship_idxs, slots = np.nonzero(world.torpedo_alive)
+        angs = world.torpedo_ang[ship_idxs, slots]
+        np.remainder(angs, 360, out=angs)
+        world.torpedo_ang[ship_idxs, slots] = angs
+        for ship_idx, slot, heading, center in zip(
+            ship_idxs.tolist(),
+            slots.tolist(),
+            headings(angs).tolist(),
+            world.torpedo_pos[ship_idxs, slots].tolist(),
+        ):
+            world.torpedo_sprites[ship_idx][slot].place(heading, center)
+
+    def _tick(
+        self, actions: Optional[Sequence[ShipAction]]
+    ) -> tuple[list[float], bool]:
+        """Advances the match by one tick, returning the reward of each ship
+        and whether the match is over
+        """
+        alive_before = [player.alive() for player in self.player_sprites]
+
+        if actions is not None:
+            for player, action in zip(self.player_sprites, actions):
+                if player.alive():
+                    player.apply_action(action)
+
+        self._update_group_membership()
+
+        # move everything at once, so every rect is current before any
+        # collision checks. Sprites then only collide.
+        self.world.kill_expired(self.world.integrate(self.clock.ticks))
+        self._sync_rects()
+        broadphase = None
+        if len(self.player_target_group) >= BROADPHASE_MIN_SPRITES:
+            broadphase = self.broadphase
+            broadphase.rebuild(self.player_target_group)
+
+        for player in self.cfg:
+            player["group"].update(
+                target_group=self.player_target_group,
+                broadphase=broadphase,
+            )
+            player["sprite"].update_groups(
+                target_group=self.player_target_group,
+                broadphase=broadphase,
+            )
+        self.clock.tick()
+
+        destroyed = [
+            was_alive and not player.alive()
+            for was_alive, player in zip(alive_before, self.player_sprites)
+        ]
+        rewards = [
+            float(sum(destroyed[:idx] + destroyed[idx + 1 :]) - destroyed[idx])
+            for idx in range(len(destroyed))
+        ]
+        num_alive = sum(player.alive() for player in self.player_sprites)
+        done = num_alive <= 1 or self.ticks >= self.max_ticks
+        return rewards, done
+
+    def step(
+        self, actions: Optional[Sequence[ShipAction]] = None
+    ) -> tuple[list[ShipState], list[float], bool]:
+        """Advances the match by frame_skip ticks, repeating the actions each
+        tick and stopping early if the match ends.
+
+        Each ship takes the action at its player id. Passing no actions lets
+        the ships drift, which is used when the caller applies the actions of
+        human players itself.
+
+        Returns the state of each ship after the last tick, the reward of each
+        ship summed over the ticks, and whether the match is over. A ship is
+        rewarded for each opponent destroyed and penalized when destroyed
+        itself. The state, and the frame if there is a renderer, are only
+        built once per step.
+        """
+        total_rewards = [0.0] * len(self.player_sprites)
+        pooled = False
+        for skip_idx in range(self.frame_skip):
+            rewards, done = self._tick(actions)
+            total_rewards = [
+                total + reward for total, reward in zip(total_rewards, rewards)
+            ]
+            if done:
+                break
+            if (
+                self.renderer
+                and self.max_pool
+                and skip_idx == self.frame_skip - 2
+            ):
+                self.renderer.render(self, out=self._prev_frame)
+                pooled = True
+
+        if self.renderer:
+            self.renderer.render(self, out=self.frame)
+            if pooled:
+                np.maximum(self.frame, self._prev_frame, out=self.frame)
+
+        return self.get_ship_states(), total_rewards, done
+
+    def draw(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        """Draws every ship and its weapons to the surface and returns the
+        rects drawn to
+        """
+        if self.assets.headless:
+            raise ValueError("A headless simulation can not be drawn")
+        rects = []
+        for player in self.cfg:
+            rects.extend(player["sprite"].draw_groups(surface))
+            rects.extend(
+                surface.blits(
+                    [(ship.image, ship.rect) for ship in player["group"]]
+                )
+            )
+        return rects
@@ -0,0 +1,272 @@
+"""Multiprocess vectorized environment
+
+Runs VectorSpaceWar copies in worker processes. Actions, observations,
+rewards, and dones are exchanged through shared memory arrays, and the pipes
+only carry short commands, so nothing is pickled per step.
+"""
+
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from space_war.sim.vector import SHIP_OBS_SIZE, VectorSpaceWar
+
+# Commands sent to the workers through the pipe
+STEP, RESET, CLOSE = range(3)
+
+
+class SharedArraySpec(NamedTuple):
+    """Describes a numpy array backed by a shared memory block"""
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+    def attach(self) -> tuple[SharedMemory, np.ndarray]:
+        """Opens the shared memory block and returns it with its array"""
+        shm = SharedMemory(name=self.name)
+        return shm, np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+
+def _worker(
+    conn: Connection,
+    env_slice: slice,
+    specs: dict[str, SharedArraySpec],
+    env_kwargs: dict[str, Any],
+):
+    """Worker process loop that steps its slice of the envs on command"""
+    blocks, arrays = {}, {}
+    for key, spec in specs.items():
+        blocks[key], arrays[key] = spec.attach()
+    actions = arrays["actions"][env_slice]
+    obs = arrays["obs"][env_slice]
+    rewards = arrays["rewards"][env_slice]
+    dones = arrays["dones"][env_slice]
+
+    env = VectorSpaceWar(len(obs), **env_kwargs)
+    try:
+        while True:
+            cmd = conn.recv()
+            if cmd == STEP:
+                env.step(actions, out=(obs, rewards, dones))
+            elif cmd == RESET:
+                env.reset(out=obs)
+                rewards[:] = 0
+                dones[:] = False
+            elif cmd == CLOSE:
+                break
+            conn.send(cmd)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del actions, obs, rewards, dones, arrays
+        for shm in blocks.values():
+            shm.close()
+        conn.close()
+
+
+class SubprocVectorSpaceWar:
+    """Steps envs split across worker processes.
+
+    The arrays returned by reset and step are the shared buffers, so they are
+    overwritten by the next call. If a worker crashes, it is restarted and
+    its envs are reported as done with zero reward.
+
+    Attributes
+    ----------
+    num_workers: The number of worker processes
+    envs_per_worker: The number of envs stepped by each worker
+    num_envs: The total number of envs
+    num_ships: The number of ships in each env
+    env_kwargs: The keyword arguments used to create each VectorSpaceWar
+    actions: The shared buffer of actions read by the workers
+    obs: The shared buffer of observations written by the workers
+    rewards: The shared buffer of rewards written by the workers
+    dones: The shared buffer of dones written by the workers
+
+    """
+
+    num_workers: int
+    envs_per_worker: int
+    num_envs: int
+    num_ships: int
+    env_kwargs: dict[str, Any]
+    actions: np.ndarray
+    obs: np.ndarray
+    rewards: np.ndarray
+    dones: np.ndarray
+
+    def __init__(
+        self,
+        num_workers: int,
+        envs_per_worker: int = 1,
+        context: str = "spawn",
+        **env_kwargs,
+    ) -> None:
+        self.num_workers = num_workers
+        self.envs_per_worker = envs_per_worker
+        self.num_envs = num_workers * envs_per_worker
+        self.num_ships = len(env_kwargs.get("start_ang", (0, 180)))
+        self.env_kwargs = env_kwargs
+        self._ctx = mp.get_context(context)
+
+        ships = (self.num_envs, self.num_ships)
+        self._blocks = {}
+        self._specs = {}
+        self._conns = [None] * num_workers
+        self._procs = [None] * num_workers
+        self._waiting = False
+        try:
+            for key, shape, dtype in (
+                ("actions", ships, np.int64),
+                ("obs", (*ships, SHIP_OBS_SIZE), np.float32),
+                ("rewards", ships, np.float32),
+                ("dones", (self.num_envs,), np.bool_),
+            ):
+                dtype = np.dtype(dtype)
+                shm = SharedMemory(
+                    create=True,
+                    size=max(1, int(np.prod(shape)) * dtype.itemsize),
+                )
+                self._blocks[key] = shm
+                self._specs[key] = SharedArraySpec(shm.name, shape, dtype.str)
+                setattr(
+                    self, key, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                )
+
+            for worker_idx in range(num_workers):
+                self._start_worker(worker_idx)
+            self.reset()
+        except BaseException:
+            # nothing else holds the shared memory yet, so it would leak
+            for proc in self._procs:
+                if proc is not None:
+                    proc.terminate()
+                    proc.join()
+            for conn in self._conns:
+                if conn is not None:
+                    conn.close()
+            self._free_shared_memory()
+            raise
+
+    def _env_slice(self, worker_idx: int) -> slice:
+        """Returns the slice of envs stepped by the worker"""
+        start = worker_idx * self.envs_per_worker
+        return slice(start, start + self.envs_per_worker)
+
+    def _start_worker(self, worker_idx: int):
+        """Starts the worker process and its pipe"""
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker,
+            args=(
+                child_conn,
+                self._env_slice(worker_idx),
+                self._specs,
+                self.env_kwargs,
+            ),
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+        self._conns[worker_idx] = parent_conn
+        self._procs[worker_idx] = proc
+
+    def _restart_worker(self, worker_idx: int):
+        """Replaces a crashed worker and resets its envs"""
+        self._conns[worker_idx].close()
+        if self._procs[worker_idx].is_alive():
+            self._procs[worker_idx].terminate()
+        self._procs[worker_idx].join()
+
+        self._start_worker(worker_idx)
+        self._conns[worker_idx].send(RESET)
+        self._conns[worker_idx].recv()
+
+    def _send_all(self, cmd: int) -> list[int]:
+        """Sends the command to every worker, returning the workers that could
+        not receive it
+        """
+        failed = []
+        for worker_idx, conn in enumerate(self._conns):
+            try:
+                conn.send(cmd)
+            except (BrokenPipeError, ConnectionResetError):
+                failed.append(worker_idx)
+        return failed
+
+    def _wait_all(self, failed: list[int]) -> list[int]:
+        """Waits for every worker to finish its command, returning the workers
+        that crashed
+        """
+        for worker_idx, conn in enumerate(self._conns):
+            if worker_idx in failed:
+                continue
+            try:
+                conn.recv()
+            except (EOFError, ConnectionResetError):
+                failed.append(worker_idx)
+        return failed
+
+    def reset(self) -> np.ndarray:
+        """Resets every env and returns the observations"""
+        for worker_idx in self._wait_all(self._send_all(RESET)):
+            self._restart_worker(worker_idx)
+        return self.obs
+
+    def step_async(self, actions: np.ndarray):
+        """Sends the actions to the workers without waiting for the results"""
+        self.actions[:] = actions
+        self._pending = self._send_all(STEP)
+        self._waiting = True
+
+    def step_wait(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Waits for the workers to finish stepping, returning the
+        observations, rewards, and dones
+        """
+        crashed = self._wait_all(self._pending)
+        self._waiting = False
+        for worker_idx in crashed:
+            self._restart_worker(worker_idx)
+            env_slice = self._env_slice(worker_idx)
+            self.rewards[env_slice] = 0
+            self.dones[env_slice] = True
+        return self.obs, self.rewards, self.dones
+
+    def step(
+        self, actions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Steps every env, see VectorSpaceWar.step"""
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        """Stops the workers and frees the shared memory"""
+        if self._waiting:
+            self._wait_all(self._pending)
+        self._send_all(CLOSE)
+        for proc in self._procs:
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._free_shared_memory()
+
+    def _free_shared_memory(self):
+        """Drops the shared buffers and frees their memory blocks"""
+        for key, shm in self._blocks.items():
+            if hasattr(self, key):
+                delattr(self, key)
+            shm.close()
+            shm.unlink()
+        self._blocks = {}
+
+    def __enter__(self) -> "SubprocVectorSpaceWar":
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
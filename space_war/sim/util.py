@@ -1,6 +1,7 @@
 """Miscellaneous Utility Functions"""
 
 import math
+from typing import Optional
 
 import pygame
 
@@ -23,38 +24,135 @@ def check_overlapping_sprites(
     return overlap_x, overlap_y
 
 
+def collide_masks(
+    sprite: pygame.sprite.Sprite, sprite_other: pygame.sprite.Sprite
+) -> bool:
+    """Returns whether the masks of two sprites overlap. Only worth calling
+    once their rects are known to collide, since testing the rects is cheaper.
+    """
+    return (
+        sprite.mask.overlap(
+            sprite_other.mask,
+            (
+                sprite_other.rect.left - sprite.rect.left,
+                sprite_other.rect.top - sprite.rect.top,
+            ),
+        )
+        is not None
+    )
+
+
+def create_surface(size: tuple[int, int]) -> pygame.Surface:
+    """Creates a transparent surface.
+
+    The surface is only converted to the display's pixel format when a display
+    mode has been set, so headless simulations do not need a window.
+    """
+    if pygame.display.get_surface() is None:
+        return pygame.Surface(size, pygame.SRCALPHA)
+    return pygame.Surface(size).convert_alpha()
+
+
+def load_image(image_path) -> pygame.Surface:
+    """Loads an image, converting it when a display mode has been set"""
+    image = pygame.image.load(image_path)
+    if pygame.display.get_surface() is None:
+        return image
+    return image.convert_alpha()
+
+
 def sign(num):
     """Calculates the sign of a number"""
     return -1 if num < 0 else 1
 
 
-def create_linear_eq(angle, point):
-    """Creates x and y linear equations from angle and a point"""
-    slope_ang = angle % 180
-    slope = (
-        math.tan(slope_ang * (math.pi / 180))
-        if slope_ang < 90
-        else 1 / math.tan(slope_ang * (math.pi / 180))
-    )
+def wrap_ray(
+    start: tuple[float, float],
+    angle: float,
+    length: float,
+    bounds: tuple[float, float],
+) -> list[tuple[tuple[float, float], tuple[float, float], float]]:
+    """Splits a ray into line segments that wrap around the screen.
 
-    intercept = (
-        point[1] - slope * point[0]
-        if slope_ang < 90
-        else point[0] - slope * point[1]
-    )
+    Returns the start, end, and distance travelled before the start of each
+    segment. There is no limit on the number of times the ray can wrap. A
+    start off the screen, like a ship that has not wrapped yet, is wrapped
+    onto it first, so every segment is on the screen.
+    """
+    width, height = bounds
+    x_dir = math.cos(angle * math.pi / 180)
+    y_dir = math.sin(angle * math.pi / 180)
+    x_pos, y_pos = start[0] % width, start[1] % height
+    travelled = 0
+    segments = []
 
-    # get y coordinate from x
-    y_linear_eq = (
-        (lambda x: slope * x + intercept)
-        if slope_ang < 90
-        else (lambda x: (x - intercept) / slope)
-    )
+    while True:
+        remaining = length - travelled
 
-    # get x coordinate from y
-    x_linear_eq = (
-        (lambda y: (y - intercept) / slope)
-        if slope_ang < 90
-        else (lambda y: slope * y + intercept)
-    )
+        # distance along the ray to the vertical and horizontal screen edges
+        x_dist = math.inf
+        if x_dir > 0:
+            x_dist = max((width - x_pos) / x_dir, 0)
+        elif x_dir < 0:
+            x_dist = max(-x_pos / x_dir, 0)
+        y_dist = math.inf
+        if y_dir > 0:
+            y_dist = max((height - y_pos) / y_dir, 0)
+        elif y_dir < 0:
+            y_dist = max(-y_pos / y_dir, 0)
+
+        dist = min(x_dist, y_dist, remaining)
+        end = (x_pos + dist * x_dir, y_pos + dist * y_dir)
+        if dist > 0:
+            segments.append(((x_pos, y_pos), end, travelled))
+        travelled += dist
+
+        if math.floor(length - travelled) <= 0:
+            return segments
+
+        # wrap around the edge(s) the ray reached
+        x_pos, y_pos = end
+        if x_dist == dist:
+            x_pos = 0 if x_dir > 0 else width
+        if y_dist == dist:
+            y_pos = 0 if y_dir > 0 else height
+
+
+def segment_rect_entry(
+    start: tuple[float, float],
+    end: tuple[float, float],
+    rect: pygame.Rect,
+    margin: float = 0,
+) -> Optional[float]:
+    """Returns the fraction along the line segment where it enters the rect,
+    expanded by margin on each side, or None if it misses the rect.
+
+    Uses the Liang-Barsky line clipping algorithm.
+    """
+    x_pos, y_pos = start
+    x_delta = end[0] - x_pos
+    y_delta = end[1] - y_pos
+    t_enter, t_exit = 0.0, 1.0
+
+    for direction, edge_dist in (
+        (-x_delta, x_pos - (rect.left - margin)),
+        (x_delta, (rect.right + margin) - x_pos),
+        (-y_delta, y_pos - (rect.top - margin)),
+        (y_delta, (rect.bottom + margin) - y_pos),
+    ):
+        if direction == 0:
+            # parallel to the edge, so it must start inside it
+            if edge_dist < 0:
+                return None
+            continue
+        ratio = edge_dist / direction
+        if direction < 0:
+            if ratio > t_exit:
+                return None
+            t_enter = max(t_enter, ratio)
+        else:
+            if ratio < t_enter:
+                return None
+            t_exit = min(t_exit, ratio)
 
-    return x_linear_eq, y_linear_eq, slope
+    return t_enter
@@ -0,0 +1,525 @@
+"""Batched vectorized environment
+
+Holds many independent matches in batched NumPy arrays and steps all of them
+with a single call. The rules follow SpaceWarSim without any sprites, so there
+is no per-entity Python overhead. Collisions are tested on the rotated rects
+first, and then on the same pixel masks as SpaceWarSim, looked up in the
+precomputed overlap tables, so pygame is never imported.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from space_war.sim.conf import (
+    MAX_SIM_TICKS,
+    MAX_TORPEDOES_PER_SHIP,
+    MAX_VEL,
+    PHASER_FIRE_CD_TICKS,
+    PHASER_LENGTH,
+    PHASER_WIDTH,
+    ROTATION_STEP,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    SHIP_SIZE,
+    TORPEDO_FIRE_CD_TICKS,
+    TORPEDO_MAX_FLIGHT_TICKS,
+    TORPEDO_MOVES_PER_TICK,
+    TORPEDO_SIZE,
+    TORPEDO_SPAWN_DIST,
+    TORPEDO_SPEED,
+    ShipAction,
+)
+from space_war.sim.overlaps import TORPEDO_KEY, overlaps, ship_key
+from space_war.sim.world import (
+    NEVER_FIRED,
+    headings,
+    masks_overlap,
+    rect_bounds,
+    rotated_sizes,
+    segment_rect_entries,
+    wrap_and_move,
+)
+
+# The number of values per ship in the observation
+SHIP_OBS_SIZE = 6
+
+
+class VectorSpaceWar:
+    """Steps num_envs independent matches at once.
+
+    Ships are controlled with ShipAction values, one per ship per env. Envs
+    that finish are reset automatically at the end of step.
+
+    The rules run in player order, and each ship's torpedoes collide in the
+    order they were fired, the same as the sprite groups of SpaceWarSim.
+
+    Attributes
+    ----------
+    num_envs: The number of matches
+    num_ships: The number of ships in each match
+    max_torpedoes: The number of torpedo slots per ship
+    max_ticks: The number of ticks before a match is truncated
+    start_pos: The starting position of each ship
+    start_ang: The starting angle of each ship
+    ticks: The number of ticks since each env was reset
+    ship_pos: The center position of each ship
+    ship_vel: The velocity of each ship
+    ship_ang: The angle in degrees each ship is facing
+    ship_alive: Whether each ship is alive
+    phaser_last_fired: The tick each ship last fired its phaser
+    torpedo_last_fired: The tick each ship last fired a torpedo
+    torpedo_pos: The center position of each torpedo
+    torpedo_vel: The velocity of each torpedo
+    torpedo_ang: The angle in degrees of each torpedo
+    torpedo_alive: Whether each torpedo slot is in use
+    torpedo_fired_at: The tick each torpedo was fired at
+    obs: The buffer holding the x, y, x_vel, y_vel, ang, and alive of each
+        ship, returned by reset and step
+
+    """
+
+    num_envs: int
+    num_ships: int
+    max_torpedoes: int
+    max_ticks: int
+    start_pos: np.ndarray
+    start_ang: np.ndarray
+    ticks: np.ndarray
+    ship_pos: np.ndarray
+    ship_vel: np.ndarray
+    ship_ang: np.ndarray
+    ship_alive: np.ndarray
+    phaser_last_fired: np.ndarray
+    torpedo_last_fired: np.ndarray
+    torpedo_pos: np.ndarray
+    torpedo_vel: np.ndarray
+    torpedo_ang: np.ndarray
+    torpedo_alive: np.ndarray
+    torpedo_fired_at: np.ndarray
+    obs: np.ndarray
+
+    def __init__(
+        self,
+        num_envs: int,
+        start_pos: Optional[Sequence[tuple[float, float]]] = None,
+        start_ang: Sequence[float] = (0, 180),
+        max_ticks: int = MAX_SIM_TICKS,
+        max_torpedoes: int = MAX_TORPEDOES_PER_SHIP,
+    ) -> None:
+        self.num_envs = num_envs
+        self.num_ships = len(start_ang)
+        self.max_torpedoes = max_torpedoes
+        self.max_ticks = max_ticks
+        self.start_pos = np.array(
+            start_pos
+            or [
+                (SCREEN_WIDTH / 4, SCREEN_HEIGHT / 4),
+                (
+                    SCREEN_WIDTH - SCREEN_WIDTH / 4,
+                    SCREEN_HEIGHT - SCREEN_HEIGHT / 4,
+                ),
+            ],
+            dtype=np.float64,
+        )
+        self.start_ang = np.array(start_ang, dtype=np.float64)
+
+        ships = (num_envs, self.num_ships)
+        torpedoes = (num_envs, self.num_ships, max_torpedoes)
+        self.ticks = np.zeros(num_envs, dtype=np.int64)
+        self.ship_pos = np.zeros((*ships, 2))
+        self.ship_vel = np.zeros((*ships, 2))
+        self.ship_ang = np.zeros(ships)
+        self.ship_alive = np.zeros(ships, dtype=bool)
+        self.phaser_last_fired = np.zeros(ships, dtype=np.int64)
+        self.torpedo_last_fired = np.zeros(ships, dtype=np.int64)
+        self.torpedo_pos = np.zeros((*torpedoes, 2))
+        self.torpedo_vel = np.zeros((*torpedoes, 2))
+        self.torpedo_ang = np.zeros(torpedoes)
+        self.torpedo_alive = np.zeros(torpedoes, dtype=bool)
+        self.torpedo_fired_at = np.zeros(torpedoes, dtype=np.int64)
+        self.obs = np.zeros((*ships, SHIP_OBS_SIZE), dtype=np.float32)
+
+        self._ship_sizes = rotated_sizes(SHIP_SIZE)
+        self._torpedo_sizes = rotated_sizes(TORPEDO_SIZE)
+        # the mask overlaps of each pair of ships, and of a torpedo with each
+        # ship followed by a torpedo with another torpedo
+        ship_keys = [ship_key(player_id) for player_id in range(self.num_ships)]
+        self._ship_overlaps = [
+            [overlaps(key, other) for other in ship_keys] for key in ship_keys
+        ]
+        self._torpedo_overlaps = [
+            overlaps(TORPEDO_KEY, other) for other in ship_keys + [TORPEDO_KEY]
+        ]
+        # offsets of the 9 copies of the screen around the ray, so a single
+        # straight segment tests every wrap-around
+        offsets = np.array(
+            [
+                (x_off, y_off)
+                for x_off in (-SCREEN_WIDTH, 0, SCREEN_WIDTH)
+                for y_off in (-SCREEN_HEIGHT, 0, SCREEN_HEIGHT)
+            ],
+            dtype=np.float64,
+        )
+        self._wrap_offsets = offsets
+
+        self.reset()
+
+    def reset(
+        self,
+        env_mask: Optional[np.ndarray] = None,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Resets the envs in the mask, or every env if no mask is passed, and
+        returns the observation of every env, written into out if passed
+        """
+        if env_mask is None:
+            env_mask = np.ones(self.num_envs, dtype=bool)
+        self._reset_envs(env_mask)
+        return self.get_obs(out)
+
+    def _reset_envs(self, env_mask: np.ndarray):
+        """Puts the envs in the mask back in their starting state"""
+        self.ticks[env_mask] = 0
+        self.ship_pos[env_mask] = self.start_pos
+        self.ship_vel[env_mask] = 0
+        self.ship_ang[env_mask] = self.start_ang
+        self.ship_alive[env_mask] = True
+        self.phaser_last_fired[env_mask] = NEVER_FIRED
+        self.torpedo_last_fired[env_mask] = NEVER_FIRED
+        self.torpedo_alive[env_mask] = False
+
+    def get_obs(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Writes the state of each ship into out, or the observation buffer
+        if out is not passed
+        """
+        obs = self.obs if out is None else out
+        obs[..., 0:2] = self.ship_pos
+        obs[..., 2:4] = self.ship_vel
+        obs[..., 4] = self.ship_ang
+        obs[..., 5] = self.ship_alive
+        return obs
+
+    def _apply_actions(self, actions: np.ndarray) -> np.ndarray:
+        """Rotates, accelerates, and fires torpedoes using the same rules as
+        BaseShip. Returns a mask of the ships that fired their phaser.
+        """
+        alive = self.ship_alive
+        ticks = self.ticks[:, None]
+
+        rotation = np.where(
+            actions == ShipAction.ROTATE_CW.value, ROTATION_STEP, 0
+        ) - np.where(actions == ShipAction.ROTATE_CCW.value, ROTATION_STEP, 0)
+        self.ship_ang += rotation * alive
+        self.ship_ang %= 360
+
+        rad = self.ship_ang * np.pi / 180
+        direction = np.stack((np.cos(rad), np.sin(rad)), axis=-1)
+
+        thrust = (actions == ShipAction.THRUST.value) & alive
+        self.ship_vel += direction * thrust[..., None]
+        np.clip(self.ship_vel, -MAX_VEL, MAX_VEL, out=self.ship_vel)
+
+        free_slots = ~self.torpedo_alive
+        fire_torpedo = (
+            (actions == ShipAction.FIRE_TORPEDO.value)
+            & alive
+            & (ticks - self.torpedo_last_fired >= TORPEDO_FIRE_CD_TICKS)
+            & free_slots.any(axis=-1)
+        )
+        env_idx, ship_idx = np.nonzero(fire_torpedo)
+        slot = free_slots[env_idx, ship_idx].argmax(axis=-1)
+        fired = (env_idx, ship_idx, slot)
+        self.torpedo_pos[fired] = (
+            self.ship_pos[env_idx, ship_idx]
+            + TORPEDO_SPAWN_DIST * direction[env_idx, ship_idx]
+        )
+        self.torpedo_vel[fired] = (
+            self.ship_vel[env_idx, ship_idx]
+            + TORPEDO_SPEED * direction[env_idx, ship_idx]
+        )
+        self.torpedo_ang[fired] = self.ship_ang[env_idx, ship_idx]
+        self.torpedo_alive[fired] = True
+        self.torpedo_fired_at[fired] = self.ticks[env_idx]
+        self.torpedo_last_fired[env_idx, ship_idx] = self.ticks[env_idx]
+
+        fire_phaser = (
+            (actions == ShipAction.FIRE_PHASER.value)
+            & alive
+            & (ticks - self.phaser_last_fired >= PHASER_FIRE_CD_TICKS)
+        )
+        self.phaser_last_fired[fire_phaser] = np.broadcast_to(
+            ticks, fire_phaser.shape
+        )[fire_phaser]
+        return fire_phaser
+
+    def _integrate(self):
+        """Wraps and moves every ship and torpedo and expires torpedoes"""
+        wrap_and_move(self.ship_pos, self.ship_vel)
+        for _ in range(TORPEDO_MOVES_PER_TICK):
+            wrap_and_move(self.torpedo_pos, self.torpedo_vel)
+        self.torpedo_alive &= (
+            self.ticks[:, None, None] - self.torpedo_fired_at
+            < TORPEDO_MAX_FLIGHT_TICKS
+        )
+
+    def _handle_ship_collisions(self, ship: int, rect_pos: np.ndarray):
+        """Exchanges velocity between the ship and the ships colliding with
+        it and pushes them apart, the same as BaseShip._handle_ship_collisions.
+        Collisions are tested on the rects centered on rect_pos, and the
+        pushes only move ship_pos.
+        """
+        heading = headings(self.ship_ang)
+        for other in range(self.num_ships):
+            if ship == other:
+                continue
+            left, top, right, bottom = rect_bounds(
+                rect_pos[:, [ship, other]],
+                self.ship_ang[:, [ship, other]],
+                self._ship_sizes,
+            )
+            collide = (
+                self.ship_alive[:, ship]
+                & self.ship_alive[:, other]
+                & (left[:, 0] < right[:, 1])
+                & (left[:, 1] < right[:, 0])
+                & (top[:, 0] < bottom[:, 1])
+                & (top[:, 1] < bottom[:, 0])
+            )
+            if not collide.any():
+                continue
+            collide[collide] = masks_overlap(
+                self._ship_overlaps[ship][other],
+                heading[collide, ship],
+                heading[collide, other],
+                left[collide, 1] - left[collide, 0],
+                top[collide, 1] - top[collide, 0],
+            )
+            if not collide.any():
+                continue
+
+            ship_vel = self.ship_vel[collide, ship]
+            other_vel = self.ship_vel[collide, other]
+            self.ship_vel[collide, ship] = ship_vel * 0.2 + other_vel * 0.75
+            self.ship_vel[collide, other] = other_vel * 0.2 + ship_vel * 0.75
+
+            # move the other ship along each axis the rects overlap
+            centers = np.trunc(rect_pos[collide][:, [ship, other]])
+            overlap = centers[:, 0] != centers[:, 1]
+            self.ship_pos[collide, other] += (
+                self.ship_vel[collide, other] * overlap
+            )
+
+    def _torpedo_bounds(self) -> tuple[np.ndarray, ...]:
+        """Returns the rect bounds of every torpedo, flattened to shape
+        (num_envs, num_ships * max_torpedoes). Torpedoes are not moved by
+        collisions, so the bounds hold while the rules run.
+        """
+        return tuple(
+            side.reshape(self.num_envs, -1)
+            for side in rect_bounds(
+                self.torpedo_pos, self.torpedo_ang, self._torpedo_sizes
+            )
+        )
+
+    def _entity_bounds(
+        self, rect_pos: np.ndarray, torpedo_bounds: tuple[np.ndarray, ...]
+    ) -> tuple[tuple[np.ndarray, ...], np.ndarray]:
+        """Returns the rect bounds and alive mask of every ship followed by
+        every torpedo, flattened to shape (num_envs, num_entities), given the
+        ship rect positions and the bounds from _torpedo_bounds
+        """
+        ship_bounds = rect_bounds(rect_pos, self.ship_ang, self._ship_sizes)
+        bounds = tuple(
+            np.concatenate((ship_side, torpedo_side), axis=1)
+            for ship_side, torpedo_side in zip(ship_bounds, torpedo_bounds)
+        )
+        alive = np.concatenate(
+            (self.ship_alive, self.torpedo_alive.reshape(self.num_envs, -1)),
+            axis=1,
+        )
+        return bounds, alive
+
+    def _entity_headings(self) -> np.ndarray:
+        """Returns the heading of every ship followed by every torpedo,
+        flattened to shape (num_envs, num_entities)
+        """
+        return np.concatenate(
+            (
+                headings(self.ship_ang),
+                headings(self.torpedo_ang).reshape(self.num_envs, -1),
+            ),
+            axis=1,
+        )
+
+    def _set_entity_alive(self, alive: np.ndarray):
+        """Writes the flattened alive mask back to the ships and torpedoes"""
+        self.ship_alive[:] = alive[:, : self.num_ships]
+        self.torpedo_alive[:] = alive[:, self.num_ships :].reshape(
+            self.torpedo_alive.shape
+        )
+
+    def _handle_torpedo_collisions(
+        self,
+        ship: int,
+        rect_pos: np.ndarray,
+        torpedo_bounds: tuple[np.ndarray, ...],
+    ):
+        """Destroys the ship's torpedoes and every entity they collide with"""
+        (left, top, right, bottom), alive = self._entity_bounds(
+            rect_pos, torpedo_bounds
+        )
+        first = self.num_ships + ship * self.max_torpedoes
+        torpedoes = slice(first, first + self.max_torpedoes)
+
+        collide = (
+            alive[:, torpedoes, None]
+            & alive[:, None, :]
+            & (left[:, torpedoes, None] < right[:, None, :])
+            & (left[:, None, :] < right[:, torpedoes, None])
+            & (top[:, torpedoes, None] < bottom[:, None, :])
+            & (top[:, None, :] < bottom[:, torpedoes, None])
+        )
+        # a torpedo does not collide with itself
+        torpedo_idx = np.arange(self.max_torpedoes)
+        collide[:, torpedo_idx, torpedo_idx + first] = False
+
+        # test the masks of the colliding rects, using the overlap table of
+        # what each torpedo collided with
+        env_idx, torpedo_idx, entity_idx = np.nonzero(collide)
+        if env_idx.size:
+            heading = self._entity_headings()
+            torpedo_col = torpedo_idx + first
+            table_idx = np.minimum(entity_idx, self.num_ships)
+            overlap = np.zeros(env_idx.size, dtype=bool)
+            for table in np.unique(table_idx).tolist():
+                pair = table_idx == table
+                envs, cols, others = (
+                    env_idx[pair],
+                    torpedo_col[pair],
+                    entity_idx[pair],
+                )
+                overlap[pair] = masks_overlap(
+                    self._torpedo_overlaps[table],
+                    heading[envs, cols],
+                    heading[envs, others],
+                    left[envs, others] - left[envs, cols],
+                    top[envs, others] - top[envs, cols],
+                )
+            collide[env_idx, torpedo_idx, entity_idx] = overlap
+
+        # resolve the colliding torpedoes one at a time in the order they
+        # were fired, so a torpedo does not hit what an earlier one destroyed
+        env_idx, slot_idx = np.nonzero(collide.any(axis=2))
+        fired_order = np.lexsort(
+            (self.torpedo_fired_at[env_idx, ship, slot_idx], env_idx)
+        )
+        env_idx, slot_idx = env_idx[fired_order], slot_idx[fired_order]
+        rank = np.arange(env_idx.size) - np.searchsorted(env_idx, env_idx)
+        for turn in range(rank.max(initial=-1) + 1):
+            envs, slots = env_idx[rank == turn], slot_idx[rank == turn]
+            hit = collide[envs, slots] & alive[envs]
+            alive[envs] &= ~hit
+            alive[envs, slots + first] &= ~hit.any(axis=1)
+        self._set_entity_alive(alive)
+
+    def _handle_phaser(
+        self,
+        ship: int,
+        fire_phaser: np.ndarray,
+        rect_pos: np.ndarray,
+        torpedo_bounds: tuple[np.ndarray, ...],
+    ):
+        """Destroys the closest entity in front of the ship in the envs where
+        it fired its phaser, the same as Phaser._detect_hit
+        """
+        env_idx = np.flatnonzero(fire_phaser[:, ship])
+        if not env_idx.size:
+            return
+
+        (left, top, right, bottom), alive = self._entity_bounds(
+            rect_pos, torpedo_bounds
+        )
+        # wrap_ray splits the ray into segments on the screen, so the parts
+        # of the rects hanging off the screen cannot be hit
+        margin = PHASER_WIDTH / 2
+        left = np.maximum(left - margin, 0)
+        top = np.maximum(top - margin, 0)
+        right = np.minimum(right + margin, SCREEN_WIDTH)
+        bottom = np.minimum(bottom + margin, SCREEN_HEIGHT)
+        on_screen = (left <= right) & (top <= bottom)
+
+        bounds = tuple(
+            side[env_idx, :, None] for side in (left, top, right, bottom)
+        )
+        targets = alive[env_idx] & on_screen[env_idx]
+        targets[:, ship] = False
+
+        rad = self.ship_ang[env_idx, ship] * np.pi / 180
+        delta = PHASER_LENGTH * np.stack((np.cos(rad), np.sin(rad)), axis=-1)
+        # shape (num_fired, num_wrap_offsets, x/y), starting on the screen
+        # the same as wrap_ray
+        start = np.mod(
+            self.ship_pos[env_idx, ship], (SCREEN_WIDTH, SCREEN_HEIGHT)
+        )
+        start = start[:, None, :] + self._wrap_offsets
+
+        entry = segment_rect_entries(
+            start[:, None, :, :], delta[:, None, None, :], bounds
+        )
+        dist = np.fmin.reduce(entry, axis=2) * PHASER_LENGTH
+        dist = np.where(targets & (dist < PHASER_LENGTH), dist, np.inf)
+
+        hit_fired = np.isfinite(dist).any(axis=1)
+        hit_target = dist.argmin(axis=1)
+        alive[env_idx[hit_fired], hit_target[hit_fired]] = False
+        self._set_entity_alive(alive)
+
+    def step(
+        self,
+        actions: np.ndarray,
+        out: Optional[tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Advances every env by one tick.
+
+        actions holds the ShipAction value of each ship, with shape
+        (num_envs, num_ships). Returns the observations, the rewards of each
+        ship, and whether each env finished. Finished envs are reset, so their
+        observation is the first of the next match. If out is passed, the
+        observations, rewards, and dones are written into its arrays instead
+        of new ones.
+        """
+        obs, rewards, dones = out or (None, None, None)
+        alive_before = self.ship_alive.copy()
+
+        fire_phaser = self._apply_actions(np.asarray(actions))
+        self._integrate()
+        # each ship's rules run in player order, the same as the groups of
+        # SpaceWarSim, so a ship destroyed by an earlier player's torpedo
+        # still fires the phaser it fired this tick
+        torpedo_bounds = self._torpedo_bounds()
+        # the positions the ships' rects are synced to. SpaceWarSim syncs a
+        # pushed ship's rect when the ship's own update runs, so a ship
+        # pushed by a later player keeps its old rect for the rest of the tick
+        rect_pos = self.ship_pos.copy()
+        for ship in range(self.num_ships):
+            rect_pos[:, ship] = self.ship_pos[:, ship]
+            self._handle_ship_collisions(ship, rect_pos)
+            self._handle_torpedo_collisions(ship, rect_pos, torpedo_bounds)
+            self._handle_phaser(ship, fire_phaser, rect_pos, torpedo_bounds)
+        self.ticks += 1
+
+        destroyed = alive_before & ~self.ship_alive
+        num_destroyed = destroyed.sum(axis=1, keepdims=True)
+        rewards = np.subtract(
+            num_destroyed, 2 * destroyed, out=rewards, dtype=np.float32
+        )
+        dones = np.logical_or(
+            self.ship_alive.sum(axis=1) <= 1,
+            self.ticks >= self.max_ticks,
+            out=dones,
+        )
+
+        if dones.any():
+            self._reset_envs(dones)
+        return self.get_obs(obs), rewards, dones
@@ -1,38 +1,50 @@
 """Collection of classes for weapons"""
 
 import math
-from typing import Any
+from typing import Any, Optional
 
 import pygame
-from pygame import Surface
 
+from space_war.sim.assets import ASSETS, Asset
 from space_war.sim.base import SpaceEntity
+from space_war.sim.broadphase import SpatialHash
+from space_war.sim.clock import SimClock
 from space_war.sim.conf import (
+    MAX_TORPEDOES_PER_SHIP,
     PHASER_LENGTH,
-    PHASER_MAX_FLIGHT_MS,
+    PHASER_MAX_FLIGHT_TICKS,
     PHASER_WIDTH,
     SCREEN_HEIGHT,
     SCREEN_WIDTH,
-    TORPEDO_MAX_FLIGHT_MS,
+    TORPEDO_MAX_FLIGHT_TICKS,
+    TORPEDO_SPAWN_DIST,
     TORPEDO_SPEED,
     SpaceEntityType,
 )
-from space_war.sim.util import create_linear_eq
+from space_war.sim.util import collide_masks, segment_rect_entry, wrap_ray
+from space_war.sim.world import EntityState, WorldState
 
 
 class BaseWeapon(pygame.sprite.Sprite):
-    """Simple base class for weapons. All weapons have a specific duration."""
+    """Simple base class for weapons. All weapons have a specific duration,
+    measured in ticks of the simulation clock.
+    """
 
     # TODO: add a damage attribute to inflict damage to ship's shield on hit
 
-    def __init__(self, duration) -> None:
+    clock: SimClock
+    start_time: int
+    max_duration: int
+
+    def __init__(self, duration: int, clock: SimClock) -> None:
         pygame.sprite.Sprite.__init__(self)
-        self.start_time = pygame.time.get_ticks()
+        self.clock = clock
+        self.start_time = clock.ticks
         self.max_duration = duration
 
     def is_expired(self) -> bool:
         """Returns True if duration of weapon exceeds the max duration"""
-        current_duration = pygame.time.get_ticks() - self.start_time
+        current_duration = self.clock.ticks - self.start_time
         return current_duration >= self.max_duration
 
     def update(self, *args: Any, **kwargs: Any):
@@ -45,12 +57,16 @@ class BaseWeapon(pygame.sprite.Sprite):
 class Phaser(BaseWeapon):
     """The phaser weapon, fires a straight line up to a fixed distance
 
+    Hit detection is a geometric raycast that wraps around the screen, so
+    firing does not allocate any surfaces. The phaser is only drawn when
+    draw is called by a renderer.
+
     Attributes
     ----------
     source_ship: The ship that is firing the phaser
     active: Whether the phaser is actively being fired or not
-    ship_pos: The center position of the source_ship
-    coords: List of coordinates to draw the phaser. Ordered by the end to start.
+    ship_pos: The center position of the source_ship when the phaser hit
+    coords: List of coordinates to draw the phaser. Ordered by start to end.
 
     """
 
@@ -58,227 +74,286 @@ class Phaser(BaseWeapon):
     active: bool
     start_time: int
     ship_pos: tuple[float, float]
-    coords: list[tuple[float, float]]
+    coords: list[tuple[tuple[float, float], tuple[float, float]]]
 
     def __init__(self, source_ship) -> None:
-        super().__init__(duration=PHASER_MAX_FLIGHT_MS)
+        super().__init__(
+            duration=PHASER_MAX_FLIGHT_TICKS, clock=source_ship.clock
+        )
         self.source_ship = source_ship
-        self.image = Surface([SCREEN_WIDTH, SCREEN_HEIGHT]).convert_alpha()
-        self.rect = self.image.get_rect()
         self.active = True
-        self.hit_detect_info = {
-            "rect": [],
-            "start_pos": [],
-            "end_pos": [],
-            "dist": [],
-        }
+        self.ship_pos = source_ship.pos
         self.coords = []
 
-    def _draw_phaser(self, ship_pos):
-        """Draws coordinates for the phaser based on coordinates set in
-        self._detect_hit. This is visible to the player.
+    def draw(self, surface: pygame.Surface) -> list[pygame.Rect]:
+        """Draws the phaser lines calculated in self._detect_hit. This is
+        visible to the player. Returns the rects drawn to.
 
         """
+        if not self.coords:
+            return []
 
         # Calculate change in position since calculation
         # and translate all the lines
-        (old_startx, old_starty), _ = self.coords[-1]
-        deltax = ship_pos[0] - old_startx
-        deltay = ship_pos[1] - old_starty
-        for (startx, starty), (endx, endy) in self.coords:
-            startx += deltax
-            starty += deltay
-            endx += deltax
-            endy += deltay
-
+        deltax = self.source_ship.pos[0] - self.ship_pos[0]
+        deltay = self.source_ship.pos[1] - self.ship_pos[1]
+        return [
             pygame.draw.line(
-                self.image,
+                surface,
                 "white",
-                start_pos=(startx, starty),
-                end_pos=(endx, endy),
+                start_pos=(startx + deltax, starty + deltay),
+                end_pos=(endx + deltax, endy + deltay),
                 width=PHASER_WIDTH,
             )
+            for (startx, starty), (endx, endy) in self.coords
+        ]
 
     def _detect_hit(
         self,
         target_group: pygame.sprite.Group,
+        ship_pos: tuple[float, float],
+        ship_ang: float,
+        broadphase: Optional[SpatialHash] = None,
     ):
-        """Calculates the start and end coordinates of the lines to be
-        shown to the player.
+        """Casts the phaser from the ship and calculates the start and end
+        coordinates of the lines to be shown to the player.
 
-          - Collisions with the rectangle will result in drawing a line to the
+          - The phaser wraps around the screen as many times as needed to
+            reach its full length.
+          - Hitting a sprite's rectangle will result in drawing a line to the
             center of the sprite in the target group.
-          - If there are multiple collisions, only consider the closest one.
-          - If there are no collisions, draw the full length of the laser.
-        """
-
-        if self.active:
-            idx_to_kill = None
-            idx = 0
-            rect_idx = None
-            min_dist = PHASER_LENGTH
-            dist = PHASER_LENGTH
-            end_pos = self.hit_detect_info["end_pos"][-1]
-            start_pos = self.hit_detect_info["start_pos"][-1]
-            target_sprites = target_group.sprites()
-
-            for sprite in target_sprites:
-                if sprite not in (self, self.source_ship):
-                    rect_collide_idx = sprite.rect.collidelist(
-                        self.hit_detect_info["rect"]
-                    )
-                    if rect_collide_idx != -1:
-                        dist = math.dist(
-                            self.hit_detect_info["start_pos"][rect_collide_idx],
-                            sprite.rect.center,
-                        )
-                        if rect_collide_idx == 1:
-                            dist += self.hit_detect_info["dist"][0]
-
-                        if dist < min_dist:
-                            min_dist = dist
-                            idx_to_kill = idx
-                            start_pos = self.hit_detect_info["start_pos"][
-                                rect_collide_idx
-                            ]
-                            end_pos = sprite.rect.center
-                            rect_idx = rect_collide_idx
-
-                idx += 1
-            if idx_to_kill is not None:
-                target_sprites[idx_to_kill].kill()
-
-            self.coords.append((start_pos, end_pos))
-            if (start_pos, end_pos) != (
-                self.hit_detect_info["start_pos"][0],
-                self.hit_detect_info["end_pos"][0],
-            ) and (rect_idx is None or rect_idx == 1):
-                self.coords.append(
-                    (
-                        self.hit_detect_info["start_pos"][0],
-                        self.hit_detect_info["end_pos"][0],
-                    )
-                )
+          - If there are multiple hits, only consider the closest one.
+          - If there are no hits, draw the full length of the laser.
 
-            self.active = False
-
-    def _update_hit_detector_rects(self, ship_pos, ship_ang):
-        """Creates hit detection rectangles for the phasers. These are
-        invisible to the player.
+        Only sprites near the segments are checked if the broadphase grid is
+        passed.
         """
 
-        x_linear_eq, y_linear_eq, slope = create_linear_eq(ship_ang, ship_pos)
-
-        # TODO: Make screen wrap around logic iterative
+        if not self.active:
+            return
 
-        target_pos = (
-            ship_pos[0] + PHASER_LENGTH * math.cos(ship_ang * math.pi / 180),
-            ship_pos[1] + PHASER_LENGTH * math.sin(ship_ang * math.pi / 180),
+        segments = wrap_ray(
+            ship_pos, ship_ang, PHASER_LENGTH, (SCREEN_WIDTH, SCREEN_HEIGHT)
         )
-
-        x_pos, y_pos = target_pos
-        new_x_pos, new_y_pos = ship_pos
-
-        if x_pos >= SCREEN_WIDTH:
-            x_pos = SCREEN_WIDTH
-            y_pos = y_linear_eq(x_pos) if slope != 0 else y_pos
-            new_x_pos = 0
-        elif x_pos <= 0:
-            x_pos = 0
-            y_pos = y_linear_eq(x_pos) if slope != 0 else y_pos
-            new_x_pos = SCREEN_WIDTH
-
-        if y_pos >= SCREEN_HEIGHT:
-            y_pos = SCREEN_HEIGHT
-            x_pos = x_linear_eq(y_pos) if slope != 0 else x_pos
-            new_y_pos = 0
-        elif y_pos <= 0:
-            y_pos = 0
-            x_pos = x_linear_eq(y_pos) if slope != 0 else x_pos
-            new_y_pos = SCREEN_HEIGHT
-
-        target_pos = (x_pos, y_pos)
-
-        # Remove old lines
-        self.image.fill("black")
-
-        # Use this rect to detect collisions
-        rect = pygame.draw.line(
-            self.image,
-            pygame.color.Color(0, 0, 0, 0),
-            ship_pos,
-            target_pos,
-            PHASER_WIDTH,
-        )
-        dist = math.dist(ship_pos, target_pos)
-        self.hit_detect_info["rect"].append(rect)
-        self.hit_detect_info["start_pos"].append(ship_pos)
-        self.hit_detect_info["end_pos"].append(target_pos)
-        self.hit_detect_info["dist"].append(dist)
-        remaining_dist = PHASER_LENGTH - dist
-        if math.floor(remaining_dist) > 0:
-            # Then create another rect to wraps around the screen
-            new_target_pos = (
-                new_x_pos + remaining_dist * math.cos(ship_ang * math.pi / 180),
-                new_y_pos + remaining_dist * math.sin(ship_ang * math.pi / 180),
+        hit_sprite = None
+        hit_segment_idx = None
+        min_dist = PHASER_LENGTH
+
+        if broadphase:
+            sprites = broadphase.query_many(
+                (
+                    pygame.Rect(
+                        min(start[0], end[0]),
+                        min(start[1], end[1]),
+                        abs(end[0] - start[0]),
+                        abs(end[1] - start[1]),
+                    ).inflate(PHASER_WIDTH + 2, PHASER_WIDTH + 2)
+                    for start, end, _ in segments
+                ),
+                target_group,
             )
-            new_rect = pygame.draw.line(
-                self.image,
-                pygame.color.Color(0, 0, 0, 0),
-                (new_x_pos, new_y_pos),
-                new_target_pos,
-                PHASER_WIDTH,
+        else:
+            sprites = target_group.sprites()
+
+        for sprite in sprites:
+            if sprite in (self, self.source_ship):
+                continue
+            for segment_idx, (start_pos, end_pos, travelled) in enumerate(
+                segments
+            ):
+                if travelled >= min_dist:
+                    break
+                entry = segment_rect_entry(
+                    start_pos, end_pos, sprite.rect, margin=PHASER_WIDTH / 2
+                )
+                if entry is not None:
+                    dist = travelled + entry * math.dist(start_pos, end_pos)
+                    if dist < min_dist:
+                        min_dist = dist
+                        hit_sprite = sprite
+                        hit_segment_idx = segment_idx
+                    break
+
+        if hit_sprite is None:
+            self.coords = [(start, end) for start, end, _ in segments]
+        else:
+            hit_sprite.kill()
+            self.coords = [
+                (start, end) for start, end, _ in segments[:hit_segment_idx]
+            ]
+            self.coords.append(
+                (segments[hit_segment_idx][0], hit_sprite.rect.center)
             )
-            self.hit_detect_info["rect"].append(new_rect)
-            self.hit_detect_info["start_pos"].append((new_x_pos, new_y_pos))
-            self.hit_detect_info["end_pos"].append(new_target_pos)
-            self.hit_detect_info["dist"].append(remaining_dist)
+
+        self.ship_pos = ship_pos
+        self.active = False
 
     def update(self, *args, **kwargs):
         super().update(*args, **kwargs)
-        self._update_hit_detector_rects(kwargs["ship_pos"], kwargs["ship_ang"])
-        self._detect_hit(target_group=kwargs["target_group"])
-        self._draw_phaser(kwargs["ship_pos"])
+        self._detect_hit(
+            target_group=kwargs["target_group"],
+            ship_pos=kwargs["ship_pos"],
+            ship_ang=kwargs["ship_ang"],
+            broadphase=kwargs.get("broadphase"),
+        )
 
 
 class PhotonTorpedo(BaseWeapon, SpaceEntity):
-    """Represents the photon torpedo object that a ship can fire"""
+    """Represents the photon torpedo object that a ship can fire.
+
+    Torpedoes are created unfired by a TorpedoPool and are launched again
+    after they are killed, instead of being recreated. The torpedo asset
+    from ASSETS is used if none is passed.
 
-    def __init__(self, start_pos, start_ang, start_vel) -> None:
-        surf = Surface([12, 12]).convert_alpha()
-        torpedo_x_pos = start_pos[0] + 36 * math.cos(start_ang * math.pi / 180)
-        torpedo_y_pos = start_pos[1] + 36 * math.sin(start_ang * math.pi / 180)
-        BaseWeapon.__init__(self, duration=TORPEDO_MAX_FLIGHT_MS)
+    A torpedo hits a sprite when their masks overlap, which is only tested
+    once their rects collide.
+    """
+
+    def __init__(
+        self,
+        clock: SimClock,
+        state: Optional[EntityState] = None,
+        asset: Optional[Asset] = None,
+    ) -> None:
+        BaseWeapon.__init__(
+            self, duration=TORPEDO_MAX_FLIGHT_TICKS, clock=clock
+        )
         SpaceEntity.__init__(
             self,
             entity_type=SpaceEntityType.TORPEDO,
-            surf=surf,
-            start_pos=(torpedo_x_pos, torpedo_y_pos),
-            start_ang=start_ang,
-            start_vel=start_vel,
+            asset=asset or ASSETS.torpedo(),
+            start_pos=(0, 0),
+            state=state,
         )
+        # not in flight until launched
+        self.state.alive[0] = False
 
-        # Draw on the surface of what the torpedo looks like
-        pygame.draw.polygon(self.image, "white", [[5, 0], [3, 5], [7, 5]], 1)
-        pygame.draw.polygon(self.image, "white", [[0, 10], [3, 9], [3, 5]], 1)
-        pygame.draw.polygon(self.image, "white", [[7, 5], [7, 9], [11, 10]], 1)
-        pygame.draw.line(self.image, "white", (3, 9), (7, 9))
-        pygame.draw.line(self.image, "white", (5, 5), (5, 11))
-        # Drawn like a christmas tree, so need to rotate it by 90 degrees.
-        self.surf = pygame.transform.rotate(self.surf, -90)
+    def launch(
+        self,
+        start_pos: tuple[float, float],
+        start_ang: float,
+        start_vel: tuple[float, float],
+    ):
+        """Fires the torpedo in front of the ship at the given position,
+        angle, and velocity
+        """
+        self.start_time = self.clock.ticks
+        self.state.alive[0] = True
+        self.pos = (
+            start_pos[0]
+            + TORPEDO_SPAWN_DIST * math.cos(start_ang * math.pi / 180),
+            start_pos[1]
+            + TORPEDO_SPAWN_DIST * math.sin(start_ang * math.pi / 180),
+        )
+        self.ang = start_ang
+        self.image = self.asset.image
+        self.mask = self.asset.masks[0]
+        self.rect.size = self.asset.size
+        self.rect.center = self.pos
 
         # Apply torpedoes velocity on ship's velocity
-        x_vel, y_vel = self.vel
+        x_vel, y_vel = start_vel
         x_vel += TORPEDO_SPEED * math.cos(self.ang * math.pi / 180)
         y_vel += TORPEDO_SPEED * math.sin(self.ang * math.pi / 180)
         self.vel = (x_vel, y_vel)
 
     def update(self, *args, **kwargs):
         SpaceEntity.update(self, *args, **kwargs)
-        BaseWeapon.update(self, *args, **kwargs)
+        # the world moves its torpedoes twice per tick and expires them
+        if not self.world_integrated:
+            BaseWeapon.update(self, *args, **kwargs)
 
         # group and collision management
-        for sprite in kwargs["target_group"].sprites():
-            if sprite != self and self.rect.colliderect(sprite.rect):
+        target_group = kwargs["target_group"]
+        broadphase = kwargs.get("broadphase")
+        sprites = (
+            broadphase.query(self.rect, target_group)
+            if broadphase
+            else target_group.sprites()
+        )
+        for sprite in sprites:
+            if (
+                sprite != self
+                and self.rect.colliderect(sprite.rect)
+                and collide_masks(self, sprite)
+            ):
                 sprite.kill()
                 self.kill()
+
+
+class TorpedoPool:
+    """Fixed number of torpedoes that a ship recycles.
+
+    When the ship is part of a WorldState, each torpedo views the world's
+    torpedo slot with the same index.
+
+    Attributes
+    ----------
+    clock: The simulation clock shared with the torpedoes
+    world: The world state holding the torpedoes, if any
+    ship_idx: The index of the ship in the world
+    asset: The asset shared by the torpedoes
+    torpedoes: The pooled torpedoes, whether in flight or not
+
+    """
+
+    clock: SimClock
+    world: Optional[WorldState]
+    ship_idx: int
+    asset: Asset
+    torpedoes: list[PhotonTorpedo]
+
+    def __init__(
+        self,
+        clock: SimClock,
+        size: int = MAX_TORPEDOES_PER_SHIP,
+        world: Optional[WorldState] = None,
+        ship_idx: int = 0,
+        asset: Optional[Asset] = None,
+    ) -> None:
+        self.clock = clock
+        self.world = world
+        self.ship_idx = ship_idx
+        self.asset = asset or ASSETS.torpedo()
+        if world:
+            self.torpedoes = [
+                PhotonTorpedo(
+                    clock, world.torpedo_state(ship_idx, slot), self.asset
+                )
+                for slot in range(world.max_torpedoes)
+            ]
+            world.torpedo_sprites[ship_idx][:] = self.torpedoes
+        else:
+            self.torpedoes = [
+                PhotonTorpedo(clock, asset=self.asset) for _ in range(size)
+            ]
+
+    def launch(
+        self,
+        start_pos: tuple[float, float],
+        start_ang: float,
+        start_vel: tuple[float, float],
+    ) -> Optional[PhotonTorpedo]:
+        """Launches a torpedo that is not in flight.
+
+        Returns the torpedo, or None if every torpedo is in flight.
+        """
+        if self.world:
+            slot = self.world.alloc_torpedo(self.ship_idx, self.clock.ticks)
+            if slot is None:
+                return None
+            torpedo = self.torpedoes[slot]
+        else:
+            torpedo = next(
+                (
+                    torpedo
+                    for torpedo in self.torpedoes
+                    if not torpedo.state.alive[0]
+                ),
+                None,
+            )
+            if torpedo is None:
+                return None
+
+        torpedo.launch(start_pos, start_ang, start_vel)
+        return torpedo
@@ -0,0 +1,292 @@
+"""Struct-of-arrays world state
+
+The position, velocity, and angle of every ship and torpedo live in
+preallocated NumPy arrays, so integration, screen wrap, and torpedo expiry run
+as vectorized operations once per tick. Sprites hold views into these arrays
+and are only responsible for rendering and collisions.
+"""
+
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+import numpy as np
+
+from space_war.sim.conf import (
+    MAX_TORPEDOES_PER_SHIP,
+    ROTATION_STEP,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    TORPEDO_MAX_FLIGHT_TICKS,
+    TORPEDO_MOVES_PER_TICK,
+)
+
+if TYPE_CHECKING:
+    import pygame
+
+# The last fired tick of a weapon that has never been fired
+NEVER_FIRED = np.iinfo(np.int64).min // 2
+
+
+def wrap_and_move(
+    pos: np.ndarray,
+    vel: np.ndarray,
+    bounds: tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT),
+):
+    """Vectorized version of the screen wrap and velocity integration in
+    SpaceEntity.update. pos and vel have a trailing x,y axis and are updated
+    in place.
+    """
+    # both axes at once, since each numpy call costs more than the tiny
+    # arrays it works on
+    bounds = np.asarray(bounds, dtype=pos.dtype)
+    under = pos <= 0
+    np.copyto(pos, 0, where=pos >= bounds)
+    np.copyto(pos, bounds, where=under)
+    pos += vel
+
+
+def headings(ang: np.ndarray) -> np.ndarray:
+    """Vectorized version of Asset.heading, returning the index of the
+    rotated variants at each angle
+    """
+    heading = np.rint(ang / ROTATION_STEP).astype(np.intp)
+    heading %= round(360 / ROTATION_STEP)
+    return heading
+
+
+def rotated_sizes(size: tuple[int, int]) -> np.ndarray:
+    """Returns the width and height of a surface's rect at each heading, the
+    same as the rect of pygame.transform.rotate. Indexed by the angle divided
+    by ROTATION_STEP.
+    """
+    rad = np.arange(0, 360, ROTATION_STEP) * np.pi / 180
+    cos = np.abs(np.cos(rad))
+    sin = np.abs(np.sin(rad))
+    return np.stack(
+        (
+            np.floor(size[0] * cos + size[1] * sin + 1e-6),
+            np.floor(size[0] * sin + size[1] * cos + 1e-6),
+        ),
+        axis=-1,
+    )
+
+
+def rect_bounds(
+    pos: np.ndarray, ang: np.ndarray, sizes: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the left, top, right, and bottom of the rotated rects centered
+    on pos, rounded the same way as pygame.Rect.center. sizes is the table
+    returned by rotated_sizes.
+    """
+    heading = headings(ang)
+    width = np.take(sizes[:, 0], heading)
+    height = np.take(sizes[:, 1], heading)
+    left = np.trunc(pos[..., 0])
+    left -= np.take(sizes[:, 0] // 2, heading)
+    top = np.trunc(pos[..., 1])
+    top -= np.take(sizes[:, 1] // 2, heading)
+    return left, top, left + width, top + height
+
+
+def masks_overlap(
+    overlaps: np.ndarray,
+    heading: np.ndarray,
+    other_heading: np.ndarray,
+    x_offset: np.ndarray,
+    y_offset: np.ndarray,
+) -> np.ndarray:
+    """Vectorized version of util.collide_masks.
+
+    overlaps is a table from assets.overlap_table, and the offsets are the
+    left and top of the other rects minus those of the first rects. Offsets
+    past the table's edges never overlap.
+    """
+    _, _, width, height = overlaps.shape
+    x_idx = x_offset.astype(np.intp) + width // 2
+    y_idx = y_offset.astype(np.intp) + height // 2
+    inside = (x_idx >= 0) & (x_idx < width) & (y_idx >= 0) & (y_idx < height)
+    return (
+        inside
+        & overlaps[
+            heading,
+            other_heading,
+            np.clip(x_idx, 0, width - 1),
+            np.clip(y_idx, 0, height - 1),
+        ]
+    )
+
+
+def segment_rect_entries(
+    start: np.ndarray,
+    delta: np.ndarray,
+    bounds: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+    margin: float = 0,
+) -> np.ndarray:
+    """Vectorized version of util.segment_rect_entry.
+
+    Returns the fraction along each segment where it enters its rect, or NaN
+    if it misses. start and delta have a trailing x,y axis and broadcast
+    against the rect bounds.
+    """
+    left, top, right, bottom = bounds
+    x_pos, y_pos = start[..., 0], start[..., 1]
+    x_delta, y_delta = delta[..., 0], delta[..., 1]
+    t_enter = np.zeros(np.broadcast_shapes(x_pos.shape, left.shape))
+    t_exit = np.ones_like(t_enter)
+    hit = np.ones(t_enter.shape, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for direction, edge_dist in (
+            (-x_delta, x_pos - (left - margin)),
+            (x_delta, (right + margin) - x_pos),
+            (-y_delta, y_pos - (top - margin)),
+            (y_delta, (bottom + margin) - y_pos),
+        ):
+            # parallel to the edge, so it must start inside it
+            hit &= (direction != 0) | (edge_dist >= 0)
+            ratio = edge_dist / direction
+            t_enter = np.where(
+                direction < 0, np.maximum(t_enter, ratio), t_enter
+            )
+            t_exit = np.where(direction > 0, np.minimum(t_exit, ratio), t_exit)
+
+    hit &= t_enter <= t_exit
+    return np.where(hit, t_enter, np.nan)
+
+
+class EntityState(NamedTuple):
+    """Views into the state arrays of a single entity"""
+
+    pos: np.ndarray
+    vel: np.ndarray
+    ang: np.ndarray
+    alive: np.ndarray
+
+    @classmethod
+    def standalone(cls) -> "EntityState":
+        """Allocates state for an entity that is not part of a world"""
+        return cls(
+            pos=np.zeros(2),
+            vel=np.zeros(2),
+            ang=np.zeros(1),
+            alive=np.zeros(1, dtype=bool),
+        )
+
+
+class WorldState:
+    """Preallocated arrays holding every ship and torpedo in a match.
+
+    Each ship has a fixed number of torpedo slots. Arrays are indexed by ship,
+    then by torpedo slot. Slots of dead entities keep stale values.
+
+    Attributes
+    ----------
+    num_ships: The number of ships in the match
+    max_torpedoes: The number of torpedo slots per ship
+    bounds: The width and height of the screen
+    ship_pos: The center position of each ship
+    ship_vel: The velocity of each ship
+    ship_ang: The angle in degrees each ship is facing
+    ship_alive: Whether each ship is alive
+    torpedo_pos: The center position of each torpedo
+    torpedo_vel: The velocity of each torpedo
+    torpedo_ang: The angle in degrees of each torpedo
+    torpedo_alive: Whether each torpedo slot is in use
+    torpedo_fired_at: The clock tick each torpedo was fired at
+    torpedo_sprites: The sprite viewing each torpedo slot
+
+    """
+
+    num_ships: int
+    max_torpedoes: int
+    bounds: tuple[float, float]
+    ship_pos: np.ndarray
+    ship_vel: np.ndarray
+    ship_ang: np.ndarray
+    ship_alive: np.ndarray
+    torpedo_pos: np.ndarray
+    torpedo_vel: np.ndarray
+    torpedo_ang: np.ndarray
+    torpedo_alive: np.ndarray
+    torpedo_fired_at: np.ndarray
+    torpedo_sprites: list[list[Optional["pygame.sprite.Sprite"]]]
+
+    def __init__(
+        self,
+        num_ships: int,
+        max_torpedoes: int = MAX_TORPEDOES_PER_SHIP,
+        bounds: tuple[float, float] = (SCREEN_WIDTH, SCREEN_HEIGHT),
+    ) -> None:
+        self.num_ships = num_ships
+        self.max_torpedoes = max_torpedoes
+        self.bounds = bounds
+
+        self.ship_pos = np.zeros((num_ships, 2))
+        self.ship_vel = np.zeros((num_ships, 2))
+        self.ship_ang = np.zeros(num_ships)
+        self.ship_alive = np.zeros(num_ships, dtype=bool)
+
+        self.torpedo_pos = np.zeros((num_ships, max_torpedoes, 2))
+        self.torpedo_vel = np.zeros((num_ships, max_torpedoes, 2))
+        self.torpedo_ang = np.zeros((num_ships, max_torpedoes))
+        self.torpedo_alive = np.zeros((num_ships, max_torpedoes), dtype=bool)
+        self.torpedo_fired_at = np.zeros(
+            (num_ships, max_torpedoes), dtype=np.int64
+        )
+        self.torpedo_sprites = [
+            [None] * max_torpedoes for _ in range(num_ships)
+        ]
+
+    def ship_state(self, ship_idx: int) -> EntityState:
+        """Returns views into the state of the ship"""
+        return EntityState(
+            pos=self.ship_pos[ship_idx],
+            vel=self.ship_vel[ship_idx],
+            ang=self.ship_ang[ship_idx : ship_idx + 1],
+            alive=self.ship_alive[ship_idx : ship_idx + 1],
+        )
+
+    def torpedo_state(self, ship_idx: int, slot: int) -> EntityState:
+        """Returns views into the state of the ship's torpedo slot"""
+        return EntityState(
+            pos=self.torpedo_pos[ship_idx, slot],
+            vel=self.torpedo_vel[ship_idx, slot],
+            ang=self.torpedo_ang[ship_idx, slot : slot + 1],
+            alive=self.torpedo_alive[ship_idx, slot : slot + 1],
+        )
+
+    def alloc_torpedo(self, ship_idx: int, ticks: int) -> Optional[int]:
+        """Reserves a free torpedo slot for the ship.
+
+        Returns the slot, or None if every slot is in use.
+        """
+        free_slots = np.flatnonzero(~self.torpedo_alive[ship_idx])
+        if not free_slots.size:
+            return None
+
+        slot = int(free_slots[0])
+        self.torpedo_fired_at[ship_idx, slot] = ticks
+        return slot
+
+    def integrate(self, ticks: int) -> np.ndarray:
+        """Wraps and moves every ship and torpedo, then expires torpedoes that
+        have exceeded their max flight time. The torpedo slots are skipped
+        while none of them is in flight.
+
+        Returns a mask of the torpedo slots that expired this tick.
+        """
+        wrap_and_move(self.ship_pos, self.ship_vel, self.bounds)
+        if not self.torpedo_alive.any():
+            return np.zeros_like(self.torpedo_alive)
+        for _ in range(TORPEDO_MOVES_PER_TICK):
+            wrap_and_move(self.torpedo_pos, self.torpedo_vel, self.bounds)
+
+        expired = self.torpedo_alive & (
+            ticks - self.torpedo_fired_at >= TORPEDO_MAX_FLIGHT_TICKS
+        )
+        self.torpedo_alive &= ~expired
+        return expired
+
+    def kill_expired(self, expired: np.ndarray):
+        """Kills the sprites viewing the expired torpedo slots"""
+        for ship_idx, slot in zip(*np.nonzero(expired)):
+            self.torpedo_sprites[ship_idx][slot].kill()
@@ -0,0 +1,408 @@
+"""Round-robin tournaments between policies
+
+Plays every pair of policies against each other in headless VectorSpaceWar
+matches spread across a process pool. Each pair plays the same number of
+matches from each seat, starting from seeded random positions and angles.
+Every match is streamed to a CSV log as it finishes, and the win rates and
+Elo ratings are printed at the end.
+
+    python -m space_war.tournament baseline_d baseline_o noop \\
+        --matches 10000 --log results.csv
+
+Policies are looked up in POLICIES by name, or imported from a module with
+"module:attribute", e.g. a function that loads a checkpoint or self-play
+snapshot and acts with it.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import importlib
+import itertools
+import math
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from space_war.agents.baseline import BASELINES, Policy
+from space_war.sim.conf import (
+    MAX_SIM_TICKS,
+    ROTATION_STEP,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    SHIP_SIZE,
+)
+from space_war.sim.vector import VectorSpaceWar
+
+# The z-score of the 95% confidence intervals of the win rates
+CONFIDENCE_Z = 1.96
+# The average Elo rating of the policies in a tournament
+ELO_MEAN = 1500
+# The number of batches of matches in each task sent to a worker
+TASK_BATCHES = 4
+# Ships never start closer than this to each other
+MIN_START_DIST = 4 * max(SHIP_SIZE)
+
+
+def noop(env: VectorSpaceWar, _ship: int) -> np.ndarray:
+    """Policy that never does anything, a lower bound for every other"""
+    return np.zeros(env.num_envs, dtype=np.int64)
+
+
+# The policies that can be passed to the tournament by name
+POLICIES: dict[str, Policy] = {**BASELINES, "noop": noop}
+
+
+class MatchResult(NamedTuple):
+    """The outcome of a single match, one row of the log"""
+
+    # the policy in each seat
+    policy_0: str
+    policy_1: str
+    # the seed and index the starting positions were generated from
+    seed: int
+    match: int
+    # the seat that won, or -1 for a draw
+    winner: int
+    ticks: int
+
+
+def resolve_policy(spec: str) -> Policy:
+    """Returns the registered policy with the name, or imports it from
+    "module:attribute"
+    """
+    if spec in POLICIES:
+        return POLICIES[spec]
+    module, sep, attribute = spec.partition(":")
+    if not sep:
+        raise ValueError(
+            f"unknown policy {spec!r}, expected one of {sorted(POLICIES)} "
+            "or module:attribute"
+        )
+    return getattr(importlib.import_module(module), attribute)
+
+
+def random_starts(
+    rng: np.random.Generator, num_matches: int, num_ships: int = 2
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns random start positions and angles for each match, with the
+    ships at least MIN_START_DIST apart around the screen
+    """
+    bounds = np.array([SCREEN_WIDTH, SCREEN_HEIGHT], dtype=np.float64)
+    pos = rng.uniform(0, bounds, (num_matches, num_ships, 2))
+    too_close = np.ones(num_matches, dtype=bool)
+    while too_close.any():
+        pos[too_close] = rng.uniform(0, bounds, (too_close.sum(), num_ships, 2))
+        delta = pos[:, :, None] - pos[:, None, :]
+        delta -= bounds * np.rint(delta / bounds)
+        dist = np.hypot(delta[..., 0], delta[..., 1])
+        dist[:, np.arange(num_ships), np.arange(num_ships)] = np.inf
+        too_close = (dist < MIN_START_DIST).any(axis=(1, 2))
+    num_headings = round(360 / ROTATION_STEP)
+    ang = rng.integers(0, num_headings, (num_matches, num_ships))
+    return pos, ang * ROTATION_STEP
+
+
+def play_matches(
+    policies: tuple[str, str],
+    seed: int,
+    match_ids: range,
+    num_envs: int,
+    max_ticks: int = MAX_SIM_TICKS,
+) -> list[MatchResult]:
+    """Plays the matches between the policies, num_envs at a time.
+
+    The start of match i is generated from the seed and i alone, so any
+    match can be replayed without the rest of the tournament. When an env
+    finishes its match, the next match starts in it right away.
+    """
+    actors = [resolve_policy(spec) for spec in policies]
+    num_envs = min(num_envs, len(match_ids))
+    env = VectorSpaceWar(num_envs, max_ticks=max_ticks)
+
+    starts = [
+        random_starts(np.random.default_rng([seed, match_id]), 1)
+        for match_id in match_ids
+    ]
+    start_pos = np.concatenate([pos for pos, _ in starts])
+    start_ang = np.concatenate([ang for _, ang in starts])
+
+    # the index into match_ids of the match each env is playing
+    playing = np.arange(num_envs)
+    env.ship_pos[:] = start_pos[playing]
+    env.ship_ang[:] = start_ang[playing]
+    next_match = num_envs
+
+    results = []
+    actions = np.zeros((num_envs, len(actors)), dtype=np.int64)
+    while True:
+        active = playing >= 0
+        if not active.any():
+            return results
+        for seat, actor in enumerate(actors):
+            actions[:, seat] = actor(env, seat)
+        ticks = env.ticks + 1
+        _, rewards, dones = env.step(actions)
+
+        for env_idx in np.flatnonzero(dones & active):
+            winners = np.flatnonzero(rewards[env_idx] > 0)
+            results.append(
+                MatchResult(
+                    *policies,
+                    seed=seed,
+                    match=match_ids[playing[env_idx]],
+                    winner=int(winners[0]) if len(winners) == 1 else -1,
+                    ticks=int(ticks[env_idx]),
+                )
+            )
+            if next_match < len(match_ids):
+                # the env was just reset, so only the start differs
+                playing[env_idx] = next_match
+                env.ship_pos[env_idx] = start_pos[next_match]
+                env.ship_ang[env_idx] = start_ang[next_match]
+                next_match += 1
+            else:
+                playing[env_idx] = -1
+
+
+def wilson_interval(
+    wins: float, num_matches: int, z: float = CONFIDENCE_Z
+) -> tuple[float, float]:
+    """Returns the Wilson score interval of a win rate, which stays inside
+    [0, 1] even for few matches or lopsided results
+    """
+    if num_matches == 0:
+        return 0.0, 1.0
+    rate = wins / num_matches
+    denom = 1 + z**2 / num_matches
+    center = (rate + z**2 / (2 * num_matches)) / denom
+    margin = (
+        z
+        * math.sqrt(
+            rate * (1 - rate) / num_matches + z**2 / (4 * num_matches**2)
+        )
+        / denom
+    )
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def elo_ratings(
+    scores: np.ndarray, num_iters: int = 1000, tol: float = 1e-9
+) -> np.ndarray:
+    """Fits Elo ratings to every match at once, so unlike updating after
+    each match, the ratings do not depend on the order the matches finished.
+
+    scores[i, j] is the number of matches policy i won against policy j,
+    with draws counting half. This is the Bradley-Terry maximum likelihood
+    fit, with one virtual draw added to every pair that played so a policy
+    that never lost still gets a finite rating.
+    """
+    games = scores + scores.T
+    played = games > 0
+    scores = scores + 0.5 * played
+    games = games + played
+    wins = scores.sum(axis=1)
+
+    strength = np.ones(len(scores))
+    for _ in range(num_iters):
+        denom = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+        new_strength = np.where(denom > 0, wins / np.maximum(denom, 1e-300), 1)
+        new_strength /= np.exp(np.log(new_strength).mean())
+        converged = np.abs(new_strength - strength).max() < tol
+        strength = new_strength
+        if converged:
+            break
+    return ELO_MEAN + 400 * np.log10(strength)
+
+
+def tournament_tasks(
+    policies: Sequence[str],
+    num_matches: int,
+    task_size: int,
+    seed: int,
+) -> list[tuple[tuple[str, str], int, range]]:
+    """Splits the round robin into tasks of at most task_size matches.
+
+    Each pair plays half its matches from each seat. Both seatings share
+    the pair's seed, so every start is played from both sides.
+    """
+    tasks = []
+    pairs = itertools.combinations(policies, 2)
+    for pair_idx, (policy_a, policy_b) in enumerate(pairs):
+        for swap, seating in enumerate(
+            ((policy_a, policy_b), (policy_b, policy_a))
+        ):
+            seating_matches = (num_matches + 1 - swap) // 2
+            for start in range(0, seating_matches, task_size):
+                tasks.append(
+                    (
+                        seating,
+                        hash_seed(seed, pair_idx),
+                        range(start, min(start + task_size, seating_matches)),
+                    )
+                )
+    return tasks
+
+
+def hash_seed(*keys: int) -> int:
+    """Combines the keys into a single seed"""
+    return int(np.random.SeedSequence(keys).generate_state(1)[0])
+
+
+def run_tournament(
+    policies: Sequence[str],
+    num_matches: int,
+    log_path: Optional[Path] = None,
+    num_workers: Optional[int] = None,
+    batch_size: int = 512,
+    seed: int = 0,
+    max_ticks: int = MAX_SIM_TICKS,
+) -> list[MatchResult]:
+    """Plays num_matches between every pair of policies across a process
+    pool, and returns the result of every match. If log_path is passed, each
+    result is appended to the CSV log as soon as its task finishes.
+
+    Each worker steps batch_size matches at once, and each task holds a few
+    batches of matches, so envs that finish early start the next match
+    instead of idling until the slowest match in the batch ends.
+    """
+    for spec in policies:
+        resolve_policy(spec)
+    tasks = tournament_tasks(
+        policies, num_matches, TASK_BATCHES * batch_size, seed
+    )
+    results = []
+
+    log_file = None
+    try:
+        if log_path:
+            # pylint: disable=consider-using-with
+            new_log = not log_path.exists() or log_path.stat().st_size == 0
+            log_file = open(log_path, "a", newline="", encoding="utf-8")
+            writer = csv.writer(log_file)
+            if new_log:
+                writer.writerow(MatchResult._fields)
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers or os.cpu_count(),
+            mp_context=mp.get_context("spawn"),
+        ) as pool:
+            futures = [
+                pool.submit(play_matches, *task, batch_size, max_ticks)
+                for task in tasks
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                task_results = future.result()
+                results.extend(task_results)
+                if log_file:
+                    writer.writerows(task_results)
+                    log_file.flush()
+    finally:
+        if log_file:
+            log_file.close()
+    return results
+
+
+def summarize(policies: Sequence[str], results: Sequence[MatchResult]) -> str:
+    """Returns a report of the win rates of every pair and the Elo ratings"""
+    index = {spec: idx for idx, spec in enumerate(policies)}
+    # scores[i, j] is the score of i against j, wins[i, j] the number of
+    # wins, and draws[i, j] the number of draws
+    scores = np.zeros((len(policies), len(policies)))
+    wins = np.zeros_like(scores, dtype=np.int64)
+    draws = np.zeros_like(wins)
+    for result in results:
+        seats = (index[result.policy_0], index[result.policy_1])
+        if result.winner < 0:
+            draws[seats] += 1
+            draws[seats[::-1]] += 1
+            scores[seats] += 0.5
+            scores[seats[::-1]] += 0.5
+        else:
+            winner = seats[result.winner]
+            loser = seats[1 - result.winner]
+            wins[winner, loser] += 1
+            scores[winner, loser] += 1
+
+    name_width = max(len(spec) for spec in policies)
+    lines = [
+        f"{'policy':<{name_width}}  {'opponent':<{name_width}}"
+        "    wins  losses   draws  score  95% CI"
+    ]
+    for i, j in itertools.combinations(range(len(policies)), 2):
+        num_matches = wins[i, j] + wins[j, i] + draws[i, j]
+        low, high = wilson_interval(scores[i, j], num_matches)
+        rate = scores[i, j] / num_matches if num_matches else 0.0
+        lines.append(
+            f"{policies[i]:<{name_width}}  {policies[j]:<{name_width}}"
+            f"  {wins[i, j]:>6}  {wins[j, i]:>6}  {draws[i, j]:>6}"
+            f"  {rate:.3f}  [{low:.3f}, {high:.3f}]"
+        )
+
+    lines.append("")
+    lines.append(f"{'policy':<{name_width}}  elo")
+    ratings = elo_ratings(scores)
+    for idx in np.argsort(-ratings):
+        lines.append(f"{policies[idx]:<{name_width}}  {ratings[idx]:.0f}")
+    return "\n".join(lines)
+
+
+def main():
+    """Plays a round-robin tournament between policies"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "policies",
+        nargs="+",
+        help=f"policy names, one of {sorted(POLICIES)}, or module:attribute",
+    )
+    parser.add_argument(
+        "--matches",
+        type=int,
+        default=1000,
+        help="the number of matches each pair plays",
+    )
+    parser.add_argument(
+        "--log", type=Path, help="the CSV file results are appended to"
+    )
+    parser.add_argument(
+        "--workers", type=int, help="the number of worker processes"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=512,
+        help="the number of matches each worker plays at once",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--max-ticks",
+        type=int,
+        default=MAX_SIM_TICKS,
+        help="the number of ticks before a match is a draw",
+    )
+    args = parser.parse_args()
+    args.policies = list(dict.fromkeys(args.policies))
+    if len(args.policies) < 2:
+        parser.error("at least two different policies are needed")
+
+    start = time.perf_counter()
+    results = run_tournament(
+        args.policies,
+        args.matches,
+        log_path=args.log,
+        num_workers=args.workers,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        max_ticks=args.max_ticks,
+    )
+    elapsed = time.perf_counter() - start
+    print(summarize(args.policies, results))
+    print(f"\n{len(results)} matches in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Checks that VectorSpaceWar plays the same matches as SpaceWarSim"""
+
+import pytest
+
+from space_war.parity import play_match
+
+# The seeds played for each number of ships. Each range starts at a
+# different seed, and the ranges include matches that used to disagree.
+SEED_RANGES = [
+    (2, range(0, 20)),
+    (2, range(150, 170)),
+    (2, range(1060, 1090)),
+    (3, range(0, 10)),
+    (4, range(2000, 2010)),
+    (8, range(0, 10)),
+]
+
+
+@pytest.mark.parametrize(
+    "num_ships, seeds",
+    SEED_RANGES,
+    ids=[f"{num}-ships-{seeds.start}" for num, seeds in SEED_RANGES],
+)
+def test_seeded_matches_agree(num_ships: int, seeds: range):
+    disagreements = {
+        seed: difference
+        for seed in seeds
+        if (difference := play_match(seed, num_ships))
+    }
+    assert not disagreements